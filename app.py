@@ -6,7 +6,9 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
+from devopshub import dateindex, history, people, profiling, shared, storage, tenants, ui
+from devopshub.profiling import profiled
 
 # Page config
 st.set_page_config(
@@ -16,6 +18,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+profiling.begin_rerun("Dashboard")
+ui.select_tenant()
+
 # Custom CSS - DevOps Tech Theme
 st.markdown("""
 <style>
@@ -88,25 +93,54 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Only the columns the dashboard shows; long text fields are never parsed
+DASHBOARD_COLUMNS = {
+    "requests": ["ID", "Title", "Type", "Priority", "Status", "Assigned To", "Created Date", "Completed Date"],
+    "errors": ["ID", "Severity", "Status"],
+    "projects": ["ID", "Status", "Team Members"],
+}
+
 # Load data
-@st.cache_data
+@tenants.cached
+@profiled("load_data")
 def load_data():
-    """Load all CSV data"""
+    """Load the dashboard columns of all tables, including archived requests and errors"""
     try:
-        requests = pd.read_csv("data/requests.csv")
-        errors = pd.read_csv("data/errors.csv")
-        projects = pd.read_csv("data/projects.csv")
+        requests = shared.read_table("requests", include_archive=True, columns=DASHBOARD_COLUMNS["requests"])
+        errors = shared.read_table("errors", include_archive=True, columns=DASHBOARD_COLUMNS["errors"])
+        projects = shared.read_table("projects", columns=DASHBOARD_COLUMNS["projects"])
         return requests, errors, projects
     except FileNotFoundError:
         st.error("Data files not found. Please run generate_sample_data.py first.")
         st.stop()
 
-requests_df, errors_df, projects_df = load_data()
+@profiled("load_as_of")
+@st.cache_data(ttl=60)
+def load_as_of(day, data_dir):
+    """Rebuild all tables of the tenant in `data_dir` as they were at the end of `day`
+
+    A table with no history by then comes back empty, with the dashboard's columns.
+    """
+    tables = []
+    for entity in ["requests", "errors", "projects"]:
+        df = people.attach(entity, history.as_of(entity, day, data_dir), data_dir)
+        missing = [column for column in DASHBOARD_COLUMNS[entity] if column not in df.columns]
+        tables.append(df.reindex(columns=[*df.columns, *missing]))
+    return tuple(tables)
+
+ui.refresh_on_change({"requests": [load_data], "errors": [load_data], "projects": [load_data]})
 
 # Sidebar
 st.sidebar.markdown("# 🔧 DevOpsHub")
 st.sidebar.markdown("*Development Operations Dashboard*")
 st.sidebar.markdown("---")
+ui.actor_input()
+as_of = st.sidebar.date_input(
+    "As of",
+    value=None,
+    max_value=datetime.now(),
+    help="Show the dashboard as it was at the end of this day"
+)
 st.sidebar.markdown("### About")
 st.sidebar.info(
     "DevOpsHub helps internal development teams track programming requests, "
@@ -119,11 +153,11 @@ st.sidebar.markdown("""
 - Single-user mode
 - CSV data storage
 - All core features
+- Email alerts (SMTP)
 
 **Pro Version**
 - Multi-user with auth
 - Database backend
-- Email notifications
 - Fiserv API integration
 - Custom branding
 """)
@@ -135,7 +169,24 @@ if st.sidebar.button("🚀 Upgrade to Pro"):
 st.markdown('<div class="main-header">📊 DevOpsHub Dashboard</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">Real-time overview of development operations</div>', unsafe_allow_html=True)
 
+if as_of is None:
+    reference_time = datetime.now()
+    requests_df, errors_df, projects_df = load_data()
+else:
+    reference_time = datetime.combine(as_of, time.max)
+    requests_df, errors_df, projects_df = load_as_of(as_of, storage.data_dir())
+    if requests_df.empty and errors_df.empty and projects_df.empty:
+        start = history.history_start(storage.data_dir())
+        st.warning(
+            f"No history recorded on or before {as_of}. "
+            + (f"History starts on {start[:10]}." if start else "Nothing has been journaled yet.")
+        )
+        profiling.end_rerun()
+        st.stop()
+    st.info(f"🕰️ Showing data as of the end of {as_of:%Y-%m-%d}")
+
 # Key metrics row
+profiling.section("metrics")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
@@ -183,38 +234,45 @@ with col4:
 st.markdown("---")
 
 # Charts row 1
+profiling.section("charts")
 col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("📈 Requests by Status")
     status_counts = requests_df["Status"].value_counts()
-    fig = px.pie(
-        values=status_counts.values,
-        names=status_counts.index,
-        color=status_counts.index,
-        color_discrete_map={
-            "Completed": "#28a745",
-            "In Progress": "#ffc107",
-            "Testing": "#6c757d",
-            "Submitted": "#17a2b8"
-        }
-    )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(showlegend=False, height=300)
-    st.plotly_chart(fig, width='stretch')
+    if status_counts.empty:
+        st.info("No requests yet.")
+    else:
+        fig = px.pie(
+            values=status_counts.values,
+            names=status_counts.index,
+            color=status_counts.index,
+            color_discrete_map={
+                "Completed": "#28a745",
+                "In Progress": "#ffc107",
+                "Testing": "#6c757d",
+                "Submitted": "#17a2b8"
+            }
+        )
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        fig.update_layout(showlegend=False, height=300)
+        st.plotly_chart(fig, width='stretch')
 
 with col2:
     st.subheader("📊 Requests by Type")
     type_counts = requests_df["Type"].value_counts()
-    fig = px.bar(
-        x=type_counts.index,
-        y=type_counts.values,
-        labels={"x": "Request Type", "y": "Count"},
-        color=type_counts.values,
-        color_continuous_scale="Blues"
-    )
-    fig.update_layout(showlegend=False, height=300)
-    st.plotly_chart(fig, width='stretch')
+    if type_counts.empty:
+        st.info("No requests yet.")
+    else:
+        fig = px.bar(
+            x=type_counts.index,
+            y=type_counts.values,
+            labels={"x": "Request Type", "y": "Count"},
+            color=type_counts.values,
+            color_continuous_scale="Blues"
+        )
+        fig.update_layout(showlegend=False, height=300)
+        st.plotly_chart(fig, width='stretch')
 
 # Charts row 2
 col1, col2 = st.columns(2)
@@ -225,43 +283,50 @@ with col1:
     severity_order = ["Low", "Medium", "High", "Critical"]
     severity_counts = severity_counts.reindex(severity_order, fill_value=0)
 
-    fig = px.bar(
-        x=severity_counts.index,
-        y=severity_counts.values,
-        labels={"x": "Severity", "y": "Count"},
-        color=severity_counts.index,
-        color_discrete_map={
-            "Low": "#28a745",
-            "Medium": "#ffc107",
-            "High": "#fd7e14",
-            "Critical": "#dc3545"
-        }
-    )
-    fig.update_layout(showlegend=False, height=300)
-    st.plotly_chart(fig, width='stretch')
+    if errors_df.empty:
+        st.info("No errors logged yet.")
+    else:
+        fig = px.bar(
+            x=severity_counts.index,
+            y=severity_counts.values,
+            labels={"x": "Severity", "y": "Count"},
+            color=severity_counts.index,
+            color_discrete_map={
+                "Low": "#28a745",
+                "Medium": "#ffc107",
+                "High": "#fd7e14",
+                "Critical": "#dc3545"
+            }
+        )
+        fig.update_layout(showlegend=False, height=300)
+        st.plotly_chart(fig, width='stretch')
 
 with col2:
     st.subheader("📁 Projects by Status")
     project_status_counts = projects_df["Status"].value_counts()
-    fig = px.bar(
-        x=project_status_counts.index,
-        y=project_status_counts.values,
-        labels={"x": "Project Status", "y": "Count"},
-        color=project_status_counts.values,
-        color_continuous_scale="Viridis"
-    )
-    fig.update_layout(showlegend=False, height=300)
-    st.plotly_chart(fig, width='stretch')
+    if project_status_counts.empty:
+        st.info("No projects yet.")
+    else:
+        fig = px.bar(
+            x=project_status_counts.index,
+            y=project_status_counts.values,
+            labels={"x": "Project Status", "y": "Count"},
+            color=project_status_counts.values,
+            color_continuous_scale="Viridis"
+        )
+        fig.update_layout(showlegend=False, height=300)
+        st.plotly_chart(fig, width='stretch')
 
 st.markdown("---")
 
 # Recent activity
+profiling.section("recent_activity")
 st.subheader("🕐 Recent Activity")
 
-# Get recent requests (last 7 days)
-requests_df["Created Date"] = pd.to_datetime(requests_df["Created Date"])
-recent_date = datetime.now() - timedelta(days=7)
-recent_requests = requests_df[requests_df["Created Date"] >= recent_date].sort_values("Created Date", ascending=False)
+# Get recent requests (last 7 days), newest first
+created_index = dateindex.index_for(requests_df, "Created Date")
+recent_date = reference_time - timedelta(days=7)
+recent_requests = requests_df.iloc[created_index.range(recent_date, reference_time)[::-1]]
 
 if len(recent_requests) > 0:
     st.markdown("**Recent Requests (Last 7 Days)**")
@@ -279,6 +344,7 @@ else:
     st.info("No recent requests in the last 7 days.")
 
 # Team workload
+profiling.section("team_workload")
 st.markdown("---")
 st.subheader("👥 Team Workload")
 
@@ -290,7 +356,7 @@ with col1:
     assignee_counts = active_requests["Assigned To"].value_counts()
 
     for assignee, count in assignee_counts.items():
-        if assignee != "Unassigned":
+        if count and assignee != "Unassigned":
             st.markdown(f"**{assignee}**: {count} active requests")
 
 with col2:
@@ -316,3 +382,5 @@ st.markdown(
     '</div>',
     unsafe_allow_html=True
 )
+
+profiling.end_rerun()
@@ -0,0 +1,3 @@
+"""
+DevOpsHub shared helpers used by app.py and the pages
+"""
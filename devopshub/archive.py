@@ -0,0 +1,186 @@
+"""
+Hot/cold partitioning of closed records
+
+Completed requests and Fixed errors are moved out of data/*.csv into
+gzip'd archive segments, one per completion month:
+
+    data/archive/requests/2025-09.csv.gz
+
+The hot CSV then only holds the working set that the default list views
+show. storage.read_table(..., include_archive=True) adds the archived rows
+back for analytics and search. The journal still sees hot + archived rows
+as one table, so archiving is not recorded as a change.
+
+Usage:
+    python -m devopshub.archive                  # archive every closed record
+    python -m devopshub.archive --min-age-days 30
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from devopshub.people import DTYPES
+
+ARCHIVE_DIR = "archive"
+MANIFEST_FILE = "manifest.json"
+
+# entity -> (closed statuses, completion date column)
+CLOSED = {
+    "requests": (["Completed"], "Completed Date"),
+    "errors": (["Fixed"], "Date Resolved"),
+}
+
+UNDATED = "undated"
+
+
+def _archive_dir(data_dir):
+    return os.path.join(data_dir, ARCHIVE_DIR)
+
+
+def _segment_path(data_dir, entity, segment):
+    return os.path.join(_archive_dir(data_dir), entity, f"{segment}.csv.gz")
+
+
+def read_manifest(data_dir):
+    """{entity: {segment: [ids]}} for everything archived so far"""
+    path = os.path.join(_archive_dir(data_dir), MANIFEST_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(data_dir, manifest):
+    path = os.path.join(_archive_dir(data_dir), MANIFEST_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def archived_ids(entity, data_dir):
+    """Set of IDs that live in the archive"""
+    segments = read_manifest(data_dir).get(entity, {})
+    return {row_id for ids in segments.values() for row_id in ids}
+
+
+def segments(entity, data_dir):
+    """Archived segment names (completion months), oldest first"""
+    return sorted(read_manifest(data_dir).get(entity, {}))
+
+
+def read_archive(entity, data_dir, months=None, ids=None, usecols=None):
+    """Archived rows, optionally only from some months or holding some IDs"""
+    manifest = read_manifest(data_dir).get(entity, {})
+    wanted = sorted(manifest)
+    if months is not None:
+        wanted = [m for m in wanted if m in set(months)]
+    if ids is not None:
+        ids = set(ids)
+        wanted = [m for m in wanted if ids.intersection(manifest[m])]
+
+    frames = [pd.read_csv(_segment_path(data_dir, entity, m), dtype=DTYPES, usecols=usecols) for m in wanted]
+    if not frames:
+        return pd.DataFrame()
+    cold = pd.concat(frames, ignore_index=True)
+    if ids is not None:
+        cold = cold[cold["ID"].isin(ids)]
+    return cold
+
+
+def _segment_of(df, date_column):
+    months = pd.to_datetime(df[date_column], errors="coerce").dt.strftime("%Y-%m")
+    return months.fillna(UNDATED)
+
+
+def archive_closed(entity, data_dir, hot_df, min_age_days=0):
+    """Move closed rows of `hot_df` to the archive, returns the remaining hot rows"""
+    statuses, date_column = CLOSED[entity]
+    closed = hot_df["Status"].isin(statuses)
+    if min_age_days:
+        completed = pd.to_datetime(hot_df[date_column], errors="coerce")
+        closed &= completed <= datetime.now() - timedelta(days=min_age_days)
+    moving = hot_df[closed]
+    if moving.empty:
+        return hot_df
+
+    manifest = read_manifest(data_dir)
+    entity_manifest = manifest.setdefault(entity, {})
+    os.makedirs(os.path.join(_archive_dir(data_dir), entity), exist_ok=True)
+    for segment, rows in moving.groupby(_segment_of(moving, date_column)):
+        path = _segment_path(data_dir, entity, segment)
+        if os.path.exists(path):
+            existing = pd.read_csv(path, dtype=DTYPES)
+            rows = pd.concat([existing[~existing["ID"].isin(rows["ID"])], rows], ignore_index=True)
+        rows.to_csv(path + ".tmp", index=False, compression="gzip")
+        os.replace(path + ".tmp", path)
+        entity_manifest[segment] = sorted(rows["ID"].tolist())
+
+    # Segments first, then the manifest; the caller rewrites the hot table last.
+    # A crash in between leaves rows in both places and the hot copy wins.
+    _write_manifest(data_dir, manifest)
+    return hot_df[~closed]
+
+
+def unarchive(entity, data_dir, ids):
+    """Remove rows from their archive segments (they are going back to the hot table)"""
+    ids = set(ids)
+    manifest = read_manifest(data_dir)
+    entity_manifest = manifest.get(entity, {})
+    for segment, segment_ids in list(entity_manifest.items()):
+        if not ids.intersection(segment_ids):
+            continue
+        path = _segment_path(data_dir, entity, segment)
+        rows = pd.read_csv(path, dtype=DTYPES)
+        rows = rows[~rows["ID"].isin(ids)]
+        if rows.empty:
+            os.remove(path)
+            del entity_manifest[segment]
+        else:
+            rows.to_csv(path + ".tmp", index=False, compression="gzip")
+            os.replace(path + ".tmp", path)
+            entity_manifest[segment] = sorted(rows["ID"].tolist())
+    _write_manifest(data_dir, manifest)
+
+
+def split_hot(entity, data_dir, df):
+    """Rows of `df` that belong in the hot table
+
+    Archived rows that come back unchanged are dropped again; archived rows
+    that were edited (e.g. a completed request reopened) leave the archive.
+    """
+    mask = df["ID"].isin(archived_ids(entity, data_dir))
+    if not mask.any():
+        return df
+    returning = df[mask].astype("string").fillna("").set_index("ID")
+    cold = read_archive(entity, data_dir, ids=returning.index).astype("string").fillna("").set_index("ID")
+    cold = cold.reindex(index=returning.index, columns=returning.columns).fillna("")
+    changed = returning.ne(cold).any(axis=1)
+    edited = changed[changed].index
+    if len(edited) > 0:
+        unarchive(entity, data_dir, edited)
+    return df[~mask | df["ID"].isin(edited)]
+
+
+def main(argv=None):
+    from devopshub import storage
+
+    parser = argparse.ArgumentParser(description="Move closed records into monthly archive segments")
+    parser.add_argument("--entity", choices=CLOSED, action="append")
+    parser.add_argument("--min-age-days", type=int, default=0,
+                        help="Only archive records closed at least this many days ago")
+    args = parser.parse_args(argv)
+
+    for entity in args.entity or CLOSED:
+        moved = storage.archive_closed(entity, min_age_days=args.min_age_days)
+        print(f"[OK] Archived {moved} {entity}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
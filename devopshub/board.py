@@ -0,0 +1,90 @@
+"""
+Kanban board of projects
+
+build() groups every project by status and current phase in one pass: the
+projects are sorted once by (status, phase, target date), so each column of
+the board is a contiguous slice of the result, and the column counts, the
+phase counts within each column and the average SDLC completion per column
+come from the same status and phase codes. Showing a page of a column is a
+slice, so a board of thousands of projects only formats the cards on screen.
+
+Projects whose phase is not one of PHASES go last in their column.
+"""
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from devopshub import validate
+
+STATUSES = validate.SCHEMAS["projects"]["enums"]["Status"]
+PHASES = [
+    "Requirements Gathering",
+    "Design & Architecture",
+    "Development",
+    "Testing & QA",
+    "Deployment",
+    "Post-Deployment Review",
+]
+OTHER_PHASE = "Other"
+PAGE_SIZE = int(os.environ.get("DEVOPSHUB_BOARD_PAGE_SIZE", "10"))
+
+CARD_COLUMNS = ["ID", "Project Name", "Current Phase", "Target Completion", "Team Members"]
+
+
+class Board:
+    """Projects in board order with their per-column and per-phase counts"""
+
+    def __init__(self, cards, counts, phase_counts, completion):
+        self.cards = cards
+        self.counts = counts
+        self.phase_counts = phase_counts
+        self.completion = completion
+        self._starts = dict(zip(STATUSES, np.concatenate([[0], np.cumsum(list(counts.values()))[:-1]]).tolist()))
+
+    def pages(self, status, size=PAGE_SIZE):
+        return max(1, math.ceil(self.counts[status] / size))
+
+    def page(self, status, number, size=PAGE_SIZE):
+        """Cards on page `number` (from 1) of the `status` column, with days left to their target"""
+        start = self._starts[status] + (number - 1) * size
+        end = self._starts[status] + min(number * size, self.counts[status])
+        cards = self.cards.iloc[start:end]
+        today = pd.Timestamp(datetime.now().date())
+        return cards.assign(**{"Days Left": (cards["Target"] - today).dt.days})
+
+
+def build(df):
+    """Board of the projects in `df`, rows with a status not in STATUSES left out"""
+    status = pd.Categorical(df["Status"], categories=STATUSES).codes.astype(np.int64)
+    phase = pd.Categorical(df["Current Phase"], categories=PHASES).codes.astype(np.int64)
+    phase[phase < 0] = len(PHASES)
+    target = pd.to_datetime(df["Target Completion"], errors="coerce")
+    checklist = df["SDLC Checklist"].fillna("").astype(str)
+    completion = (checklist.str.count(":Complete") / (checklist.str.count(r"\|") + 1) * 100).to_numpy()
+
+    on_board = np.flatnonzero(status >= 0)
+    status, phase = status[on_board], phase[on_board]
+    # lexsort sorts by the last key first; NaT targets sort to the end of their phase
+    order = on_board[np.lexsort((target.to_numpy()[on_board], phase, status))]
+
+    per_status = np.bincount(status, minlength=len(STATUSES))
+    per_phase = np.bincount(status * (len(PHASES) + 1) + phase, minlength=len(STATUSES) * (len(PHASES) + 1))
+    per_phase = per_phase.reshape(len(STATUSES), len(PHASES) + 1)
+    completion_sum = np.bincount(status, weights=completion[on_board], minlength=len(STATUSES))
+
+    cards = df.iloc[order][CARD_COLUMNS].reset_index(drop=True)
+    cards["Target"] = target.iloc[order].reset_index(drop=True)
+    cards["SDLC (%)"] = np.rint(completion[order]).astype(int)
+    phase_names = PHASES + [OTHER_PHASE]
+    return Board(
+        cards,
+        counts={s: int(n) for s, n in zip(STATUSES, per_status)},
+        phase_counts={
+            s: {phase_names[p]: int(n) for p, n in enumerate(row) if n}
+            for s, row in zip(STATUSES, per_phase)
+        },
+        completion={s: (float(total / n) if n else None) for s, total, n in zip(STATUSES, completion_sum, per_status)},
+    )
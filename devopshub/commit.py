@@ -0,0 +1,111 @@
+"""
+Group commit of changes from all sessions
+
+Pages submit row changes (not whole tables) to one writer thread. The writer
+waits COMMIT_WINDOW for other changes to arrive, applies everything pending
+for a table to its current contents, rewrites the table once and fsyncs the
+journal, then resolves each caller's future. Concurrent clicks cost one
+rewrite per window instead of one each, and a session saving a stale copy
+of a table can no longer undo another session's change.
+
+Each tenant's data directory has a writer of its own, so a slow commit to
+one tenant's large table does not hold up saves to the others.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from devopshub import metrics, storage
+
+COMMIT_WINDOW = float(os.environ.get("DEVOPSHUB_COMMIT_WINDOW_MS", "5")) / 1000
+COMMIT_TIMEOUT = 30
+
+
+class Change:
+    """Changes to one table from one caller"""
+
+    def __init__(self, entity, updates, create, actor):
+        self.entity = entity
+        self.updates = [_update(*update) for update in updates]
+        self.create = create
+        self.actor = actor
+        self.future = Future()
+
+
+def _update(ids, values, expected=None):
+    """(ids, {column: value}, {column: value the rows must still have}) of one queued update"""
+    return list(ids), dict(values), dict(expected or {})
+
+
+class CommitQueue:
+    """Single writer that coalesces queued changes into one write per table of `data_dir`"""
+
+    def __init__(self, data_dir, window=COMMIT_WINDOW):
+        self.data_dir = data_dir
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entity, updates=(), create=None, actor=None):
+        """Queue changes; the returned future resolves to the created ID (or None) once durable"""
+        change = Change(entity, updates, create, actor)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="devopshub-commit", daemon=True)
+                self._thread.start()
+        self._queue.put(change)
+        return change.future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(self.window)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with storage.using(self.data_dir):
+                self._commit(batch)
+
+    def _commit(self, batch):
+        by_entity = {}
+        for change in batch:
+            by_entity.setdefault(change.entity, []).append(change)
+        for entity, changes in by_entity.items():
+            try:
+                created = storage.commit_changes(entity, [(c.updates, c.create, c.actor) for c in changes])
+            except Exception as exc:
+                metrics.COMMIT_ERRORS.labels(metrics.tenant_of(self.data_dir), entity).inc()
+                for change in changes:
+                    change.future.set_exception(exc)
+            else:
+                for change, new_id in zip(changes, created):
+                    change.future.set_result(new_id)
+
+
+_commit_queues = {}
+_commit_queues_lock = threading.Lock()
+
+
+def get_commit_queue(data_dir):
+    """The writer of the tables in `data_dir`, one per directory per process"""
+    key = os.path.abspath(data_dir)
+    with _commit_queues_lock:
+        if key not in _commit_queues:
+            _commit_queues[key] = CommitQueue(data_dir)
+        return _commit_queues[key]
+
+
+def submit(entity, updates=(), create=None, actor=None):
+    """Queue changes to `entity` of the current tenant with its writer, returns a Future"""
+    queue_ = get_commit_queue(storage.data_dir())
+    return queue_.submit(entity, updates=updates, create=create, actor=actor)
+
+
+def save(entity, updates=(), create=None, actor=None):
+    """Queue changes and wait until they are written, returns the created ID (or None)"""
+    return submit(entity, updates=updates, create=create, actor=actor).result(timeout=COMMIT_TIMEOUT)
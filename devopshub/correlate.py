@@ -0,0 +1,270 @@
+"""
+Links errors to the requests and projects most likely behind them
+
+Nothing in the data says that ERR-ACH-009 (ACH return parsing) is about the
+component REQ-020 (ACH Return Processing Automation) built, but the words
+say so. Every error (code, system, description, resolution notes) is
+compared with every request (title, description, technology) and project
+(name, description) by cosine similarity of TF-IDF vectors, and the best
+TOP_K matches scoring at least MIN_SCORE are kept per error.
+
+Documents are sparse word sets scored through inverted lists, a batch of
+errors at a time. Results are cached and refreshed incrementally: new or
+edited errors are scored against all work, new or edited work is scored
+against all errors and merged in. Word weights drift as work is added, so
+everything is rescored once the work corpus has grown by REBUILD_GROWTH.
+"""
+import argparse
+import sys
+import threading
+
+import numpy as np
+import streamlit as st
+
+from devopshub.dedupe import tokens
+
+TOP_K = 3
+MIN_SCORE = 0.1
+REBUILD_GROWTH = 0.25
+
+# Words in more than this share of the work items say nothing about which one is meant
+MAX_SHARE = 0.5
+
+# (error word, work item) pairs expanded at once when scoring
+BATCH_PAIRS = 5_000_000
+
+ERROR_FIELDS = ["Error Code", "System", "Description", "Resolution Notes"]
+WORK_FIELDS = {
+    "requests": ["Title", "Description", "Technology"],
+    "projects": ["Project Name", "Description"],
+}
+
+
+def _texts(df, fields):
+    text = df[fields[0]].fillna("").astype(str)
+    for field in fields[1:]:
+        text = text + "\n" + df[field].fillna("").astype(str)
+    return text.tolist()
+
+
+class _Documents:
+    """Word sets of one side (errors or work), by position; edits add a new position"""
+
+    def __init__(self):
+        self.ids = []
+        self.entries = {}
+        self.live = np.zeros(0, dtype=bool)
+        self._docs = []
+        self._terms = []
+        self._pairs = None
+
+    def changed(self, ids, texts):
+        """(ID, text) of rows not indexed yet with this text"""
+        return [(i, t) for i, t in zip(ids, texts) if self.entries.get(i, (None, None))[1] != t]
+
+    def add(self, rows, terms, counts):
+        """Index rows given their term IDs (all rows one after the other, `counts` per row)"""
+        positions = np.arange(len(self.ids), len(self.ids) + len(rows))
+        self.live = np.concatenate([self.live, np.ones(len(rows), dtype=bool)])
+        for position, (row_id, text) in zip(positions.tolist(), rows):
+            if row_id in self.entries:
+                self.live[self.entries[row_id][0]] = False
+            self.entries[row_id] = (position, text)
+            self.ids.append(row_id)
+        self._docs.append(np.repeat(positions, counts))
+        self._terms.append(terms)
+        self._pairs = None
+        return positions
+
+    def pairs(self):
+        """(document position, term ID) of every word of every live document"""
+        if self._pairs is None:
+            docs = np.concatenate(self._docs) if self._docs else np.zeros(0, dtype=np.int64)
+            terms = np.concatenate(self._terms) if self._terms else np.zeros(0, dtype=np.int64)
+            self._docs, self._terms = [docs], [terms]
+            self._pairs = (docs, terms)
+        docs, terms = self._pairs
+        keep = self.live[docs]
+        return docs[keep], terms[keep]
+
+
+class Correlator:
+    """TF-IDF index of errors and work items plus the cached best matches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vocabulary = {}
+        self._errors = _Documents()
+        self._work = _Documents()
+        # Error ID -> [(work ID, score)], best first
+        self._related = {}
+        self._full_at = 0
+        self._version = None
+        # Inverted lists over all work, until work changes
+        self._index = None
+
+    def _term_ids(self, texts):
+        vocabulary, codes, counts = tokens(texts)
+        ids = np.array([self._vocabulary.setdefault(w, len(self._vocabulary)) for w in vocabulary], dtype=np.int64)
+        return (ids[codes] if len(codes) else codes), counts
+
+    def refresh(self, errors_df, requests_df, projects_df):
+        """Bring the matches up to date with the rows in these tables"""
+        frames = (errors_df, requests_df, projects_df)
+        version = tuple((df.attrs.get("version"), len(df)) for df in frames)
+        if all(v[0] is not None for v in version) and version == self._version:
+            return
+        with self._lock:
+            new_errors = self._errors.changed(errors_df["ID"].tolist(), _texts(errors_df, ERROR_FIELDS))
+            new_work = []
+            for entity, df in (("requests", requests_df), ("projects", projects_df)):
+                new_work += self._work.changed(df["ID"].tolist(), _texts(df, WORK_FIELDS[entity]))
+            error_positions = self._errors.add(new_errors, *self._term_ids([t for _, t in new_errors]))
+            work_positions = self._work.add(new_work, *self._term_ids([t for _, t in new_work]))
+            if new_work:
+                self._index = None
+
+            live_work = int(self._work.live.sum())
+            if live_work > self._full_at * (1 + REBUILD_GROWTH):
+                # Word weights have moved enough that old scores no longer compare
+                self._full_at = live_work
+                self._related = self._score(np.flatnonzero(self._errors.live), None)
+            else:
+                if len(work_positions) and self._related:
+                    replaced = {row_id for row_id, _ in new_work}
+                    old = np.array([self._errors.entries[i][0] for i in self._related], dtype=np.int64)
+                    merged = self._score(old, work_positions)
+                    for error_id, matches in self._related.items():
+                        kept = [m for m in matches if m[0] not in replaced] + merged.get(error_id, [])
+                        self._related[error_id] = sorted(kept, key=lambda m: -m[1])[:TOP_K]
+                if len(error_positions):
+                    self._related.update(self._score(error_positions, None))
+            self._version = version
+
+    def _work_index(self, work_positions=None):
+        """(idf per term, inverted lists of some (None: all) work items, posting starts per term)"""
+        if work_positions is None and self._index is not None:
+            return self._index
+        work_docs, work_terms = self._work.pairs()
+        n_terms = len(self._vocabulary)
+        n_work = int(self._work.live.sum())
+        # Smoothed inverse document frequency over the work items
+        frequency = np.bincount(work_terms, minlength=n_terms)
+        idf = np.log((1 + n_work) / (1 + frequency)) + 1
+        idf[frequency > max(1, MAX_SHARE * n_work)] = 0
+        # Cosine normalization, each word of a document weighs idf / |document|
+        norms = np.sqrt(np.bincount(work_docs, weights=idf[work_terms] ** 2, minlength=len(self._work.ids)))
+        if work_positions is not None:
+            wanted = np.zeros(len(self._work.ids), dtype=bool)
+            wanted[work_positions] = True
+            keep = wanted[work_docs]
+            work_docs, work_terms = work_docs[keep], work_terms[keep]
+        keep = (idf[work_terms] > 0) & (norms[work_docs] > 0)
+        work_docs, work_terms = work_docs[keep], work_terms[keep]
+        work_weights = idf[work_terms] / norms[work_docs]
+
+        # Inverted lists: the work documents containing each term
+        order = np.argsort(work_terms, kind="stable")
+        posting_docs, posting_weights = work_docs[order], work_weights[order]
+        starts = np.searchsorted(work_terms[order], np.arange(n_terms + 1))
+        index = (idf, posting_docs, posting_weights, starts)
+        if work_positions is None:
+            self._index = index
+        return index
+
+    def _score(self, error_positions, work_positions):
+        """{error ID: [(work ID, score)]} for these errors against some (None: all) work"""
+        idf, posting_docs, posting_weights, starts = self._work_index(work_positions)
+        missing = len(self._vocabulary) - len(idf)
+        if missing:
+            # Words first seen in errors, in no work item
+            unseen = np.log(1 + int(self._work.live.sum())) + 1
+            idf = np.concatenate([idf, np.full(missing, unseen)])
+            starts = np.concatenate([starts, np.full(missing, starts[-1])])
+
+        error_docs, error_terms = self._errors.pairs()
+        wanted = np.zeros(len(self._errors.ids), dtype=bool)
+        wanted[error_positions] = True
+        keep = wanted[error_docs]
+        error_docs, error_terms = error_docs[keep], error_terms[keep]
+        error_norms = np.sqrt(np.bincount(error_docs, weights=idf[error_terms] ** 2, minlength=len(self._errors.ids)))
+        error_weights = idf[error_terms] / np.where(error_norms > 0, error_norms, 1)[error_docs]
+        lengths = starts[error_terms + 1] - starts[error_terms]
+
+        related = {self._errors.ids[p]: [] for p in error_positions.tolist()}
+        width = len(self._work.ids)
+        # Batches of whole errors (their pairs are contiguous) of about BATCH_PAIRS expanded pairs
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(error_docs)) + 1, [len(error_docs)]])
+        expanded = np.concatenate([[0], np.cumsum(lengths)])[bounds]
+        i = 0
+        while i < len(bounds) - 1:
+            j = max(i + 1, int(np.searchsorted(expanded, expanded[i] + BATCH_PAIRS, "right")) - 1)
+            a, b = bounds[i], bounds[j]
+            i = j
+            counts, terms = lengths[a:b], error_terms[a:b]
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Expand every (error, word) into the work items holding the word
+            offsets = np.repeat(starts[terms] - np.cumsum(counts) + counts, counts) + np.arange(total)
+            cells = np.repeat(error_docs[a:b], counts) * width + posting_docs[offsets]
+            contributions = np.repeat(error_weights[a:b], counts) * posting_weights[offsets]
+            # Sum the contributions to each (error, work item)
+            order = np.argsort(cells)
+            cells, contributions = cells[order], contributions[order]
+            first = np.concatenate([[0], np.flatnonzero(np.diff(cells)) + 1])
+            scores = np.add.reduceat(contributions, first)
+            cells = cells[first]
+            keep = scores >= MIN_SCORE
+            errors, docs, scores = cells[keep] // width, cells[keep] % width, scores[keep]
+            # Best TOP_K per error
+            order = np.lexsort((-scores, errors))
+            errors, docs, scores = errors[order], docs[order], scores[order]
+            group_start = np.concatenate([[0], np.flatnonzero(np.diff(errors)) + 1])
+            rank = np.arange(len(errors)) - np.repeat(group_start, np.diff(np.append(group_start, len(errors))))
+            top = rank < TOP_K
+            for error, doc, score in zip(errors[top].tolist(), docs[top].tolist(), scores[top].tolist()):
+                related[self._errors.ids[error]].append((self._work.ids[doc], score))
+        return related
+
+    def related(self, error_id):
+        """[(request or project ID, score)] for an error, best first"""
+        return self._related.get(error_id, [])
+
+
+@st.cache_resource
+def get_correlator(data_dir):
+    """Shared correlator for a data directory (survives reruns and sessions)"""
+    return Correlator()
+
+
+def related_work(errors_df, requests_df, projects_df, data_dir):
+    """Correlator refreshed with these tables; ask it .related(error ID)"""
+    correlator = get_correlator(data_dir)
+    correlator.refresh(errors_df, requests_df, projects_df)
+    return correlator
+
+
+def main(argv=None):
+    from devopshub import storage
+
+    parser = argparse.ArgumentParser(description="Link errors to the requests and projects likely behind them")
+    parser.add_argument("--open-only", action="store_true", help="Skip archived (fixed) errors")
+    args = parser.parse_args(argv)
+
+    errors = storage.read_table("errors", include_archive=not args.open_only)
+    correlator = Correlator()
+    correlator.refresh(
+        errors,
+        storage.read_table("requests", include_archive=True),
+        storage.read_table("projects"),
+    )
+    print("Error ID,Related ID,Score")
+    for error_id in errors["ID"]:
+        for related_id, score in correlator.related(error_id):
+            print(f"{error_id},{related_id},{score:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
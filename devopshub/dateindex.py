@@ -0,0 +1,84 @@
+"""
+Sorted date indexes for time-window queries
+
+A DateIndex keeps the row positions of a table ordered by one date column,
+so "last 7 days" or "this quarter" is two binary searches and a slice
+instead of converting and comparing the whole column on every rerun.
+Indexes are cached per data version and rebuilt only when the table changes.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from devopshub import storage
+
+
+class DateIndex:
+    """Row positions of a table sorted by one date column"""
+
+    def __init__(self, dates, mask=None):
+        values = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy("datetime64[ns]")
+        valid = ~np.isnat(values)
+        if mask is not None:
+            valid &= np.asarray(mask, dtype=bool)
+        positions = np.flatnonzero(valid)
+        order = np.argsort(values[positions], kind="stable")
+        self.positions = positions[order]
+        self.dates = values[self.positions]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _bounds(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)), "left")
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end)), "right")
+        return lo, max(lo, hi)
+
+    def range(self, start=None, end=None):
+        """Row positions with start <= date <= end, oldest first"""
+        lo, hi = self._bounds(start, end)
+        return self.positions[lo:hi]
+
+    def count(self, start=None, end=None):
+        """Number of rows with start <= date <= end"""
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def monthly_counts(self):
+        """Rows per calendar month ("YYYY-MM"), without gaps"""
+        if len(self.dates) == 0:
+            return pd.Series(dtype="int64")
+        first = pd.Timestamp(self.dates[0]).to_period("M")
+        last = pd.Timestamp(self.dates[-1]).to_period("M")
+        months = pd.period_range(first, last, freq="M")
+        edges = np.searchsorted(self.dates, months.to_timestamp().to_numpy("datetime64[ns]"), "left")
+        counts = np.diff(np.append(edges, len(self.dates)))
+        return pd.Series(counts, index=months.astype(str))
+
+
+@st.cache_resource(max_entries=32)
+def _cached_index(key, column, where, _df):
+    mask = _df[where[0]].isin(where[1]).to_numpy() if where else None
+    return DateIndex(_df[column], mask)
+
+
+def index_for(df, column, where=None):
+    """DateIndex over `df[column]`, cached per version of the table
+
+    `df` must be a table as loaded (storage.read_table() records its version
+    in df.attrs), not a filtered slice of one. `where` is an optional
+    (column, values) filter baked into the index.
+    """
+    if where is not None:
+        where = (where[0], tuple(where[1]))
+    version = df.attrs.get("version")
+    if version is None:
+        mask = df[where[0]].isin(where[1]).to_numpy() if where else None
+        return DateIndex(df[column], mask)
+    # Versions are only unique within a tenant's data directory
+    return _cached_index((storage.data_dir(), version, len(df)), column, where, df)
+
+
+def quarter_start(ts):
+    """First day of the quarter containing `ts`"""
+    return pd.Timestamp(ts).to_period("Q").start_time
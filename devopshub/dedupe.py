@@ -0,0 +1,215 @@
+"""
+Near-duplicate detection for new requests
+
+Each request's title and description are reduced to a set of words, and a
+MinHash signature of NUM_HASHES values estimates how much two sets overlap
+(Jaccard similarity). Signatures are split into BANDS bands and each band
+is hashed to a key (locality-sensitive hashing), so a lookup only compares
+against requests sharing at least one band key instead of the whole
+history. Requests whose estimated similarity is at least THRESHOLD are
+reported as likely duplicates.
+
+The index is built once per process and then kept up to date: requests are
+added when they are created and when a reload shows rows the index has not
+seen (or whose text changed). Band keys are kept sorted per band for binary
+search, with single additions held in small dicts until MERGE_EVERY of them
+have piled up.
+"""
+import threading
+import zlib
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_HASHES // BANDS
+THRESHOLD = 0.5
+
+# Words that say nothing about what is being asked for
+STOP_WORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "into", "all", "are",
+    "new", "per", "via", "our", "will", "need", "needs",
+}
+
+# Multiply-shift hashing: the high 31 bits of a * x + b (mod 2**64), one (a, b) per hash
+_rng = np.random.default_rng(0)
+_A = (_rng.integers(0, 1 << 63, NUM_HASHES, dtype=np.uint64) << np.uint64(1) | np.uint64(1))[:, None]
+_B = _rng.integers(0, 1 << 63, NUM_HASHES, dtype=np.uint64)[:, None]
+# Combines the values of a band into one key
+_MIX = _rng.integers(0, 1 << 63, ROWS_PER_BAND, dtype=np.uint64) << np.uint64(1) | np.uint64(1)
+# Signature of a request without any words (hashes are below 2**31)
+EMPTY = np.iinfo(np.uint32).max
+
+# Requests added one at a time are kept in small dicts until there are this many
+MERGE_EVERY = 1_000
+
+
+def tokens(texts):
+    """Distinct meaningful words of each text
+
+    Returns (vocabulary, codes, counts): the distinct words, the positions in
+    `vocabulary` of the words of all texts one after the other, and how many
+    of them belong to each text.
+    """
+    words = pc.split_pattern_regex(pc.utf8_lower(pa.array(texts, pa.string())), r"[^a-z0-9]+")
+    counts = pc.list_value_length(words).fill_null(0).to_numpy(zero_copy_only=False)
+    encoded = pc.dictionary_encode(pc.list_flatten(words))
+    vocabulary = encoded.dictionary.to_pylist()
+    keep = np.array([len(w) > 2 and not w.isdigit() and w not in STOP_WORDS for w in vocabulary], dtype=bool)
+    codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), counts)
+    kept = keep[codes] if len(codes) else np.zeros(0, dtype=bool)
+    # Each word once per text: sort by (text, word) and drop repeats
+    pairs = np.sort((rows[kept] << 32) | codes[kept])
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = pairs[1:] != pairs[:-1]
+    pairs = pairs[first]
+    return vocabulary, pairs & 0xFFFFFFFF, np.bincount(pairs >> 32, minlength=len(texts))
+
+
+def signatures(texts):
+    """MinHash signatures, shape (len(texts), NUM_HASHES); texts without words are all EMPTY"""
+    vocabulary, codes, counts = tokens(texts)
+    # Every hash of every distinct word, shape (len(vocabulary), NUM_HASHES)
+    words = np.array([zlib.crc32(w.encode()) for w in vocabulary], dtype=np.uint64)
+    hashed = ((_A * words[None, :] + _B) >> np.uint64(33)).astype(np.uint32).T.copy()
+    # Longest texts first, so the texts with a j-th word are always a prefix
+    order = np.argsort(-counts, kind="stable")
+    starts = (np.cumsum(counts) - counts)[order]
+    longest_first = -counts[order]
+    result = np.full((len(texts), NUM_HASHES), EMPTY, dtype=np.uint32)
+    for j in range(int(-longest_first[0]) if len(texts) else 0):
+        n = int(np.searchsorted(longest_first, -j, "left"))
+        np.minimum(result[:n], hashed[codes[starts[:n] + j]], out=result[:n])
+    unsorted = np.empty_like(result)
+    unsorted[order] = result
+    return unsorted
+
+
+def band_keys(sigs):
+    """One LSH key per band of each signature, shape (len(sigs), BANDS)
+
+    The band number is in the top bits, so keys of different bands never meet.
+    """
+    mixed = (sigs.reshape(len(sigs), BANDS, ROWS_PER_BAND).astype(np.uint64) * _MIX).sum(axis=2)
+    return (np.arange(BANDS, dtype=np.uint64) << np.uint64(59)) | (mixed >> np.uint64(5))
+
+
+class DuplicateIndex:
+    """MinHash/LSH index over request titles and descriptions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._live = np.zeros(0, dtype=bool)
+        self._signatures = np.empty((0, NUM_HASHES), dtype=np.uint32)
+        self._keys = np.empty((0, BANDS), dtype=np.uint64)
+        self._count = 0
+        # Band keys of all signatures sorted, with the matching positions...
+        self._sorted_keys = np.empty(0, dtype=np.uint64)
+        self._sorted_positions = np.empty(0, dtype=np.int64)
+        # ...plus {key: [positions]} for what was added since they were sorted
+        self._recent = {}
+        self._recent_count = 0
+        # ID -> (position, text) of its current entry
+        self._entries = {}
+        self._version = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, requests_df):
+        """Index rows that are new or whose title/description changed since the last call"""
+        version = (requests_df.attrs.get("version"), len(requests_df))
+        if version[0] is not None and version == self._version:
+            return
+        texts = requests_df["Title"].fillna("").astype(str) + "\n" + requests_df["Description"].fillna("").astype(str)
+        with self._lock:
+            changed = [
+                (row_id, text) for row_id, text in zip(requests_df["ID"].tolist(), texts.tolist())
+                if self._entries.get(row_id, (None, None))[1] != text
+            ]
+            self._add(changed)
+            self._version = version
+
+    def add(self, row_id, title, description=""):
+        """Index (or re-index) one request, e.g. right after it was created"""
+        with self._lock:
+            self._add([(row_id, f"{title}\n{description}")])
+
+    def _add(self, rows):
+        if not rows:
+            return
+        new = signatures([text for _, text in rows])
+        start, needed = self._count, self._count + len(rows)
+        if needed > len(self._signatures):
+            capacity = max(needed, 2 * len(self._signatures))
+            self._signatures = _grow(self._signatures, capacity, start)
+            self._keys = _grow(self._keys, capacity, start)
+            self._live = _grow(self._live, capacity, start)
+        self._signatures[start:needed] = new
+        self._keys[start:needed] = band_keys(new)
+        self._live[start:needed] = new[:, 0] != EMPTY
+        for position, (row_id, _) in enumerate(rows, start):
+            if row_id in self._entries:
+                # Buckets keep pointing at the stale position, queries skip it
+                self._live[self._entries[row_id][0]] = False
+            self._entries[row_id] = (position, rows[position - start][1])
+            self._ids.append(row_id)
+        self._count = needed
+
+        if self._recent_count + len(rows) >= MERGE_EVERY:
+            self._sort()
+        else:
+            for position in range(start, needed):
+                if self._live[position]:
+                    for key in self._keys[position].tolist():
+                        self._recent.setdefault(key, []).append(position)
+            self._recent_count += len(rows)
+
+    def _sort(self):
+        positions = np.flatnonzero(self._live[:self._count])
+        keys = self._keys[positions].ravel()
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_positions = positions[order // BANDS]
+        self._recent = {}
+        self._recent_count = 0
+
+    def similar(self, title, description="", threshold=THRESHOLD, limit=5):
+        """[(ID, estimated similarity)] of indexed requests resembling this one, best first"""
+        signature = signatures([f"{title}\n{description}"])
+        if signature[0, 0] == EMPTY:
+            return []
+        keys = band_keys(signature)[0]
+        with self._lock:
+            lo = np.searchsorted(self._sorted_keys, keys, "left")
+            hi = np.searchsorted(self._sorted_keys, keys, "right")
+            candidates = [self._sorted_positions[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+            candidates += [self._recent[key] for key in keys.tolist() if key in self._recent]
+            if not candidates:
+                return []
+            candidates = np.unique(np.concatenate(candidates)).astype(np.int64)
+            candidates = candidates[self._live[candidates]]
+            if not len(candidates):
+                return []
+            scores = (self._signatures[candidates] == signature[0]).mean(axis=1)
+            keep = np.flatnonzero(scores >= threshold)
+            best = keep[np.argsort(-scores[keep], kind="stable")][:limit]
+            return [(self._ids[candidates[i]], float(scores[i])) for i in best]
+
+
+def _grow(array, capacity, used):
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+@st.cache_resource
+def get_index(data_dir):
+    """Shared duplicate index for a data directory (survives reruns and sessions)"""
+    return DuplicateIndex()
+
@@ -0,0 +1,302 @@
+"""
+Fiserv ticket status sync
+
+Errors escalated to Fiserv (Status "Reported to Fiserv") carry a ticket such
+as FSV-2024-1847. This worker polls the vendor's ticket endpoint for their
+status and writes the ones that changed back to errors.csv in one commit:
+tickets Fiserv resolved become Fixed, tickets it rejected go back to
+Investigating.
+
+Lookups are batched (BATCH_SIZE tickets per POST), sent concurrently over a
+small pool of keep-alive HTTP connections (stdlib asyncio, no client
+library needed), retried with exponential backoff (honouring Retry-After)
+and conditional: each ticket is sent with the ETag of its last answer, and
+unchanged tickets come back as not modified.
+
+Endpoint (DEVOPSHUB_FISERV_URL, POST <url>/tickets/status):
+    request  {"tickets": [{"id": "FSV-2024-1847", "etag": "..."}, ...]}
+    response {"tickets": [{"id": ..., "status": "Resolved", "etag": ...}
+                          | {"id": ..., "not_modified": true}, ...]}
+
+Usage:
+    python -m devopshub.fiserv sync --once       # poll once and write changes
+    python -m devopshub.fiserv sync --interval 300
+    python -m devopshub.fiserv bench --tickets 5000   # against the local mock
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import urllib.parse
+from datetime import datetime
+
+FISERV_URL = os.environ.get("DEVOPSHUB_FISERV_URL", "http://127.0.0.1:8765")
+STATUS_PATH = "/tickets/status"
+
+BATCH_SIZE = 100
+POOL_SIZE = 8
+REQUEST_TIMEOUT = 10
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+SYNC_ACTOR = "fiserv-sync"
+
+# Error status of everything waiting on a ticket
+ESCALATED = "Reported to Fiserv"
+
+# Fiserv ticket status -> error status; anything else leaves the error as it is
+ERROR_STATUSES = {
+    "Resolved": "Fixed",
+    "Closed": "Fixed",
+    "Rejected": "Investigating",
+}
+
+
+class FiservError(Exception):
+    """The ticket endpoint failed or kept failing"""
+
+
+async def read_message(reader):
+    """(start line, {lowercase header: value}, body) of one HTTP/1.1 message, None at EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return line.decode("latin-1").strip(), headers, body
+
+
+def write_message(writer, start_line, body=b"", headers=None):
+    """Send one HTTP/1.1 message with a Content-Length body"""
+    lines = [start_line, f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one server, at most `size` in use at once"""
+
+    def __init__(self, url, size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.opened = 0
+        self.requests = 0
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method, path, body=b"", headers=None):
+        """(status, headers, body) of one request, on an idle connection if there is one"""
+        async with self._slots:
+            if self._idle:
+                reader, writer = self._idle.pop()
+            else:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+                self.opened += 1
+            try:
+                write_message(writer, f"{method} {self.base_path}{path} HTTP/1.1", body, {
+                    "Host": f"{self.host}:{self.port}",
+                    "Content-Type": "application/json",
+                    **(headers or {}),
+                })
+                response = await asyncio.wait_for(read_message(reader), self.timeout)
+                if response is None:
+                    raise ConnectionResetError("Connection closed by server")
+            except BaseException:
+                writer.close()
+                raise
+            self.requests += 1
+            status_line, response_headers, response_body = response
+            if response_headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return int(status_line.split()[1]), response_headers, response_body
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for _, writer in idle), return_exceptions=True)
+
+
+async def post_json(pool, path, payload):
+    """POST `payload` and return the decoded answer, retrying transient failures with backoff"""
+    body = json.dumps(payload).encode()
+    for attempt in range(MAX_ATTEMPTS):
+        retry_after = None
+        try:
+            status, headers, data = await pool.request("POST", path, body)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+            error = exc
+        else:
+            if status == 200:
+                return json.loads(data)
+            error = FiservError(f"{path} answered HTTP {status}")
+            if status not in RETRY_STATUSES:
+                raise error
+            retry_after = headers.get("retry-after")
+        if attempt + 1 < MAX_ATTEMPTS:
+            delay = BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+            await asyncio.sleep(min(float(retry_after) if retry_after else delay, BACKOFF_MAX))
+    raise FiservError(f"{path} failed {MAX_ATTEMPTS} times") from error
+
+
+class TicketCache:
+    """Last ETag and status seen per ticket"""
+
+    def __init__(self):
+        self.entries = {}
+        self.not_modified = 0
+
+    async def lookup(self, pool, tickets):
+        """{ticket: status} for one batch of tickets"""
+        payload = {"tickets": [
+            {"id": t, "etag": self.entries[t][0]} if t in self.entries else {"id": t} for t in tickets
+        ]}
+        answer = await post_json(pool, STATUS_PATH, payload)
+        statuses = {}
+        for item in answer["tickets"]:
+            if item.get("not_modified") and item["id"] in self.entries:
+                self.not_modified += 1
+            else:
+                self.entries[item["id"]] = (item.get("etag"), item["status"])
+            statuses[item["id"]] = self.entries[item["id"]][1]
+        return statuses
+
+
+async def fetch_statuses(pool, tickets, cache, batch_size=BATCH_SIZE):
+    """{ticket: Fiserv status} for every ticket, batches looked up concurrently"""
+    tickets = list(dict.fromkeys(tickets))
+    batches = [tickets[i:i + batch_size] for i in range(0, len(tickets), batch_size)]
+    results = await asyncio.gather(*(cache.lookup(pool, batch) for batch in batches))
+    return {ticket: status for result in results for ticket, status in result.items()}
+
+
+def status_updates(errors_df, statuses):
+    """storage.commit_changes() updates for escalated errors whose ticket status moved on
+
+    Each applies only to errors still escalated when it is written, so a
+    status someone set meanwhile is not overwritten.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    new_status = errors_df["Fiserv Ticket"].map(statuses).map(ERROR_STATUSES)
+    updates = []
+    for status, ids in errors_df.loc[new_status.notna(), "ID"].groupby(new_status.dropna()):
+        values = {"Status": status}
+        if status == "Fixed":
+            values["Date Resolved"] = today
+        updates.append((ids.tolist(), values, {"Status": ESCALATED}))
+    return updates
+
+
+def escalated(errors_df):
+    """Errors waiting on a Fiserv ticket"""
+    tickets = errors_df["Fiserv Ticket"].fillna("").astype(str)
+    return errors_df[(errors_df["Status"] == ESCALATED) & (tickets != "")]
+
+
+async def sync(url=FISERV_URL, interval=300, once=False):
+    """Poll ticket statuses and write changes, every `interval` seconds (or once)
+
+    A failed round is reported and retried at the next interval; with
+    `once` the error is raised instead.
+    """
+    pool = ConnectionPool(url)
+    cache = TicketCache()
+    try:
+        while True:
+            try:
+                changed = await sync_round(pool, cache)
+            except Exception as exc:
+                if once:
+                    raise
+                print(f"[WARN] Fiserv sync round failed: {exc}", file=sys.stderr)
+            else:
+                if once:
+                    return changed
+            await asyncio.sleep(interval)
+    finally:
+        await pool.close()
+
+
+async def sync_round(pool, cache):
+    """Look up the tickets of every escalated error once and write what changed, returns the count"""
+    from devopshub import commit, storage
+
+    waiting = escalated(storage.read_table("errors"))
+    started = time.perf_counter()
+    statuses = await fetch_statuses(pool, waiting["Fiserv Ticket"].tolist(), cache)
+    updates = status_updates(waiting, statuses)
+    if updates:
+        await asyncio.to_thread(commit.save, "errors", updates=updates, actor=SYNC_ACTOR)
+    changed = sum(len(ids) for ids, _, _ in updates)
+    print(f"[OK] {len(statuses)} tickets checked in {time.perf_counter() - started:.2f}s, "
+          f"{changed} errors updated")
+    return changed
+
+
+async def bench(tickets, rounds, **mock_options):
+    """Look up `tickets` synthetic tickets `rounds` times against an in-process mock server"""
+    from devopshub import fiserv_mock
+
+    mock = fiserv_mock.MockFiserv(**mock_options)
+    server = await asyncio.start_server(mock.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    pool = ConnectionPool(f"http://127.0.0.1:{port}")
+    cache = TicketCache()
+    ids = [f"FSV-BENCH-{i:06d}" for i in range(tickets)]
+    try:
+        for number in range(1, rounds + 1):
+            started = time.perf_counter()
+            statuses = await fetch_statuses(pool, ids, cache)
+            elapsed = time.perf_counter() - started
+            resolved = sum(s in ERROR_STATUSES for s in statuses.values())
+            print(f"round {number}: {len(statuses)} tickets in {elapsed:.2f}s "
+                  f"({len(statuses) / elapsed:,.0f}/s), {resolved} resolved or rejected")
+        print(f"{pool.requests} requests over {pool.opened} connections, "
+              f"{cache.not_modified} not modified, {mock.failures} failures injected")
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync escalated errors with their Fiserv tickets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("sync", help="Poll ticket statuses and write changes to errors.csv")
+    run.add_argument("--url", default=FISERV_URL, help="Ticket endpoint (default DEVOPSHUB_FISERV_URL)")
+    run.add_argument("--interval", type=float, default=300, help="Seconds between polls")
+    run.add_argument("--once", action="store_true", help="Poll once and exit")
+    load = sub.add_parser("bench", help="Load-test the sync against a local mock server")
+    load.add_argument("--tickets", type=int, default=5000)
+    load.add_argument("--rounds", type=int, default=3)
+    load.add_argument("--change-rate", type=float, default=0.05)
+    load.add_argument("--fail-rate", type=float, default=0.02)
+    load.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "sync":
+        asyncio.run(sync(args.url, args.interval, args.once))
+    else:
+        asyncio.run(bench(args.tickets, args.rounds, change_rate=args.change_rate,
+                          fail_rate=args.fail_rate, latency=args.latency_ms / 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
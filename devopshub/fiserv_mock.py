@@ -0,0 +1,103 @@
+"""
+Local stand-in for the Fiserv ticket endpoint
+
+Answers POST /tickets/status like the real service (see fiserv.py), with
+made-up tickets: every ticket it is asked about starts Open and, on each
+lookup, moves on (Open -> In Progress -> Resolved, sometimes Rejected) with
+probability `change_rate`. `fail_rate` of the requests get a 503 with
+Retry-After, and each request takes `latency` seconds, so the sync worker's
+backoff and concurrency can be exercised without a vendor connection.
+
+Usage:
+    python -m devopshub.fiserv_mock --port 8765
+    DEVOPSHUB_FISERV_URL=http://127.0.0.1:8765 python -m devopshub.fiserv sync --once
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+from devopshub.fiserv import STATUS_PATH, read_message, write_message
+
+NEXT_STATUS = {"Open": "In Progress", "In Progress": "Resolved"}
+REJECT_SHARE = 0.1
+
+
+class MockFiserv:
+    """Ticket states and the HTTP handler serving them"""
+
+    def __init__(self, change_rate=0.05, fail_rate=0.0, latency=0.0, seed=0):
+        self.change_rate = change_rate
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.tickets = {}
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+
+    def lookup(self, item):
+        """Answer for one {"id", "etag"} entry of a request"""
+        ticket = self.tickets.setdefault(item["id"], ["Open", 1])
+        if ticket[0] in NEXT_STATUS and self._random.random() < self.change_rate:
+            rejected = ticket[0] == "In Progress" and self._random.random() < REJECT_SHARE
+            ticket[0] = "Rejected" if rejected else NEXT_STATUS[ticket[0]]
+            ticket[1] += 1
+        etag = f'"{item["id"]}-{ticket[1]}"'
+        if item.get("etag") == etag:
+            return {"id": item["id"], "not_modified": True}
+        return {"id": item["id"], "status": ticket[0], "etag": etag}
+
+    async def handle(self, reader, writer):
+        """Serve requests on one keep-alive connection until the client closes it"""
+        try:
+            while (request := await read_message(reader)) is not None:
+                start_line, headers, body = request
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                method, path = start_line.split()[:2]
+                if method != "POST" or path != STATUS_PATH:
+                    write_message(writer, "HTTP/1.1 404 Not Found")
+                elif self._random.random() < self.fail_rate:
+                    self.failures += 1
+                    write_message(writer, "HTTP/1.1 503 Service Unavailable", headers={"Retry-After": "0.1"})
+                else:
+                    answer = {"tickets": [self.lookup(item) for item in json.loads(body)["tickets"]]}
+                    write_message(writer, "HTTP/1.1 200 OK", json.dumps(answer).encode(),
+                                  {"Content-Type": "application/json"})
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, **options):
+    mock = MockFiserv(**options)
+    server = await asyncio.start_server(mock.handle, host, port)
+    print(f"Mock Fiserv listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the Fiserv ticket endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--change-rate", type=float, default=0.05, help="Chance a ticket moves on per lookup")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay before each answer")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, change_rate=args.change_rate,
+                          fail_rate=args.fail_rate, latency=args.latency_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Monte Carlo delivery forecasts for open requests and projects
+
+Two things are learned from completed requests:
+
+    resolution time  Created Date to Completed Date, grouped by assignee,
+                     type and priority
+    throughput       completions per week of each assignee over the last
+                     THROUGHPUT_WEEKS weeks
+
+Each open request draws SIMULATIONS resolution times from the most specific
+group with at least MIN_SAMPLES completions, conditioned on how long it has
+already been open. It also waits its turn: an assignee's open requests form
+a queue (work under way first, then by priority and age), and weekly
+throughput drawn from their history says when the queue reaches it, so a
+busy assignee's requests are forecast later. Each simulation takes the later
+of the two, and the percentiles of those draws are the forecast. Assignees
+with too little history of their own get the team's throughput per
+assignee; unassigned requests only have a resolution time.
+
+A project is done when its last open linked request is done and its pending
+SDLC phases are through, with phase lengths drawn from deployed projects.
+
+History is learned incrementally (only newly completed requests are added,
+and a request that is reopened is taken out again) and a forecast is only
+recomputed when its history, its place in the queue or the day changes.
+"""
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+SIMULATIONS = 2000
+MIN_SAMPLES = 5
+PERCENTILES = (50, 85, 95)
+COLUMNS = [f"P{p}" for p in PERCENTILES]
+
+# Most specific grouping first, () is all completed requests
+GROUPINGS = [
+    ("Assigned To", "Type", "Priority"),
+    ("Assigned To", "Type"),
+    ("Type", "Priority"),
+    ("Type",),
+    (),
+]
+FIELDS = ["Assigned To", "Type", "Priority"]
+
+OPEN_PROJECT_STATUSES = ["Planning", "In Progress", "Testing", "On Hold"]
+
+THROUGHPUT_WEEKS = 26
+# Queues longer than this many weeks are forecast at the limit
+MAX_WEEKS = 104
+UNASSIGNED = "Unassigned"
+
+# Queue order: work under way first, then by priority, then oldest first
+STATUS_RANK = {"Testing": 0, "In Progress": 1, "Submitted": 2}
+PRIORITY_RANK = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3}
+
+
+def _days_between(start, end):
+    start = pd.to_datetime(start, errors="coerce")
+    end = pd.to_datetime(end, errors="coerce")
+    return (end - start).dt.days
+
+
+def _rng(*parts):
+    return np.random.default_rng(zlib.crc32(repr(parts).encode()))
+
+
+def _remove_one(values, value):
+    """Sorted `values` without one occurrence of `value`"""
+    i = np.searchsorted(values, value)
+    return np.delete(values, i) if i < len(values) and values[i] == value else values
+
+
+def queue_positions(open_df):
+    """{ID: place in its assignee's queue (1 = next)} for open requests with an assignee"""
+    queue = pd.DataFrame({
+        "ID": open_df["ID"].to_numpy(),
+        "who": open_df["Assigned To"].astype(str).to_numpy(),
+        "status": open_df["Status"].astype(str).map(STATUS_RANK).fillna(len(STATUS_RANK)).to_numpy(),
+        "priority": open_df["Priority"].astype(str).map(PRIORITY_RANK).fillna(len(PRIORITY_RANK)).to_numpy(),
+        "created": pd.to_datetime(open_df["Created Date"], errors="coerce").to_numpy(),
+    })
+    queue = queue[~queue["who"].isin([UNASSIGNED, "nan", ""])]
+    queue = queue.sort_values(["who", "status", "priority", "created"], kind="stable")
+    return dict(zip(queue["ID"], queue.groupby("who", sort=False).cumcount() + 1))
+
+
+class Forecaster:
+    """Resolution-time and throughput history plus cached forecasts for one data directory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}         # ID -> (fingerprint, days, keys, completed, assignee) learned from it
+        self._learned_version = None
+        self._samples = {}
+        self._versions = {}
+        self._completions = {}  # assignee -> sorted completion dates
+        self._history = 0       # bumped whenever completions are added or taken out
+        self._throughput = {}   # assignee -> weekly completions, for _throughput_key
+        self._throughput_key = None
+        self._phase_samples = np.empty(0)
+        self._request_cache = {}
+        self._project_cache = {}
+
+    def learn(self, requests_df):
+        """Add the requests completed since the last call, take out those reopened or changed since"""
+        version = (requests_df.attrs.get("version"), len(requests_df))
+        if version[0] is not None and version == self._learned_version:
+            return
+        self._learned_version = version
+        completed = requests_df["Status"].isin(["Completed"]).to_numpy()
+        fingerprints = requests_df["Created Date"].astype(str) + "|" + requests_df["Completed Date"].astype(str)
+        for column in FIELDS:
+            fingerprints = fingerprints + "|" + requests_df[column].astype(str)
+        seen = requests_df["ID"].map({row_id: learned[0] for row_id, learned in self._seen.items()})
+        stale = seen.notna().to_numpy() & (~completed | (seen != fingerprints).to_numpy())
+        self._forget(requests_df["ID"][stale])
+        new = completed & (seen.isna().to_numpy() | stale)
+        if new.any():
+            self._add(requests_df[new], fingerprints[new])
+
+    def _add(self, done, fingerprints):
+        days = _days_between(done["Created Date"], done["Completed Date"])
+        valid = days.notna() & (days >= 0)
+        keys = done[FIELDS].astype(str)
+        completed = pd.to_datetime(done["Completed Date"], errors="coerce").to_numpy("datetime64[D]")
+        for row_id, fingerprint, row_days, is_valid, row_keys, when in zip(
+                done["ID"], fingerprints, days, valid, keys.itertuples(index=False), completed):
+            self._seen[row_id] = (fingerprint, float(row_days) if is_valid else None, tuple(row_keys),
+                                  when, row_keys[0])
+        days = days[valid].astype(float)
+        keys = keys[valid]
+        for grouping in GROUPINGS:
+            if grouping:
+                groups = days.groupby([keys[c] for c in grouping], sort=False)
+                batches = [(name if isinstance(name, tuple) else (name,), values) for name, values in groups]
+            else:
+                batches = [((), days)]
+            for name, values in batches:
+                key = (grouping, name)
+                current = self._samples.get(key, np.empty(0))
+                self._samples[key] = np.sort(np.concatenate([current, values.to_numpy()]))
+                self._versions[key] = self._versions.get(key, 0) + 1
+        dated = ~np.isnat(completed)
+        assignees = done["Assigned To"].astype(str).to_numpy()[dated]
+        for assignee in np.unique(assignees):
+            current = self._completions.get(assignee, np.empty(0, dtype="datetime64[D]"))
+            dates = completed[dated][assignees == assignee]
+            self._completions[assignee] = np.sort(np.concatenate([current, dates]))
+        self._history += 1
+
+    def _forget(self, row_ids):
+        """Take what was learned from `row_ids` out of the history (they were reopened or edited)"""
+        for row_id in row_ids:
+            _, days, keys, when, assignee = self._seen.pop(row_id)
+            if days is not None:
+                fields = dict(zip(FIELDS, keys))
+                for grouping in GROUPINGS:
+                    key = (grouping, tuple(fields[c] for c in grouping))
+                    self._samples[key] = _remove_one(self._samples[key], days)
+                    self._versions[key] += 1
+            if not np.isnat(when):
+                self._completions[assignee] = _remove_one(self._completions[assignee], when)
+            self._history += 1
+
+    def learn_phases(self, projects_df):
+        """Days per SDLC phase, from deployed projects (or current pace while there are too few)"""
+        phases = projects_df["SDLC Checklist"].fillna("").str.count(r"\|") + 1
+        complete = projects_df["SDLC Checklist"].fillna("").str.count(":Complete")
+        deployed = projects_df["Status"] == "Deployed"
+        per_phase = _days_between(projects_df["Start Date"], projects_df["Actual Completion"]) / phases
+        samples = per_phase[deployed & (per_phase > 0)]
+        if len(samples) < MIN_SAMPLES:
+            elapsed = _days_between(projects_df["Start Date"], pd.Series(datetime.now(), index=projects_df.index))
+            pace = elapsed / complete.where(complete > 0)
+            samples = pd.concat([samples, pace[~deployed & (pace > 0)]])
+        self._phase_samples = np.sort(samples.dropna().to_numpy(dtype=float))
+
+    def _group_for(self, fields):
+        """Most specific group with enough history for {field: value}"""
+        for grouping in GROUPINGS:
+            key = (grouping, tuple(str(fields[c]) for c in grouping))
+            if len(self._samples.get(key, ())) >= MIN_SAMPLES:
+                return key
+        key = ((), ())
+        return key if len(self._samples.get(key, ())) else None
+
+    def _signatures(self, open_df, positions, today):
+        """Cache signature (group, its history version, created, day, queue place) per open request"""
+        groups = {}
+        signatures = []
+        for *values, created, row_id in open_df[FIELDS + ["Created Date", "ID"]].itertuples(index=False):
+            values = tuple(values)
+            if values not in groups:
+                groups[values] = self._group_for(dict(zip(FIELDS, values)))
+            key = groups[values]
+            position = positions.get(row_id)
+            if key is None and position is None:
+                signatures.append(None)
+                continue
+            version = None if key is None else self._versions[key]
+            signatures.append((key, version, created, today.date(), str(values[0]), position, self._history))
+        return signatures
+
+    def _simulate(self, key, ages, seed):
+        """Total days from creation to completion, shape (len(ages), SIMULATIONS)"""
+        durations = self._samples[key]
+        u = _rng(key, seed).random((len(ages), SIMULATIONS))
+        # Only durations longer than the item's current age are still possible
+        start = np.searchsorted(durations, ages, side="right")[:, None]
+        tail = len(durations) - start
+        conditional = durations[np.minimum(start + (u * tail).astype(int), len(durations) - 1)]
+        # Older than anything seen so far: age plus a fresh draw
+        beyond = ages[:, None] + durations[(u * len(durations)).astype(int)]
+        return np.where(tail > 0, conditional, beyond)
+
+    def _weekly_throughput(self, assignee, today):
+        """Completions per week to draw from for `assignee`, None if nobody has finished anything lately"""
+        key = (today.date(), self._history)
+        if self._throughput_key != key:
+            # Another day or more history: start afresh
+            self._throughput, self._throughput_key = {}, key
+        if assignee not in self._throughput:
+            self._throughput[assignee] = self._compute_throughput(assignee, today)
+        return self._throughput[assignee]
+
+    def _compute_throughput(self, assignee, today):
+        edges = np.datetime64(today.date(), "D") - np.arange(THROUGHPUT_WEEKS, -1, -1) * 7
+        own = self._completions.get(assignee, np.empty(0, dtype="datetime64[D]"))
+        counts = np.diff(np.searchsorted(own, edges))
+        if counts.sum() >= MIN_SAMPLES:
+            # Weeks before their first completion are not zero-throughput weeks
+            return counts[edges[1:] > own[0]].astype(float)
+        # Too little history of their own: the team's throughput per active assignee
+        recent = {
+            who: dates for who, dates in self._completions.items()
+            if who != UNASSIGNED and np.searchsorted(dates, edges[0]) < len(dates)
+        }
+        if not recent:
+            return None
+        team = np.sort(np.concatenate(list(recent.values())))
+        return np.diff(np.searchsorted(team, edges)) / len(recent)
+
+    def _queue_days(self, assignee, positions, today):
+        """Days until the queue of `assignee` reaches each of `positions`, shape (len(positions), SIMULATIONS)"""
+        weekly = self._weekly_throughput(assignee, today)
+        if weekly is None:
+            return None
+        rng = _rng("throughput", assignee, today.date().isoformat())
+        done = np.cumsum(weekly[rng.integers(0, len(weekly), (SIMULATIONS, MAX_WEEKS))], axis=1)
+        # Whole weeks before the k-th request is done, then somewhere within the week it is
+        weeks = np.stack([(done < position).sum(axis=1) for position in positions])
+        return (weeks + rng.random(weeks.shape)) * 7
+
+    def _request_draws(self, open_df, positions, today):
+        """{ID: (signature, completion days from today per simulation)} for open requests"""
+        created = pd.to_datetime(open_df["Created Date"], errors="coerce")
+        ages = (today - created).dt.days.fillna(0).clip(lower=0).to_numpy(dtype=float)
+        signatures = self._signatures(open_df, positions, today)
+        # One vectorized simulation per history group, and per assignee queue
+        by_group, by_assignee = {}, {}
+        for row, signature in enumerate(signatures):
+            if signature is None:
+                continue
+            if signature[0] is not None:
+                by_group.setdefault(signature[0], []).append(row)
+            if signature[5] is not None:
+                by_assignee.setdefault(signature[4], []).append(row)
+        remaining = {}
+        for key, rows in by_group.items():
+            rows = np.array(rows)
+            total = self._simulate(key, ages[rows], today.date().isoformat())
+            remaining.update(zip(rows, np.maximum(total - ages[rows, None], 0)))
+        for assignee, rows in by_assignee.items():
+            queued = self._queue_days(assignee, [signatures[row][5] for row in rows], today)
+            if queued is None:
+                continue
+            for row, days in zip(rows, queued):
+                remaining[row] = np.maximum(remaining[row], days) if row in remaining else days
+        return {open_df["ID"].iloc[row]: (signatures[row], days) for row, days in remaining.items()}
+
+    def requests(self, requests_df, today=None):
+        """Forecast completion dates of open requests, indexed by ID"""
+        today = pd.Timestamp(today or datetime.now()).normalize()
+        with self._lock:
+            self.learn(requests_df)
+            open_df = requests_df[requests_df["Status"] != "Completed"]
+            positions = queue_positions(open_df)
+            stale = [self._request_cache.get(row_id, (None,))[0] != signature
+                     for row_id, signature in zip(open_df["ID"], self._signatures(open_df, positions, today))]
+            draws = self._request_draws(open_df[np.array(stale, dtype=bool)], positions, today)
+            if draws:
+                dates = _percentile_dates(np.stack([d for _, d in draws.values()]), today)
+                for (row_id, (signature, _)), row_dates in zip(draws.items(), dates):
+                    self._request_cache[row_id] = (signature, row_dates)
+            rows = {i: self._request_cache[i][1] for i in open_df["ID"] if i in self._request_cache}
+        return pd.DataFrame.from_dict(rows, orient="index", columns=COLUMNS)
+
+    def projects(self, projects_df, requests_df, today=None):
+        """Forecast completion dates of open projects, indexed by ID"""
+        today = pd.Timestamp(today or datetime.now()).normalize()
+        with self._lock:
+            self.learn(requests_df)
+            self.learn_phases(projects_df)
+            open_projects = projects_df[projects_df["Status"].isin(OPEN_PROJECT_STATUSES)]
+            linked = {
+                row_id: [r.strip() for r in str(links).split(",") if r.strip()] if pd.notna(links) else []
+                for row_id, links in zip(open_projects["ID"], open_projects["Linked Requests"])
+            }
+            wanted = {r for ids in linked.values() for r in ids}
+            all_open = requests_df[requests_df["Status"] != "Completed"]
+            # Queue places count every open request, linked to a project or not
+            positions = queue_positions(all_open)
+            request_draws = self._request_draws(all_open[all_open["ID"].isin(wanted)], positions, today)
+            phase_version = (len(self._phase_samples), float(self._phase_samples.sum()))
+
+            rows = {}
+            for _, proj in open_projects.iterrows():
+                pending = str(proj["SDLC Checklist"]).count(":Pending")
+                links = sorted(r for r in set(linked[proj["ID"]]) if r in request_draws)
+                signature = (pending, phase_version, tuple(request_draws[r][0] for r in links), today.date())
+                cached = self._project_cache.get(proj["ID"])
+                if cached is None or cached[0] != signature:
+                    draws = np.zeros(SIMULATIONS)
+                    if pending and len(self._phase_samples):
+                        picks = _rng(proj["ID"], today.date().isoformat()).integers(
+                            0, len(self._phase_samples), (SIMULATIONS, pending))
+                        draws = self._phase_samples[picks].sum(axis=1)
+                    for r in links:
+                        draws = np.maximum(draws, request_draws[r][1])
+                    cached = (signature, _percentile_dates(draws[None, :], today)[0])
+                    self._project_cache[proj["ID"]] = cached
+                rows[proj["ID"]] = cached[1]
+        return pd.DataFrame.from_dict(rows, orient="index", columns=COLUMNS)
+
+
+def _percentile_dates(draws, today):
+    """Percentile completion dates for each row of simulated days from today"""
+    days = np.ceil(np.percentile(draws, PERCENTILES, axis=1).T).astype("int64")
+    return list(today.to_datetime64() + days.astype("timedelta64[D]"))
+
+
+@st.cache_resource
+def get_forecaster(data_dir):
+    """Shared forecaster for a data directory (history survives reruns and sessions)"""
+    return Forecaster()
+
+
+def request_forecasts(requests_df, data_dir):
+    """P50/P85/P95 completion dates for the open requests in `requests_df`
+
+    Pass the table with its archive so completed history is included.
+    """
+    return get_forecaster(data_dir).requests(requests_df)
+
+
+def project_forecasts(projects_df, requests_df, data_dir):
+    """P50/P85/P95 completion dates for open projects"""
+    return get_forecaster(data_dir).projects(projects_df, requests_df)
@@ -0,0 +1,149 @@
+"""
+As-of queries over the journaled history of requests, errors and projects
+
+A gzip'd snapshot of every table is written each SNAPSHOT_EVERY journal
+events. To answer "what did the errors table look like on 2025-10-01" we
+load the newest snapshot taken before that date and replay only the
+journal events between the snapshot and the date, so the cost depends on
+the number of changes since the snapshot rather than the whole history.
+
+Usage:
+    python -m devopshub.history as-of 2025-10-01 errors > errors_2025-10-01.csv
+    python -m devopshub.history snapshot
+"""
+import argparse
+import bisect
+import gzip
+import json
+import os
+import sys
+from datetime import date, datetime
+from functools import lru_cache
+
+import pandas as pd
+
+from devopshub import journal as journal_module
+
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_EVERY = int(os.environ.get("DEVOPSHUB_SNAPSHOT_EVERY", "500"))
+
+_TS_FORMAT = "%Y%m%dT%H%M%S"
+
+
+def _snapshot_dir(data_dir):
+    return os.path.join(data_dir, SNAPSHOT_DIR)
+
+
+def list_snapshots(data_dir):
+    """(ts, seq, path) of every snapshot, oldest first"""
+    folder = _snapshot_dir(data_dir)
+    if not os.path.isdir(folder):
+        return []
+    snapshots = []
+    for name in os.listdir(folder):
+        # snapshot-<seq>-<timestamp>.json.gz
+        if not (name.startswith("snapshot-") and name.endswith(".json.gz")):
+            continue
+        _, seq, stamp = name[:-len(".json.gz")].split("-")
+        ts = datetime.strptime(stamp, _TS_FORMAT).isoformat(timespec="seconds")
+        snapshots.append((ts, int(seq), os.path.join(folder, name)))
+    return sorted(snapshots)
+
+
+def write_snapshot(journal, data_dir):
+    """Snapshot the journal's current state of every table"""
+    checkpoint = journal.checkpoint()
+    if not checkpoint["seq"]:
+        return None
+    folder = _snapshot_dir(data_dir)
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.fromisoformat(checkpoint["ts"]).strftime(_TS_FORMAT)
+    path = os.path.join(folder, f"snapshot-{checkpoint['seq']:010d}-{stamp}.json.gz")
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def maybe_snapshot(journal, data_dir):
+    """Write a snapshot once SNAPSHOT_EVERY events have accumulated since the last one"""
+    snapshots = list_snapshots(data_dir)
+    last_seq = snapshots[-1][1] if snapshots else 0
+    if journal.seq - last_seq >= SNAPSHOT_EVERY:
+        return write_snapshot(journal, data_dir)
+    return None
+
+
+@lru_cache(maxsize=8)
+def _load_snapshot(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def as_of(entity, when, data_dir):
+    """The `entity` table as it was at the end of `when` (a date or datetime)"""
+    if isinstance(when, datetime):
+        cutoff = when.isoformat(timespec="seconds")
+    elif isinstance(when, date):
+        cutoff = f"{when.isoformat()}T23:59:59"
+    else:
+        cutoff = str(when)
+
+    # Newest snapshot taken at or before the cutoff
+    snapshots = list_snapshots(data_dir)
+    position = bisect.bisect_right([ts for ts, _, _ in snapshots], cutoff)
+    if position > 0:
+        snapshot = _load_snapshot(snapshots[position - 1][2])
+        rows = {k: dict(v) for k, v in snapshot["tables"].get(entity, {}).items()}
+        columns = list(snapshot["columns"].get(entity, []))
+        offset = snapshot["offset"]
+    else:
+        rows, columns, offset = {}, [], 0
+
+    # Replay only the events between the snapshot and the cutoff
+    journal_path = os.path.join(data_dir, journal_module.JOURNAL_FILE)
+    replayed_to = offset
+    if os.path.exists(journal_path):
+        for replayed_to, event in journal_module.read_events(journal_path, offset):
+            if event["ts"] > cutoff:
+                break
+            if event["entity"] == entity:
+                journal_module.apply_event(rows, columns, event)
+
+    df = pd.DataFrame(list(rows.values()), columns=columns)
+    df.attrs["version"] = ("as_of", entity, cutoff, replayed_to)
+    return df
+
+
+def history_start(data_dir):
+    """Timestamp of the first journaled event, or None"""
+    journal_path = os.path.join(data_dir, journal_module.JOURNAL_FILE)
+    if not os.path.exists(journal_path):
+        return None
+    for _, event in journal_module.read_events(journal_path):
+        return event["ts"]
+    return None
+
+
+def main(argv=None):
+    from devopshub import storage
+
+    parser = argparse.ArgumentParser(description="Query DevOpsHub data as of a past date")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query = sub.add_parser("as-of", help="Print a table as it was at the end of DATE as CSV")
+    query.add_argument("date", type=date.fromisoformat)
+    query.add_argument("entity", choices=storage.ENTITIES)
+    sub.add_parser("snapshot", help="Write a snapshot of the current state now")
+    args = parser.parse_args(argv)
+
+    if args.command == "as-of":
+        as_of(args.entity, args.date, storage.data_dir()).to_csv(sys.stdout, index=False)
+    elif args.command == "snapshot":
+        path = write_snapshot(storage.get_journal(), storage.data_dir())
+        print(f"[OK] Wrote {path}" if path else "Nothing journaled yet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""
+Append-only event journal of creates and status transitions
+
+Every write through storage.write_table() is recorded as one JSON line per
+created, updated or deleted row in data/journal.jsonl. The current tables
+can be rebuilt by replaying the journal, and analytics can follow it from a
+byte offset to consume only the events they have not seen yet.
+
+Usage:
+    python -m devopshub.journal history REQ-012
+    python -m devopshub.journal rebuild
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+JOURNAL_FILE = "journal.jsonl"
+
+# Events are written to the OS immediately but fsync'd in batches
+FSYNC_BATCH = int(os.environ.get("DEVOPSHUB_JOURNAL_FSYNC_BATCH", "64"))
+FSYNC_INTERVAL = float(os.environ.get("DEVOPSHUB_JOURNAL_FSYNC_INTERVAL", "0.05"))
+
+# Bytes read at a time when looking back for the end of the last complete line
+TAIL_BLOCK = 4096
+
+# Actor recorded for rows that changed on disk without going through the app
+EXTERNAL_ACTOR = "external"
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process only
+    fcntl = None
+
+
+class Journal:
+    """Append-only JSONL journal with an in-memory replay of the current state"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._file = None
+        self._offset = 0        # bytes of the file already applied to _state
+        self._seq = 0
+        self._state = {}        # entity -> {id: row}
+        self._columns = {}      # entity -> column order
+        self._index = {}        # (entity, id) -> [byte offsets of its events]
+        self._last_ts = None
+        self._pending = 0
+        self._timer = None
+
+    # Reading
+
+    def _catch_up(self):
+        """Apply events appended since we last looked (possibly by another process)"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._offset:
+            # The journal was replaced, start over
+            self._offset, self._seq, self._last_ts = 0, 0, None
+            self._state, self._columns, self._index = {}, {}, {}
+        if size == self._offset:
+            return
+        # Another process may be halfway through appending; stop before its line
+        end = complete_end(self.path, self._offset, size)
+        for offset, event in read_events(self.path, self._offset, end):
+            self._apply(event, offset)
+        self._offset = end
+
+    def _apply(self, event, offset):
+        entity, row_id = event["entity"], event["id"]
+        apply_event(self._state.setdefault(entity, {}), self._columns.setdefault(entity, []), event)
+        if event["op"] != "schema":
+            self._index.setdefault((entity, row_id), []).append(offset)
+        self._seq = max(self._seq, event["seq"])
+        self._last_ts = event["ts"]
+
+    def has_entity(self, entity):
+        """Whether anything has been journaled for `entity` yet"""
+        with self._lock:
+            self._catch_up()
+            return entity in self._state
+
+    def checkpoint(self):
+        """Consistent copy of the replayed state with the position it was taken at"""
+        with self._lock:
+            self._catch_up()
+            return {
+                "seq": self._seq,
+                "offset": self._offset,
+                "ts": self._last_ts,
+                "columns": {entity: list(columns) for entity, columns in self._columns.items()},
+                "tables": {entity: {k: dict(v) for k, v in rows.items()} for entity, rows in self._state.items()},
+            }
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def rows(self, entity):
+        """Copy of the current {id: row} of `entity`"""
+        with self._lock:
+            self._catch_up()
+            return {row_id: dict(row) for row_id, row in self._state.get(entity, {}).items()}
+
+    def replay(self, entity):
+        """Rebuild the current table for `entity` from the journal"""
+        with self._lock:
+            self._catch_up()
+            rows = self._state.get(entity, {})
+            return pd.DataFrame(list(rows.values()), columns=self._columns.get(entity, []))
+
+    def history(self, entity, row_id):
+        """All events recorded for one row, oldest first"""
+        with self._lock:
+            self._catch_up()
+            offsets = list(self._index.get((entity, row_id), []))
+        events = []
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                events.append(json.loads(f.readline()))
+        return events
+
+    def end(self):
+        """Byte offset follow() would return as the place to resume from, now"""
+        self.flush()
+        try:
+            return complete_end(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def follow(self, offset=0):
+        """Events written after byte `offset`, plus the offset to resume from"""
+        with self._lock:
+            self.flush()
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return [], 0
+        if offset > size:
+            offset = 0
+        end = complete_end(self.path, offset, size)
+        events = [event for _, event in read_events(self.path, offset, end)]
+        return events, end
+
+    # Writing
+
+    def record(self, entity, df, actor=None, keep=(), follow_up=None):
+        """Journal the difference between the replayed state and `df`
+
+        IDs in `keep` are not in `df` but still exist (e.g. archived rows),
+        so their absence is not a delete. `follow_up(events, state)` can add
+        events of its own (e.g. notifications, see notify.py), written
+        together with the changes; it sees the state before them.
+        """
+        with self._lock:
+            self._lock_file()
+            try:
+                self._catch_up()
+                before = self._state.get(entity, {})
+                events = diff_events(entity, before, df, actor or EXTERNAL_ACTOR, keep)
+                columns = [str(c) for c in df.columns]
+                if before and set(self._columns.get(entity, [])) - set(columns):
+                    # Columns were dropped (e.g. normalized away), replay must drop them too
+                    events.insert(0, {"entity": entity, "op": "schema", "id": "",
+                                      "actor": actor or EXTERNAL_ACTOR, "columns": columns})
+                if follow_up is not None and events:
+                    events += follow_up(events, self._state)
+                self._append(events)
+            finally:
+                self._unlock_file()
+            return events
+
+    def append(self, events):
+        """Journal events built by the caller (same format as record() writes)"""
+        with self._lock:
+            self._lock_file()
+            try:
+                self._catch_up()
+                self._append(events)
+            finally:
+                self._unlock_file()
+            return events
+
+    def _append(self, events):
+        if not events:
+            return
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        offset = self._offset
+        chunks = []
+        for event in events:
+            self._seq += 1
+            event["seq"] = self._seq
+            event["ts"] = event.get("ts") or timestamp
+            line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            self._apply(event, offset)
+            offset += len(line)
+            chunks.append(line)
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+        self._offset = offset
+
+        self._pending += len(events)
+        if self._pending >= FSYNC_BATCH:
+            self.sync()
+        elif self._timer is None:
+            self._timer = threading.Timer(FSYNC_INTERVAL, self.sync)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Push buffered events to the OS (not necessarily to disk)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def sync(self):
+        """fsync all pending events"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file is not None and self._pending:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+
+    def _lock_file(self):
+        self._open()
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+
+def apply_event(rows, columns, event):
+    """Apply one event to a replayed table ({id: row} plus column order)"""
+    op = event["op"]
+    if op == "create":
+        rows[event["id"]] = dict(event["set"])
+    elif op == "update":
+        rows.setdefault(event["id"], {"ID": event["id"]}).update(event["set"])
+    elif op == "delete":
+        rows.pop(event["id"], None)
+    elif op == "schema":
+        columns[:] = event["columns"]
+        kept = set(columns)
+        for row in rows.values():
+            for column in [c for c in row if c not in kept]:
+                del row[column]
+    for column in event.get("set", {}):
+        if column not in columns:
+            columns.append(column)
+
+
+def diff_events(entity, before, df, actor, keep=()):
+    """Create/update/delete events turning `before` ({id: row}) into `df`"""
+    after = _as_strings(df).drop_duplicates("ID", keep="last").set_index("ID", drop=False)
+    if before:
+        previous = pd.DataFrame.from_dict(before, orient="index").fillna("")
+    else:
+        previous = pd.DataFrame(columns=after.columns)
+    previous.index = previous.index.astype(str)
+
+    # New rows in one pass: a bulk import creates a great many of them
+    created = after.loc[after.index.difference(previous.index, sort=False)]
+    events = [
+        {"entity": entity, "op": "create", "id": row_id, "actor": actor, "set": values}
+        for row_id, values in zip(created.index, created.to_dict("records"))
+    ]
+
+    common = after.index.intersection(previous.index, sort=False)
+    if len(common) > 0:
+        columns = after.columns
+        new = after.loc[common, columns]
+        old = previous.reindex(index=common, columns=columns).fillna("")
+        changed = new.ne(old)
+        for row_id in changed.index[changed.any(axis=1)]:
+            mask = changed.loc[row_id]
+            events.append({"entity": entity, "op": "update", "id": row_id, "actor": actor,
+                           "set": new.loc[row_id, mask].to_dict(),
+                           "prev": old.loc[row_id, mask].to_dict()})
+
+    for row_id in previous.index.difference(after.index, sort=False):
+        if row_id in keep:
+            continue
+        events.append({"entity": entity, "op": "delete", "id": row_id, "actor": actor,
+                       "prev": {k: v for k, v in before[row_id].items()}})
+    return events
+
+
+def _as_strings(df):
+    """Journal values are stored as plain strings, with blanks for missing"""
+    return df.astype("string").fillna("").astype(object)
+
+
+def read_events(path, start=0, end=None):
+    """Yield (offset, event) for complete lines between byte offsets"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if end is not None and offset >= end:
+                break
+            if not line.endswith(b"\n"):
+                break  # partially written line, pick it up next time
+            yield offset, json.loads(line)
+            offset += len(line)
+
+
+def complete_end(path, start=0, end=None):
+    """Byte offset just past the last complete line between `start` and `end` (default: end of file)
+
+    Readers take no lock, so the tail of the file may be a line another
+    process is still writing; resuming from here picks it up once it is done.
+    """
+    with open(path, "rb") as f:
+        if end is None:
+            end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > start:
+            size = min(TAIL_BLOCK, position - start)
+            f.seek(position - size)
+            newline = f.read(size).rfind(b"\n")
+            if newline >= 0:
+                return position - size + newline + 1
+            position -= size
+    return start
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(data_dir):
+    """Process-wide journal for a data directory"""
+    path = os.path.join(data_dir, JOURNAL_FILE)
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = Journal(path)
+        return _journals[path]
+
+
+def main(argv=None):
+    from devopshub import archive, storage
+
+    parser = argparse.ArgumentParser(description="Inspect or replay the DevOpsHub event journal")
+    sub = parser.add_subparsers(dest="command", required=True)
+    history = sub.add_parser("history", help="Show every change recorded for one ID")
+    history.add_argument("id")
+    rebuild = sub.add_parser("rebuild", help="Rewrite the CSV tables from the journal")
+    rebuild.add_argument("--entity", choices=storage.ENTITIES, action="append")
+    args = parser.parse_args(argv)
+
+    journal = get_journal(storage.data_dir())
+    if args.command == "history":
+        entity = storage.entity_for_id(args.id)
+        for event in journal.history(entity, args.id):
+            if event["op"] == "update":
+                changes = ", ".join(f"{k}: {event['prev'].get(k, '')!r} -> {v!r}" for k, v in event["set"].items())
+            else:
+                changes = f"Status: {event.get('set', event.get('prev', {})).get('Status', '')!r}"
+            print(f"{event['ts']}  #{event['seq']}  {event['op']:<6}  {event['actor']:<16}  {changes}")
+    elif args.command == "rebuild":
+        for entity in args.entity or storage.ENTITIES:
+            if not journal.has_entity(entity):
+                print(f"[SKIP] Nothing journaled for {entity} yet")
+                continue
+            df = journal.replay(entity)
+            # Archived rows stay in their segments
+            df = df[~df["ID"].isin(archive.archived_ids(entity, storage.data_dir()))]
+            df.to_csv(storage.table_path(entity), index=False)
+            print(f"[OK] Rebuilt {entity} ({len(df)} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
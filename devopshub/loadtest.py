@@ -0,0 +1,369 @@
+"""
+Load test: many simulated users on one server
+
+Drives the real app.py and pages/*.py headlessly with Streamlit's AppTest,
+one AppTest per page a simulated user has open, many users at once on
+threads of this process (as one Streamlit server runs its sessions), all
+sharing its caches. Each user picks actions from a weighted mix:
+
+    view    open or rerun a page
+    filter  change a filter on the Requests, Errors or Projects page
+    expand  open a row's details (client-side in Streamlit, no rerun)
+    status  click a status button (Mark as In Progress, Mark as Fixed, ...)
+    submit  create a request or log an error through the form
+
+The test runs on a generated dataset in a temporary directory (the real
+data is never touched) and reports rerun latency percentiles per action,
+throughput, errors (exceptions in the scripts) and lost updates: status
+changes and submissions a user made that the journal or the tables do not
+have at the end.
+
+Usage:
+    python -m devopshub.loadtest --sessions 20 --actions 30
+    python -m devopshub.loadtest --requests 100000 --errors 20000 --sessions 50 --think-ms 0
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    "dashboard": os.path.join(ROOT, "app.py"),
+    "requests": glob.glob(os.path.join(ROOT, "pages", "1_*.py"))[0],
+    "errors": glob.glob(os.path.join(ROOT, "pages", "2_*.py"))[0],
+    "projects": glob.glob(os.path.join(ROOT, "pages", "3_*.py"))[0],
+}
+
+MIX = {"view": 4, "filter": 3, "expand": 2, "status": 2, "submit": 1}
+
+# Status button key prefix -> (entity, new status)
+STATUS_BUTTONS = {
+    "prog_": ("requests", "In Progress"),
+    "comp_": ("requests", "Completed"),
+    "inv_": ("errors", "Investigating"),
+    "fix_": ("errors", "Fixed"),
+    "fis_": ("errors", "Reported to Fiserv"),
+    "test_": ("projects", "Testing"),
+    "dep_": ("projects", "Deployed"),
+}
+
+PERCENTILES = [50, 90, 95, 99]
+TIMEOUT = 300
+WORDS = ("ledger", "posting", "escrow", "dividend", "overdraft", "teller", "branch", "statement",
+         "reconcile", "mortgage", "collateral", "payroll", "audit", "kiosk", "wire", "ach")
+
+
+def generate(source_dir, data_dir, requests, errors, projects, seed=0):
+    """Write a dataset of the given size to `data_dir`, resampled from the tables in `source_dir`"""
+    from devopshub import storage
+
+    rng = np.random.default_rng(seed)
+    storage.DATA_DIR = source_dir
+    tables = {entity: storage.read_table(entity, include_archive=True) for entity in storage.ENTITIES}
+    os.makedirs(data_dir, exist_ok=True)
+    if os.path.exists(os.path.join(source_dir, "people.csv")):
+        shutil.copy(os.path.join(source_dir, "people.csv"), os.path.join(data_dir, "people.csv"))
+    storage.DATA_DIR = data_dir
+
+    def resample(df, size, prefix):
+        df = df.sample(size, replace=True, random_state=rng.integers(1 << 31), ignore_index=True)
+        df["ID"] = [f"{prefix}{i:03d}" for i in range(1, size + 1)]
+        return df
+
+    def days_ago(size, most):
+        return pd.Timestamp.now().normalize() - pd.to_timedelta(rng.integers(0, most, size), unit="D")
+
+    df = resample(tables["requests"], requests, "REQ-")
+    created = days_ago(requests, 365)
+    df["Title"] = df["Title"] + " " + pd.Series(rng.choice(WORDS, requests)) + " " + df["ID"].str[4:]
+    df["Created Date"] = created.strftime("%Y-%m-%d")
+    df["Due Date"] = (created + pd.to_timedelta(rng.integers(7, 60, requests), unit="D")).strftime("%Y-%m-%d")
+    completed = created + pd.to_timedelta(rng.integers(1, 45, requests), unit="D")
+    df["Completed Date"] = np.where(df["Status"] == "Completed", completed.strftime("%Y-%m-%d"), "")
+    df["Related Project"] = ""
+    storage.write_table("requests", df, actor="loadtest")
+
+    df = resample(tables["errors"], errors, "ERR-")
+    reported = days_ago(errors, 365)
+    df["Date Reported"] = reported.strftime("%Y-%m-%d")
+    resolved = reported + pd.to_timedelta(rng.integers(0, 30, errors), unit="D")
+    df["Date Resolved"] = np.where(df["Status"] == "Fixed", resolved.strftime("%Y-%m-%d"), "")
+    storage.write_table("errors", df, actor="loadtest")
+
+    df = resample(tables["projects"], projects, "PROJ-")
+    df["Linked Requests"] = [
+        ",".join(f"REQ-{n:03d}" for n in rng.integers(1, requests + 1, rng.integers(1, 6))) for _ in range(projects)
+    ]
+    storage.write_table("projects", df, actor="loadtest")
+
+    for entity in ("requests", "errors"):
+        storage.archive_closed(entity)
+
+
+def share_runtime():
+    """Let AppTests run at the same time
+
+    AppTest installs a mock Streamlit Runtime for each run and removes it
+    when the run ends, pulling it from under any other run in progress.
+    Give every run of this process one shared runtime instead (which is
+    also what a real server does).
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import app_test
+
+    class _PerRun(Runtime):
+        _instance = None
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    # AppTest's per-run install (and removal) now lands on a subclass nobody reads
+    app_test.Runtime = _PerRun
+    config.set_option("global.appTest", True)
+
+
+class Session:
+    """One simulated user with their open pages"""
+
+    def __init__(self, number, seed, think):
+        self.name = f"loadtest-{number:03d}"
+        self.rng = random.Random(seed)
+        self.think = think
+        self.tabs = {}
+        self.page = None
+        self.partial = set()    # pages whose last rerun redrew only some fragments
+        self.timings = []       # (action, seconds, failed)
+        self.errors = []        # first line of each exception
+        self.changes = []       # (entity, ID, status) status changes that went through
+        self.created = []       # (entity, ID, title) submissions that went through
+        self.submitted = 0
+
+    def _app(self, page):
+        from streamlit.testing.v1 import AppTest
+
+        if page not in self.tabs:
+            app = AppTest.from_file(PAGES[page], default_timeout=TIMEOUT)
+            app.session_state["actor"] = self.name
+            self.tabs[page] = app
+        self.page = page
+        return self.tabs[page]
+
+    def _timed(self, action, step):
+        started = time.perf_counter()
+        try:
+            app = step()
+            self.errors += [e.message.splitlines()[0] for e in app.exception]
+            failed = len(app.exception) > 0
+        except Exception as exc:
+            self.errors.append(f"{type(exc).__name__}: {exc}".splitlines()[0])
+            app, failed = None, True
+        self.timings.append((action, time.perf_counter() - started, failed))
+        return None if failed else app
+
+    def run(self, actions):
+        actions_list, weights = list(MIX), list(MIX.values())
+        self._timed("view", lambda: self._app(self.rng.choice(list(PAGES))).run())
+        for _ in range(actions):
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+            getattr(self, self.rng.choices(actions_list, weights)[0])()
+
+    def view(self):
+        self._timed("view", lambda: self._app(self.rng.choice(list(PAGES))).run())
+
+    def _page_with(self, pages):
+        page = self.page if self.page in pages else self.rng.choice(pages)
+        app = self.tabs.get(page)
+        if app is None:
+            app = self._timed("view", lambda: self._app(page).run())
+        elif page in self.partial:
+            # AppTest keeps only what a fragment rerun redrew, a browser keeps the rest of
+            # the page; get it back without counting it as an action
+            self.partial.discard(page)
+            app.run()
+        self.page = page
+        return app
+
+    def filter(self):
+        app = self._page_with(["requests", "errors", "projects"])
+        if app is None or not len(app.multiselect):
+            return
+        widget = self.rng.choice(list(app.multiselect))
+        options = list(widget.options)
+        chosen = self.rng.sample(options, self.rng.randint(1, len(options))) if options else []
+        self._timed("filter", lambda: widget.set_value(chosen).run())
+
+    def expand(self):
+        app = self.tabs.get(self.page)
+        if app is not None and self.page not in self.partial and len(app.expander):
+            # Expanders open in the browser; the details are already in the page
+            _ = [element.value for element in self.rng.choice(list(app.expander)).markdown]
+
+    def status(self):
+        from devopshub import storage
+
+        app = self._page_with(["requests", "errors", "projects"])
+        if app is None:
+            return
+        buttons = [b for b in app.button if b.key and b.key.startswith(tuple(STATUS_BUTTONS))]
+        if not buttons:
+            return
+        button = self.rng.choice(buttons)
+        prefix, row_id = button.key.split("_", 1)
+        entity, status = STATUS_BUTTONS[prefix + "_"]
+        current = storage.read_table(entity, include_archive=True, columns=["Status"]).set_index("ID")["Status"]
+        if current.get(row_id) == status:
+            # A no-op click would leave nothing to check
+            return
+        if self._timed("status", lambda: button.click().run()) is not None:
+            self.changes.append((entity, row_id, status))
+        # Row buttons rerun just their row and the counters
+        self.partial.add(self.page)
+
+    def submit(self):
+        page = self.rng.choice(["requests", "errors"])
+        app = self._page_with([page])
+        if app is None:
+            return
+        self.submitted += 1
+        title = f"{self.name} {self.submitted} " + " ".join(self.rng.sample(WORDS, 3))
+        fields = {
+            "Request Title": title, "Your Name": "Load Test", "Your Email": "loadtest@lbsfinancial.org",
+            "Department": "IT", "Error Code": f"ERR-LOAD-{self.submitted:03d}",
+        }
+        for widget in app.text_input:
+            for label, value in fields.items():
+                if widget.label.startswith(label):
+                    widget.input(value)
+        for widget in app.text_area:
+            widget.input(title)
+        button = "Submit Request" if page == "requests" else "Log Error"
+        for _ in range(2):
+            # The second submit goes past a duplicate warning
+            submit = next((b for b in app.button if b.label == button), None)
+            if submit is None:
+                return
+            app = self._timed("submit", lambda: submit.click().run())
+            if app is None:
+                return
+            created = [m for s in app.success for m in re.findall(r"\b(?:REQ|ERR)-\d+", s.value)]
+            if created:
+                self.created.append((page, created[0], title))
+                return
+
+
+def lost_updates(sessions):
+    """(status changes, submissions) that went through but are not in the journal or tables"""
+    from devopshub import journal as journal_module
+    from devopshub import storage
+
+    journal = journal_module.get_journal(storage.data_dir())
+    journal.flush()
+    applied = set()
+    for _, event in journal_module.read_events(journal.path):
+        if event["op"] == "update" and "Status" in event["set"]:
+            applied.add((event["actor"], event["entity"], event["id"], event["set"]["Status"]))
+    lost_changes = sum(
+        (s.name, entity, row_id, status) not in applied for s in sessions for entity, row_id, status in s.changes
+    )
+    tables = {
+        entity: storage.read_table(entity, include_archive=True).set_index("ID")
+        for entity in ("requests", "errors")
+    }
+    title_column = {"requests": "Title", "errors": "Description"}
+    lost_created = 0
+    for session in sessions:
+        for entity, row_id, title in session.created:
+            table = tables[entity]
+            lost_created += row_id not in table.index or table.at[row_id, title_column[entity]] != title
+    return lost_changes, lost_created
+
+
+def report(sessions, elapsed):
+    timings = pd.DataFrame([t for s in sessions for t in s.timings], columns=["action", "seconds", "failed"])
+    print(f"{'action':<10}{'reruns':>8}{'errors':>8}" + "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+          + f"{'max':>9}")
+    groups = [(action, rows) for action, rows in timings.groupby("action")] + [("all", timings)]
+    for action, rows in groups:
+        seconds = rows["seconds"].to_numpy() * 1000
+        print(f"{action:<10}{len(rows):>8}{int(rows['failed'].sum()):>8}"
+              + "".join(f"{np.percentile(seconds, p):>7.0f}ms" for p in PERCENTILES)
+              + f"{seconds.max():>7.0f}ms")
+    lost_changes, lost_created = lost_updates(sessions)
+    changes = sum(len(s.changes) for s in sessions)
+    created = sum(len(s.created) for s in sessions)
+    print(f"\n{len(timings)} reruns by {len(sessions)} sessions in {elapsed:.1f}s: "
+          f"{len(timings) / elapsed:.1f} reruns/s, error rate {timings['failed'].mean():.2%}")
+    print(f"Status changes: {changes} made, {lost_changes} lost")
+    print(f"Submissions: {created} made, {lost_created} lost")
+    errors = Counter(e for s in sessions for e in s.errors)
+    for message, count in errors.most_common(5):
+        print(f"  {count} x {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the DevOpsHub pages with many simulated users")
+    parser.add_argument("--sessions", type=int, default=10, help="Simulated users at once")
+    parser.add_argument("--actions", type=int, default=20, help="Actions per user")
+    parser.add_argument("--think-ms", type=float, default=200, help="Mean pause between a user's actions")
+    parser.add_argument("--requests", type=int, default=500, help="Requests in the generated dataset")
+    parser.add_argument("--errors", type=int, default=200, help="Errors in the generated dataset")
+    parser.add_argument("--projects", type=int, default=20, help="Projects in the generated dataset")
+    parser.add_argument("--source", default=os.environ.get("DEVOPSHUB_DATA_DIR", "data"),
+                        help="Data directory to resample the dataset from")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated data directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from devopshub import storage
+
+    data_dir = tempfile.mkdtemp(prefix="devopshub-loadtest-")
+    try:
+        print(f"Generating {args.requests} requests, {args.errors} errors, {args.projects} projects in {data_dir}")
+        generate(args.source, data_dir, args.requests, args.errors, args.projects, args.seed)
+        # The pages under test read storage.DATA_DIR, now the generated data
+        storage.DATA_DIR = data_dir
+        share_runtime()
+
+        # Load every page once so the timings are of a warm server
+        warmup = Session(0, args.seed, 0)
+        for page in PAGES:
+            warmup._app(page).run()
+
+        sessions = [Session(n, args.seed + n, args.think_ms / 1000) for n in range(1, args.sessions + 1)]
+        threads = [threading.Thread(target=s.run, args=(args.actions,), daemon=True) for s in sessions]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report(sessions, time.perf_counter() - started)
+    finally:
+        if args.keep:
+            print(f"Data kept in {data_dir}")
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""
+Prometheus metrics of the app's internals
+
+Counters and histograms live in this process and are served in the
+Prometheus text format on a local endpoint when DEVOPSHUB_METRICS_PORT is
+set:
+
+    DEVOPSHUB_METRICS_PORT=9464 streamlit run app.py
+    curl http://127.0.0.1:9464/metrics
+
+Updates take no lock: every thread adds to a shard of its own, and a
+scrape sums the shards (a thread's shard is folded into the total when the
+thread ends, Streamlit runs each rerun on a new one). Values other modules
+already keep, like the table cache statistics, are read at scrape time by
+collectors instead of being counted twice.
+
+With several server processes each one needs a port of its own
+(DEVOPSHUB_METRICS_PORT=0 picks a free one, printed on start).
+"""
+import bisect
+import math
+import os
+import sys
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import streamlit as st
+
+METRICS_HOST = os.environ.get("DEVOPSHUB_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.environ.get("DEVOPSHUB_METRICS_PORT", "")
+METRICS_PATH = "/metrics"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a cached lookup to a slow CSV parse
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Shard:
+    """One thread's share of a counter or histogram"""
+
+    __slots__ = ("value", "counts", "__weakref__")
+
+    def __init__(self, buckets=0):
+        self.value = 0
+        self.counts = [0] * buckets
+
+
+class _Owner:
+    # Held only by the thread's local storage: collected when the thread ends
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+class _Sharded:
+    """Per-thread shards and the total of the threads that have ended"""
+
+    def __init__(self, buckets=0):
+        self._buckets = buckets
+        self._local = threading.local()
+        # Re-entrant: a finalizer may run _retire() on a thread that holds it
+        self._lock = threading.RLock()
+        self._shards = set()
+        self._retired = _Shard(buckets)
+
+    def _shard(self):
+        try:
+            return self._local.owner.shard
+        except AttributeError:
+            shard = _Shard(self._buckets)
+            owner = _Owner(shard)
+            with self._lock:
+                self._shards.add(shard)
+            weakref.finalize(owner, self._retire, shard)
+            self._local.owner = owner
+            return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.discard(shard)
+            self._retired.value += shard.value
+            for i, count in enumerate(shard.counts):
+                self._retired.counts[i] += count
+
+    def _total(self):
+        with self._lock:
+            shards = [self._retired, *self._shards]
+        total = _Shard(self._buckets)
+        for shard in shards:
+            total.value += shard.value
+            for i, count in enumerate(shard.counts):
+                total.counts[i] += count
+        return total
+
+
+class _CounterValue(_Sharded):
+    def inc(self, amount=1):
+        self._shard().value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self._total().value
+
+
+class _HistogramValue(_Sharded):
+    def __init__(self, bounds):
+        super().__init__(len(bounds) + 1)
+        self._bounds = bounds
+
+    def observe(self, value):
+        shard = self._shard()
+        shard.counts[bisect.bisect_left(self._bounds, value)] += 1
+        shard.value += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        total = self._total()
+        cumulative = 0
+        for bound, count in zip(self._bounds + (math.inf,), total.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _number(bound)}, cumulative
+        yield f"{name}_sum", labels, total.value
+        yield f"{name}_count", labels, cumulative
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(perf_counter() - self._start)
+
+
+class Metric:
+    """A metric family; labels(...) picks one of its series"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+        if not self.label_names:
+            self._default = self.labels()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(tuple(str(v) for v in values), self._new())
+                self._series[values] = series
+        return series
+
+    def collect(self):
+        seen = set()
+        for values, series in list(self._series.items()):
+            if id(series) in seen:
+                continue
+            seen.add(id(series))
+            labels = dict(zip(self.label_names, map(str, values)))
+            yield from series.samples(self.name, labels)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help_text, labels)
+
+    def _new(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class Collected:
+    """A metric family whose samples `collect()` reads from elsewhere at scrape time
+
+    `collect` returns [(label values, value)].
+    """
+
+    def __init__(self, name, kind, help_text, labels, collect):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._collect = collect
+        REGISTRY.register(self)
+
+    def collect(self):
+        for values, value in self._collect():
+            yield self.name, dict(zip(self.label_names, map(str, values))), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # A module reloaded by Streamlit defines its metrics again, the new ones win
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """Every metric in the Prometheus text format"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                samples = list(metric.collect())
+            except Exception as exc:
+                # A failing collector must not take the whole scrape down
+                print(f"[WARN] Collecting {metric.name} failed: {exc}", file=sys.stderr)
+                continue
+            for name, labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_number(value)}" if label_text else f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def tenant_of(data_dir):
+    """Tenant label of a data directory (see tenants.py)"""
+    from devopshub import storage
+
+    if os.path.abspath(data_dir) == os.path.abspath(storage.DATA_DIR):
+        return "default"
+    return os.path.basename(os.path.normpath(data_dir))
+
+
+# Metrics of the modules that import this one, defined here so every name is in one place
+
+TABLE_LOAD_SECONDS = Histogram("devopshub_table_load_seconds", "Time to read a table from its CSV (and archive)",
+                               ["tenant", "table"])
+TABLE_SAVE_SECONDS = Histogram("devopshub_table_save_seconds", "Time to journal and rewrite a table",
+                               ["tenant", "table"])
+TABLE_ROWS = Gauge("devopshub_table_rows", "Rows of a table as last loaded", ["tenant", "table", "archive"])
+QUARANTINED_ROWS = Gauge("devopshub_quarantined_rows", "Rows left out of a table by validation",
+                         ["tenant", "table", "archive"])
+COMMITS = Counter("devopshub_commits_total", "Table rewrites by the commit queue", ["tenant", "table"])
+COMMITTED_CHANGES = Counter("devopshub_committed_changes_total", "Changes applied by those rewrites",
+                            ["tenant", "table"])
+COMMIT_ERRORS = Counter("devopshub_commit_errors_total", "Commits that failed", ["tenant", "table"])
+WRITE_CONFLICTS = Counter(
+    "devopshub_write_conflicts_total",
+    "Changes that met a concurrent one: an ID taken meanwhile (id_taken), a row gone (row_missing) "
+    "or a row no longer as the change expected (stale)",
+    ["tenant", "table", "kind"],
+)
+# fragment is empty for a rerun of the whole page
+RERUN_SECONDS = Histogram("devopshub_rerun_seconds", "Script reruns, of a whole page or of one of its fragments",
+                          ["page", "fragment"])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host=METRICS_HOST, port=0):
+    """Serve /metrics in a background thread, returns the server"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="devopshub-metrics", daemon=True)
+    thread.start()
+    return server
+
+
+@st.cache_resource
+def get_server():
+    """The process's metrics endpoint, None unless DEVOPSHUB_METRICS_PORT is set"""
+    if METRICS_PORT == "":
+        return None
+    try:
+        server = serve(METRICS_HOST, int(METRICS_PORT))
+    except OSError as exc:
+        print(f"[WARN] Metrics endpoint not started: {exc}", file=sys.stderr)
+        return None
+    host, port = server.server_address[:2]
+    print(f"[OK] Metrics on http://{host}:{port}{METRICS_PATH}", file=sys.stderr)
+    return server
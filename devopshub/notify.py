@@ -0,0 +1,404 @@
+"""
+Email alerts through a journaled outbox
+
+Saving a change must not wait for a mail server, and an alert must not be
+lost if the app stops before it goes out. So nothing is sent while saving:
+storage._write() asks outbox_events() which alerts the journaled changes
+call for, and they are appended to the journal together with the changes
+(entity "outbox", one row per alert and recipient, Status Pending).
+
+A background worker drains the outbox every OUTBOX_INTERVAL seconds (and
+right after a save): pending alerts are grouped into one digest email per
+recipient, the digests are sent over a small pool of SMTP connections kept
+open between rounds, and the alerts are journaled as Sent. Failed sends are
+retried with backoff and given up (Failed) after MAX_ATTEMPTS. The worker
+follows the journal to keep an index of the alerts still pending, so a
+round costs what was journaled since the last one, and Sent or Failed
+alerts are deleted from the outbox after OUTBOX_RETENTION_DAYS.
+
+Alerts:
+    Critical error logged      -> DEVOPSHUB_ALERT_TO
+    request past its Due Date  -> its assignee (DEVOPSHUB_ALERT_TO if unassigned)
+
+A request becomes overdue by time passing rather than by a change, so the
+worker also looks for requests that went past their Due Date in the last
+OVERDUE_WINDOW_DAYS and queues their alerts the same way.
+
+The worker runs inside the app when DEVOPSHUB_SMTP_HOST is set, or on its own:
+    python -m devopshub.smtp_sink --port 8025 &
+    DEVOPSHUB_SMTP_HOST=127.0.0.1 DEVOPSHUB_SMTP_PORT=8025 python -m devopshub.notify run --once
+    python -m devopshub.notify status
+"""
+import argparse
+import os
+import smtplib
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+
+import pandas as pd
+import streamlit as st
+
+from devopshub import journal as journal_module
+
+OUTBOX = "outbox"
+PENDING, SENT, FAILED = "Pending", "Sent", "Failed"
+
+SMTP_HOST = os.environ.get("DEVOPSHUB_SMTP_HOST", "")
+SMTP_PORT = int(os.environ.get("DEVOPSHUB_SMTP_PORT", "25"))
+SMTP_USER = os.environ.get("DEVOPSHUB_SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("DEVOPSHUB_SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.environ.get("DEVOPSHUB_SMTP_STARTTLS", "") == "1"
+SMTP_POOL_SIZE = 2
+SMTP_TIMEOUT = 30
+
+MAIL_FROM = os.environ.get("DEVOPSHUB_MAIL_FROM", "devopshub@lbsfinancial.org")
+ALERT_TO = [a.strip() for a in os.environ.get("DEVOPSHUB_ALERT_TO", "devops-alerts@lbsfinancial.org").split(",")
+            if a.strip()]
+
+OUTBOX_INTERVAL = float(os.environ.get("DEVOPSHUB_OUTBOX_INTERVAL", "10"))
+MAX_ATTEMPTS = 8
+RETRY_BASE = 30
+OVERDUE_WINDOW_DAYS = 7
+# Longer than OVERDUE_WINDOW_DAYS, or an expired overdue alert would be queued again
+OUTBOX_RETENTION_DAYS = float(os.environ.get("DEVOPSHUB_OUTBOX_RETENTION_DAYS", "30"))
+
+# Actor journaled for what the worker writes itself
+NOTIFIER_ACTOR = "notifier"
+LOCK_FILE = "outbox.lock"
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process only
+    fcntl = None
+
+
+def _alert(kind, ref, recipient, subject, body, actor, key=""):
+    row_id = "-".join(p for p in (kind, ref, key, recipient) if p)
+    return {"entity": OUTBOX, "op": "create", "id": row_id, "actor": actor, "set": {
+        "ID": row_id, "Kind": kind, "Ref": ref, "Recipient": recipient,
+        "Subject": subject, "Body": body, "Status": PENDING, "Attempts": "0",
+        "Created": datetime.now().isoformat(timespec="seconds"),
+    }}
+
+
+def outbox_events(events, state):
+    """Outbox rows (journal create events) called for by these changes, given the state before them"""
+    queued = state.get(OUTBOX, {})
+    alerts = []
+    for event in events:
+        if event["entity"] != "errors" or event["op"] not in ("create", "update"):
+            continue
+        if not state.get("errors"):
+            # First import of the table, not news
+            break
+        if event["set"].get("Severity") != "Critical":
+            continue
+        row = {**state["errors"].get(event["id"], {}), **event["set"]}
+        if row.get("Status") == "Fixed":
+            continue
+        for recipient in ALERT_TO:
+            alert = _alert(
+                "critical", event["id"], recipient,
+                f"Critical error {event['id']}: {row.get('Description', '')}",
+                f"{row.get('Error Code', '')} on {row.get('System', '')}, reported {row.get('Date Reported', '')}\n"
+                f"Status: {row.get('Status', '')}\n{row.get('Resolution Notes', '')}",
+                event["actor"],
+            )
+            if alert["id"] not in queued:
+                alerts.append(alert)
+    return alerts
+
+
+class SMTPPool:
+    """Up to `size` SMTP connections, kept open between sends"""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, size=SMTP_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.opened = 0
+        self.sent = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        with self._lock:
+            self.opened += 1
+        return smtp
+
+    def send(self, message):
+        """Send one EmailMessage on an idle connection if there is one"""
+        with self._lock:
+            smtp = self._idle.pop() if self._idle else None
+        try:
+            try:
+                smtp = smtp or self._connect()
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped the idle connection, once more on a fresh one
+                smtp = self._connect()
+                smtp.send_message(message)
+        except Exception:
+            if smtp is not None:
+                smtp.close()
+            raise
+        with self._lock:
+            self.sent += 1
+            if len(self._idle) < self.size:
+                self._idle.append(smtp)
+                return
+        smtp.quit()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for smtp in idle:
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                smtp.close()
+
+
+def digest(recipient, alerts):
+    """One email with all of a recipient's pending alerts"""
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = recipient
+    message["Subject"] = alerts[0]["Subject"] if len(alerts) == 1 else f"DevOpsHub: {len(alerts)} alerts"
+    message.set_content("\n\n".join(f"{a['Subject']}\n{a['Body']}" for a in alerts) + "\n\n-- DevOpsHub\n")
+    return message
+
+
+@contextmanager
+def _claimed(data_dir):
+    """Whether this process may drain the outbox now (one drainer at a time)"""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, LOCK_FILE), "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class Notifier:
+    """Queues overdue alerts and drains the outbox of one data directory"""
+
+    def __init__(self, data_dir, pool=None):
+        self.data_dir = data_dir
+        self.journal = journal_module.get_journal(data_dir)
+        self.pool = pool or SMTPPool()
+        self._scanned = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._offset = 0        # journal position _pending and _delivered are up to date with
+        self._pending = {}      # id -> outbox row still to send
+        self._delivered = {}    # id -> (when it was sent or given up, status), oldest first
+
+    def start(self):
+        """Drain in a background thread from now on"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.serve, name="devopshub-notifier", daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Drain now rather than at the next interval"""
+        self._wakeup.set()
+
+    def serve(self):
+        """Drain every OUTBOX_INTERVAL seconds (or when woken), forever"""
+        while True:
+            try:
+                self.run_once()
+            except Exception as exc:
+                print(f"[WARN] Outbox round failed: {exc}", file=sys.stderr)
+            self._wakeup.wait(OUTBOX_INTERVAL)
+            self._wakeup.clear()
+
+    def run_once(self):
+        """Queue new overdue alerts and send what is pending, returns (alerts, emails) sent"""
+        from devopshub import storage
+
+        # The worker thread serves no session, read this directory's tables
+        with storage.using(self.data_dir), _claimed(self.data_dir) as claimed:
+            if not claimed:
+                return 0, 0
+            self.queue_overdue()
+            result = self.drain()
+            self.expire()
+            return result
+
+    def _follow(self):
+        """Bring the pending and delivered indexes up to date with the journal"""
+        if self._offset > self.journal.end():
+            # The journal was replaced, start over
+            self._offset, self._pending, self._delivered = 0, {}, {}
+        events, self._offset = self.journal.follow(self._offset)
+        for event in events:
+            if event["entity"] != OUTBOX:
+                continue
+            row_id = event["id"]
+            if event["op"] == "delete":
+                self._pending.pop(row_id, None)
+                self._delivered.pop(row_id, None)
+                continue
+            row = {**self._pending.get(row_id, {}), **event["set"]}
+            status = row.get("Status")
+            if status == PENDING:
+                self._pending[row_id] = row
+            elif status:
+                self._pending.pop(row_id, None)
+                self._delivered.pop(row_id, None)
+                self._delivered[row_id] = (event["ts"], status)
+
+    def expire(self, now=None):
+        """Delete alerts sent or given up more than OUTBOX_RETENTION_DAYS ago, returns how many"""
+        self._follow()
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=OUTBOX_RETENTION_DAYS)).isoformat(timespec="seconds")
+        events = []
+        for row_id, (stamp, status) in self._delivered.items():
+            if stamp >= cutoff:
+                break
+            events.append({"entity": OUTBOX, "op": "delete", "id": row_id, "actor": NOTIFIER_ACTOR,
+                           "prev": {"Status": status}})
+        self.journal.append(events)
+        return len(events)
+
+    def queue_overdue(self, today=None):
+        """Queue alerts for requests that went past their Due Date lately, returns how many"""
+        from devopshub import people, storage
+
+        today = today or date.today()
+        scanned = (today, storage.table_version("requests"))
+        if scanned == self._scanned:
+            return 0
+        requests_df = storage.read_table("requests", raw=True, columns=["Title", "Status", "Due Date", "Assignee ID"])
+        due = pd.to_datetime(requests_df["Due Date"], errors="coerce")
+        late = requests_df[
+            (requests_df["Status"] != "Completed")
+            & (due < pd.Timestamp(today))
+            & (due >= pd.Timestamp(today - timedelta(days=OVERDUE_WINDOW_DAYS)))
+        ]
+        emails = people.read_people(self.data_dir).set_index("Person ID")["Email"]
+        assignees = late["Assignee ID"].map(emails).fillna("")
+
+        self._follow()
+        alerts = []
+        rows = zip(late["ID"], late["Title"], late["Status"], late["Due Date"], assignees)
+        for request_id, title, status, due_date, email in rows:
+            for recipient in [email] if email else ALERT_TO:
+                alert = _alert(
+                    "overdue", request_id, recipient,
+                    f"Request {request_id} is overdue: {title}",
+                    f"Due {due_date}, status {status}",
+                    NOTIFIER_ACTOR, key=due_date,
+                )
+                if alert["id"] not in self._pending and alert["id"] not in self._delivered:
+                    alerts.append(alert)
+        self.journal.append(alerts)
+        self._scanned = scanned
+        return len(alerts)
+
+    def drain(self, now=None):
+        """Send pending alerts as one digest per recipient, returns (alerts, emails) sent"""
+        now = now or datetime.now()
+        stamp = now.isoformat(timespec="seconds")
+        self._follow()
+        by_recipient = {}
+        for alert in self._pending.values():
+            if alert.get("Retry At", "") <= stamp:
+                by_recipient.setdefault(alert["Recipient"], []).append(alert)
+        if not by_recipient:
+            return 0, 0
+
+        def send(item):
+            try:
+                self.pool.send(digest(*item))
+            except (OSError, smtplib.SMTPException) as exc:
+                return exc
+            return None
+
+        with ThreadPoolExecutor(self.pool.size) as executor:
+            failures = list(executor.map(send, by_recipient.items()))
+
+        events, sent, emails = [], 0, 0
+        for alerts, error in zip(by_recipient.values(), failures):
+            emails += error is None
+            for alert in alerts:
+                if error is None:
+                    values = {"Status": SENT, "Sent": stamp}
+                    sent += 1
+                else:
+                    attempts = int(alert.get("Attempts") or 0) + 1
+                    retry_at = now + timedelta(seconds=RETRY_BASE * 2 ** (attempts - 1))
+                    values = {"Attempts": str(attempts), "Last Error": str(error)[:200],
+                              "Retry At": retry_at.isoformat(timespec="seconds")}
+                    if attempts >= MAX_ATTEMPTS:
+                        values["Status"] = FAILED
+                events.append({"entity": OUTBOX, "op": "update", "id": alert["ID"], "actor": NOTIFIER_ACTOR,
+                               "set": values, "prev": {k: alert.get(k, "") for k in values}})
+        self.journal.append(events)
+        self.journal.sync()
+        return sent, emails
+
+
+@st.cache_resource
+def get_notifier(data_dir):
+    """Process-wide outbox worker for a data directory, None unless DEVOPSHUB_SMTP_HOST is set"""
+    if not SMTP_HOST:
+        return None
+    return Notifier(data_dir).start()
+
+
+def main(argv=None):
+    from devopshub import storage
+
+    parser = argparse.ArgumentParser(description="Send DevOpsHub email alerts from the outbox")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Drain the outbox every DEVOPSHUB_OUTBOX_INTERVAL seconds")
+    run.add_argument("--once", action="store_true", help="Drain once and exit")
+    sub.add_parser("status", help="Count outbox alerts by status")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        counts = Counter(a["Status"] for a in journal_module.get_journal(storage.data_dir()).rows(OUTBOX).values())
+        for status in (PENDING, SENT, FAILED):
+            print(f"{status:<8} {counts.get(status, 0)}")
+        return 0
+
+    if not SMTP_HOST:
+        print("[ERROR] Set DEVOPSHUB_SMTP_HOST (and DEVOPSHUB_SMTP_PORT) first", file=sys.stderr)
+        return 1
+    notifier = Notifier(storage.data_dir())
+    try:
+        if args.once:
+            sent, emails = notifier.run_once()
+            print(f"[OK] {sent} alerts sent in {emails} emails")
+        else:
+            notifier.serve()
+    finally:
+        notifier.pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
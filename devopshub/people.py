@@ -0,0 +1,260 @@
+"""
+People dimension table
+
+Requesters, assignees and project team members are stored once in
+data/people.csv and referenced from the other tables by small integer keys:
+
+    requests.csv   Requester ID, Assignee ID
+    projects.csv   Team Member IDs  (e.g. "1;4")
+
+storage.write_table() replaces the name/email/department columns with keys
+and storage.read_table() joins them back as categorical columns, so each
+name is held in memory once however many rows refer to it.
+
+Usage:
+    python -m devopshub.people migrate   # convert existing CSVs and archive
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+PEOPLE_FILE = "people.csv"
+LOCK_FILE = "people.csv.lock"
+COLUMNS = ["Person ID", "Name", "Email", "Department"]
+UNASSIGNED = "Unassigned"
+
+# Read key columns as nullable integers so blanks don't turn them into floats
+DTYPES = {"Requester ID": "Int64", "Assignee ID": "Int64", "Team Member IDs": str}
+
+# entity -> key column -> (display column -> people field)
+KEYS = {
+    "requests": {
+        "Requester ID": {
+            "Requester Name": "Name",
+            "Requester Email": "Email",
+            "Requester Department": "Department",
+        },
+        "Assignee ID": {
+            "Assigned To": "Name",
+        },
+    },
+}
+
+# entity -> display column -> key list column (";"-separated IDs)
+LIST_KEYS = {
+    "projects": {"Team Members": "Team Member IDs"},
+}
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process only
+    fcntl = None
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _path(data_dir):
+    return os.path.join(data_dir, PEOPLE_FILE)
+
+
+def read_people(data_dir, fresh=False):
+    """The people table, re-read only when the file changes (or always, if `fresh`)"""
+    path = _path(data_dir)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return pd.DataFrame(columns=COLUMNS).astype({"Person ID": "int64"})
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if fresh or cached is None or cached[0] != version:
+        people = pd.read_csv(path, dtype={"Name": str, "Email": str, "Department": str}, keep_default_na=False)
+        cached = (version, people)
+        _cache[path] = cached
+    return cached[1]
+
+
+def lookup(data_dir, names, emails=None, departments=None):
+    """Person IDs for (name, email, department) triples, adding new people
+
+    Blank or "Unassigned" names map to <NA>.
+    """
+    triples = pd.DataFrame({
+        "Name": pd.Series(names, dtype="string").fillna("").str.strip(),
+        "Email": "" if emails is None else pd.Series(emails, dtype="string").fillna("").str.strip(),
+        "Department": "" if departments is None else pd.Series(departments, dtype="string").fillna("").str.strip(),
+    })
+    blank = triples["Name"].isin(["", UNASSIGNED])
+    wanted = triples[~blank].drop_duplicates()
+    known = _known(read_people(data_dir))
+    if _missing(wanted, known).empty:
+        return _ids(triples, known, blank)
+    # Other server processes add people too: number the new ones under a file lock,
+    # against the file as it is now rather than our cached copy
+    with _lock, open(os.path.join(data_dir, LOCK_FILE), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            people = read_people(data_dir, fresh=True)
+            known = _known(people)
+            new = _missing(wanted, known)
+            if len(new) > 0:
+                start = int(people["Person ID"].max()) + 1 if len(people) else 1
+                new = new.assign(**{"Person ID": np.arange(start, start + len(new))})[COLUMNS]
+                path = _path(data_dir)
+                new.to_csv(path, mode="a", index=False, header=not os.path.exists(path))
+                known = pd.concat([known, _known(new)])
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+    return _ids(triples, known, blank)
+
+
+def _known(people):
+    return people.astype({"Name": "string", "Email": "string", "Department": "string"})
+
+
+def _missing(wanted, known):
+    """Triples in `wanted` that have no Person ID yet"""
+    merged = wanted.merge(known, on=["Name", "Email", "Department"], how="left")
+    return merged[merged["Person ID"].isna()][["Name", "Email", "Department"]]
+
+
+def _ids(triples, known, blank):
+    ids = triples.merge(known, on=["Name", "Email", "Department"], how="left")["Person ID"]
+    ids = ids.astype("Int64")
+    ids[blank.to_numpy()] = pd.NA
+    ids.index = triples.index
+    return ids
+
+
+def stored_columns(entity, columns):
+    """Columns to read from disk so that attach() can produce `columns`"""
+    keys = {display: key for key, fields in KEYS.get(entity, {}).items() for display in fields}
+    keys.update(LIST_KEYS.get(entity, {}))
+    stored = []
+    for column in columns:
+        stored.append(column)
+        if column in keys and keys[column] not in stored:
+            stored.append(keys[column])
+    return stored
+
+
+def normalize(entity, df, data_dir):
+    """Replace name columns with person keys (for writing)"""
+    df = df.copy()
+    for key, fields in KEYS.get(entity, {}).items():
+        display = list(fields)
+        if not set(display) <= set(df.columns):
+            continue
+        by_field = {field: df[column] for column, field in fields.items()}
+        ids = lookup(data_dir, by_field["Name"], by_field.get("Email"), by_field.get("Department"))
+        position = df.columns.get_loc(display[0])
+        df = df.drop(columns=display)
+        if key in df.columns:
+            df = df.drop(columns=key)
+        df.insert(position, key, ids.array)
+    for display, key in LIST_KEYS.get(entity, {}).items():
+        if display not in df.columns:
+            continue
+        members = df[display].fillna("").astype(str).str.split(",").explode().str.strip()
+        ids = lookup(data_dir, members.to_numpy())
+        ids.index = members.index
+        joined = ids.dropna().astype(str).groupby(level=0).agg(";".join).reindex(df.index).fillna("")
+        position = df.columns.get_loc(display)
+        df = df.drop(columns=[c for c in (display, key) if c in df.columns])
+        df.insert(position, key, joined.to_numpy())
+    return df
+
+
+def attach(entity, df, data_dir):
+    """Join names back onto person keys as categorical columns (for display)"""
+    people = read_people(data_dir)
+    person_ids = people["Person ID"].to_numpy()
+    for key, fields in KEYS.get(entity, {}).items():
+        if key not in df.columns or set(fields) <= set(df.columns):
+            continue
+        keys = pd.to_numeric(df[key], errors="coerce").fillna(-1).astype("int64")
+        positions = pd.Index(person_ids).get_indexer(keys.to_numpy())
+        insert_at = df.columns.get_loc(key)
+        for offset, (display, field) in enumerate(fields.items()):
+            values = people[field].to_numpy(dtype=object)
+            if field == "Name":
+                values = np.append(values, UNASSIGNED)
+                codes_source = np.where(positions < 0, len(values) - 1, positions)
+            else:
+                codes_source = positions
+            categories, codes = np.unique(values, return_inverse=True)
+            if len(codes):
+                codes = np.where(codes_source < 0, -1, codes[codes_source])
+            else:
+                codes = np.full(len(codes_source), -1)
+            column = pd.Categorical.from_codes(codes, categories=categories).remove_unused_categories()
+            df.insert(insert_at + offset, display, column)
+    for display, key in LIST_KEYS.get(entity, {}).items():
+        if key not in df.columns or display in df.columns:
+            continue
+        names = dict(zip(person_ids.astype(str), people["Name"]))
+        team = df[key].fillna("").astype(str).map(
+            lambda ids: ", ".join(names.get(i, i) for i in ids.split(";") if i) or UNASSIGNED
+        )
+        df.insert(df.columns.get_loc(key), display, team)
+    return df
+
+
+@st.cache_resource(max_entries=8)
+def _groups(version, key, _df):
+    return _df.groupby(key, dropna=True).indices
+
+
+def rows_for(df, key, person_id):
+    """Rows of a loaded table referring to one person, e.g. everything requested by X
+
+    Uses a {person: row positions} index built once per version of the table.
+    """
+    from devopshub import storage
+
+    version = df.attrs.get("version")
+    if version is None:
+        return df[df[key] == person_id]
+    positions = _groups((storage.data_dir(), version, len(df)), key, df).get(person_id, [])
+    return df.iloc[positions]
+
+
+def migrate(data_dir):
+    """Normalize the tables, their archive segments and their journal history"""
+    from devopshub import archive, storage
+
+    for entity in ("requests", "projects"):
+        hot = normalize(entity, storage.read_table(entity, raw=True), data_dir)
+        segments = archive.read_manifest(data_dir).get(entity, {})
+        for segment in segments:
+            path = os.path.join(data_dir, archive.ARCHIVE_DIR, entity, f"{segment}.csv.gz")
+            rows = normalize(entity, pd.read_csv(path), data_dir)
+            rows.to_csv(path + ".tmp", index=False, compression="gzip")
+            os.replace(path + ".tmp", path)
+        # Journal hot and archived rows together so replay sees the new columns everywhere
+        cold = archive.read_archive(entity, data_dir)
+        if not cold.empty:
+            hot = pd.concat([hot, cold[~cold["ID"].isin(hot["ID"])]], ignore_index=True)
+        storage.write_table(entity, hot, actor="people migrate")
+        print(f"[OK] Normalized {entity} ({len(segments)} archived segments)")
+
+
+def main(argv=None):
+    from devopshub import storage
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["migrate"]:
+        print("Usage: python -m devopshub.people migrate")
+        return 1
+    migrate(storage.data_dir())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Opt-in timing instrumentation for DevOpsHub reruns
+
+Enable with DEVOPSHUB_PROFILE=1 or by opening any page with ?profile=1.
+Every timed section records wall time, the breakdown for the current
+rerun is shown in the sidebar, and all samples are appended to a JSONL
+file for offline analysis. A fragment that reruns on its own (a row's
+status button, say) is recorded as a rerun of its own, named after the
+fragment. Net memory allocated is recorded too, but only with
+DEVOPSHUB_PROFILE=1: tracemalloc slows every allocation of the whole
+process, so one visitor's ?profile=1 must not turn it on for everybody.
+
+Rerun durations go to the devopshub_rerun_seconds metric (see metrics.py)
+whether profiling is on or not.
+"""
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from devopshub import metrics, storage, tenants
+
+# Default: profile.jsonl in the data directory being served
+PROFILE_LOG = os.environ.get("DEVOPSHUB_PROFILE_LOG")
+
+_STATE_KEY = "_devopshub_profile"
+_RERUN_KEY = "_devopshub_rerun"
+_PAGE_KEY = "_devopshub_page"
+_FRAGMENT_KEY = "_devopshub_fragment"
+
+
+def _enabled_for_process():
+    return os.environ.get("DEVOPSHUB_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+def is_enabled():
+    """Check whether profiling is on for this session"""
+    if _enabled_for_process():
+        return True
+    # The query param is remembered so it survives page navigation
+    if st.query_params.get("profile", "").lower() in ("1", "true", "yes"):
+        st.session_state["_devopshub_profile_on"] = True
+    return st.session_state.get("_devopshub_profile_on", False)
+
+
+def profile_log():
+    """Where samples are appended"""
+    return PROFILE_LOG or os.path.join(storage.data_dir(), "profile.jsonl")
+
+
+def begin_rerun(page, fragment=None):
+    """Start collecting samples for a new rerun of `page` (or of one of its fragments)"""
+    metrics.get_server()
+    if fragment is None:
+        st.session_state[_PAGE_KEY] = page
+    st.session_state[_RERUN_KEY] = (page, fragment, time.perf_counter())
+    if not is_enabled():
+        st.session_state.pop(_STATE_KEY, None)
+        return
+
+    # A rerun cut short by st.rerun() never reached end_rerun(), keep its samples
+    previous = st.session_state.get(_STATE_KEY)
+    if previous and previous["samples"] and not previous["written"]:
+        _write_samples(previous)
+
+    if _enabled_for_process() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    st.session_state[_STATE_KEY] = {
+        "rerun": uuid.uuid4().hex[:12],
+        "page": page,
+        "fragment": fragment,
+        "started": time.perf_counter(),
+        "depth": 0,
+        "section": None,
+        "samples": [],
+        "written": False,
+    }
+
+
+def _measure():
+    tracing = tracemalloc.is_tracing()
+    return time.perf_counter(), tracemalloc.get_traced_memory()[0] if tracing else None
+
+
+def _record(state, section, depth, started):
+    start, mem_before = started
+    alloc_kb = None
+    if mem_before is not None and tracemalloc.is_tracing():
+        alloc_kb = round((tracemalloc.get_traced_memory()[0] - mem_before) / 1024, 1)
+    state["samples"].append({
+        "section": section,
+        "depth": depth,
+        "ms": round((time.perf_counter() - start) * 1000, 3),
+        "alloc_kb": alloc_kb,
+    })
+
+
+@contextmanager
+def timed(section):
+    """Time a block of code and record it against the current rerun"""
+    state = st.session_state.get(_STATE_KEY)
+    if state is None:
+        yield
+        return
+
+    depth = state["depth"]
+    state["depth"] = depth + 1
+    started = _measure()
+    try:
+        yield
+    finally:
+        state["depth"] = depth
+        _record(state, section, depth, started)
+
+
+def section(name):
+    """Time the rest of the script from here, up to the next section() or the end of the rerun
+
+    For the top-level parts of a page, which are not functions to decorate.
+    """
+    state = st.session_state.get(_STATE_KEY)
+    if state is None:
+        return
+    _close_section(state)
+    state["section"] = (name, _measure())
+    state["depth"] = 1
+
+
+def _close_section(state):
+    if state["section"] is not None:
+        name, started = state["section"]
+        _record(state, name, 0, started)
+        state["section"] = None
+        state["depth"] = 0
+
+
+def _fragment_rerun():
+    """Whether this script run reruns fragments only, and none has started profiling it yet"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run) and not st.session_state.get(_FRAGMENT_KEY)
+
+
+@contextmanager
+def _as_fragment_rerun(name):
+    st.session_state[_FRAGMENT_KEY] = True
+    begin_rerun(st.session_state.get(_PAGE_KEY, ""), name)
+    try:
+        yield
+    finally:
+        end_rerun()
+        st.session_state[_FRAGMENT_KEY] = False
+
+
+def profiled(section):
+    """Decorator form of timed()
+
+    When the function is a fragment rerunning on its own, the call is
+    recorded as a rerun of that fragment.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _fragment_rerun():
+                with _as_fragment_rerun(section), timed(section):
+                    return func(*args, **kwargs)
+            with timed(section):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def fragment(name):
+    """Decorator for a fragment called once per row: only its reruns on its own are recorded
+
+    Full reruns would otherwise log a sample for every row on the page.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _fragment_rerun():
+                with _as_fragment_rerun(name):
+                    return func(*args, **kwargs)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def end_rerun():
+    """Show the per-rerun breakdown in the sidebar and append it to the log"""
+    rerun = st.session_state.pop(_RERUN_KEY, None)
+    if rerun is not None:
+        page, fragment, started = rerun
+        metrics.RERUN_SECONDS.labels(page, fragment or "").observe(time.perf_counter() - started)
+    state = st.session_state.get(_STATE_KEY)
+    if state is None:
+        return
+
+    _close_section(state)
+    total_ms = (time.perf_counter() - state["started"]) * 1000
+    _write_samples(state, total_ms)
+    if state["fragment"] is not None:
+        # A fragment can't write to the sidebar; the panel keeps the last full rerun
+        return
+
+    with st.sidebar.expander("⏱️ Rerun Profile", expanded=True):
+        st.caption(f"Rerun {state['rerun']} — {total_ms:.1f} ms total")
+        if state["samples"]:
+            # Samples are appended on exit, so nested sections land before their parent
+            breakdown = pd.DataFrame(state["samples"])
+            breakdown["section"] = breakdown["depth"].map(lambda d: "· " * d) + breakdown["section"]
+            st.dataframe(
+                breakdown[["section", "ms", "alloc_kb"]],
+                hide_index=True,
+                width="stretch",
+            )
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            st.caption(f"Traced memory: {current / 1024:.0f} KB (peak {peak / 1024:.0f} KB)")
+        else:
+            st.caption("Memory is traced only with DEVOPSHUB_PROFILE=1")
+        cache = tenants.get_cache(storage.data_dir()).stats()
+        st.caption(
+            f"Table cache: {cache['tables']} tables, {cache['size_mb']} of {cache['budget_mb']} MB, "
+            f"{cache['hits']} hits, {cache['misses']} misses, {cache['evictions']} evictions"
+        )
+
+
+def _write_samples(state, total_ms=None):
+    """Append the samples of one rerun to the profile log"""
+    state["written"] = True
+    timestamp = datetime.now().isoformat(timespec="milliseconds")
+    rerun = {"ts": timestamp, "rerun": state["rerun"], "page": state["page"], "fragment": state["fragment"]}
+    lines = [json.dumps({**rerun, **sample}) for sample in state["samples"]]
+    if total_ms is not None:
+        lines.append(json.dumps({
+            **rerun, "section": "rerun", "depth": -1, "ms": round(total_ms, 3), "alloc_kb": None,
+        }))
+    path = profile_log()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    except OSError:
+        # Profiling must never break the page it is measuring
+        pass
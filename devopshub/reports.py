@@ -0,0 +1,289 @@
+"""
+Monthly management reports, rendered headlessly
+
+The analytics behind the pages as files, for many months (and, for the
+requests report, departments) in one run:
+
+    requests  completions per month, what was completed in the month, by type
+    errors    escalation rate and resolution time by severity
+    projects  progress board of the projects active in the month
+
+Each (report, month, department) is rendered by a pool of worker
+processes. The tables are published once as shared Arrow snapshots (see
+shared.py) and every worker memory-maps those same read-only files, so the
+data is loaded once and all reports of a run see the same version of it.
+Statuses are the current ones; dates place rows in a month.
+
+Usage:
+    python -m devopshub.reports --from 2025-01 --to 2025-12 --format html --format csv
+    python -m devopshub.reports --report requests --all-departments --out reports/2025-09
+"""
+import argparse
+import html
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+REPORTS = ("requests", "errors", "projects")
+FORMATS = ("html", "csv", "parquet")
+TREND_MONTHS = 12
+
+# Tables each report reads, with their date columns
+TABLES = {
+    "requests": (True, ["Created Date", "Due Date", "Completed Date"]),
+    "errors": (True, ["Date Reported", "Date Resolved"]),
+    "projects": (False, ["Start Date", "Target Completion", "Actual Completion"]),
+}
+
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+
+_tables = {}
+
+
+def load_tables(paths):
+    """Map the snapshots `paths` ({entity: path}) and parse their dates, once per process"""
+    from devopshub import shared
+
+    for entity, path in paths.items():
+        df = shared.read_snapshot(path)
+        for column in TABLES[entity][1]:
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+        _tables[entity] = df
+
+
+def _in_month(dates, period):
+    return dates.dt.to_period("M") == period
+
+
+def requests_report(period, department=None):
+    """{section: table} for requests, optionally of one requester department"""
+    df = _tables["requests"]
+    if department is not None:
+        df = df[df["Requester Department"] == department]
+    months = pd.period_range(period - (TREND_MONTHS - 1), period, freq="M")
+    created = df.assign(Month=df["Created Date"].dt.to_period("M")).groupby("Month").size()
+    completed = df[df["Status"] == "Completed"]
+    completed = completed.assign(Month=completed["Completed Date"].dt.to_period("M"))
+    trend = pd.DataFrame({
+        "Month": months.astype(str),
+        "Created": created.reindex(months, fill_value=0).to_numpy(),
+        "Completed": completed.groupby("Month").size().reindex(months, fill_value=0).to_numpy(),
+    })
+
+    done = completed[completed["Month"] == period].sort_values("Completed Date")
+    done = done.assign(**{
+        "Days Taken": (done["Completed Date"] - done["Created Date"]).dt.days,
+        "Late": done["Completed Date"] > done["Due Date"],
+    })[["ID", "Title", "Type", "Priority", "Assigned To", "Created Date", "Completed Date", "Days Taken", "Late"]]
+
+    by_type = pd.DataFrame({
+        "Created": df[_in_month(df["Created Date"], period)].groupby("Type").size(),
+        "Completed": done.groupby("Type").size(),
+    }).fillna(0).astype(int).rename_axis("Type").reset_index()
+
+    return {
+        "Monthly completions": trend,
+        f"Completed in {period}": _dates_as_text(done),
+        "By type": by_type,
+    }
+
+
+def errors_report(period, department=None):
+    """{section: table} for errors reported (escalation) and resolved (resolution time) in the month"""
+    df = _tables["errors"]
+    reported = df[_in_month(df["Date Reported"], period)]
+    escalated = int((reported["Reported to Fiserv"] == "Yes").sum())
+    fixed = int((reported["Status"] == "Fixed").sum())
+    escalation = pd.DataFrame([{
+        "Reported": len(reported),
+        "Fixed Internally": fixed,
+        "Escalated to Fiserv": escalated,
+        "Escalation Rate (%)": round(escalated / len(reported) * 100, 1) if len(reported) else 0.0,
+    }])
+    by_system = reported.groupby("System").agg(
+        Reported=("ID", "size"),
+        Escalated=("Reported to Fiserv", lambda s: int((s == "Yes").sum())),
+    ).reset_index()
+
+    resolved = df[_in_month(df["Date Resolved"], period)]
+    days = (resolved["Date Resolved"] - resolved["Date Reported"]).dt.days
+    resolution = days.groupby(resolved["Severity"]).agg(["size", "mean", "median", "max"]).reindex(SEVERITIES)
+    resolution = pd.DataFrame({
+        "Severity": SEVERITIES,
+        "Resolved": resolution["size"].fillna(0).astype(int).to_numpy(),
+        "Average Days": resolution["mean"].round(1).to_numpy(),
+        "Median Days": resolution["median"].to_numpy(),
+        "Max Days": resolution["max"].to_numpy(),
+    })
+
+    return {
+        "Escalation rate": escalation,
+        "Escalations by system": by_system,
+        "Resolution time by severity": resolution,
+    }
+
+
+def projects_report(period, department=None):
+    """{section: table}: progress board of the projects running at some point in the month"""
+    df = _tables["projects"]
+    start, end = period.start_time, period.end_time
+    active = df[(df["Start Date"] <= end) & ~(df["Actual Completion"] < start)]
+
+    checklist = active["SDLC Checklist"].fillna("").astype(str)
+    phases = checklist.str.count(r"\|") + 1
+    complete = checklist.str.count(":Complete")
+
+    requests = _tables["requests"]
+    completed_by_end = set(requests.loc[
+        (requests["Status"] == "Completed") & (requests["Completed Date"] <= end), "ID"
+    ])
+    linked = active["Linked Requests"].fillna("").astype(str).map(
+        lambda ids: {i.strip() for i in ids.split(",") if i.strip()}
+    )
+
+    board = active.assign(**{
+        "SDLC (%)": (complete / phases * 100).round().astype(int),
+        "Days Left": (active["Target Completion"] - end.normalize()).dt.days,
+        "Linked Requests": linked.map(len),
+        "Linked Completed": linked.map(lambda ids: len(ids & completed_by_end)),
+    }).sort_values(["Status", "Target Completion"])
+    board = board[["ID", "Project Name", "Status", "Current Phase", "SDLC (%)", "Start Date",
+                   "Target Completion", "Actual Completion", "Days Left", "Linked Requests",
+                   "Linked Completed", "Team Members"]]
+
+    summary = board.groupby("Status").agg(
+        Projects=("ID", "size"),
+        **{"Average SDLC (%)": ("SDLC (%)", "mean"), "Overdue": ("Days Left", lambda d: int((d < 0).sum()))},
+    ).round(1).reset_index()
+
+    return {"Progress board": _dates_as_text(board), "By status": summary}
+
+
+BUILDERS = {"requests": requests_report, "errors": errors_report, "projects": projects_report}
+
+
+def _dates_as_text(df):
+    """Dates as YYYY-MM-DD (blank when missing) for the output files"""
+    out = df.copy()
+    for column in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[column]):
+            out[column] = out[column].dt.strftime("%Y-%m-%d").fillna("")
+    return out
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_").lower()
+
+
+def render(job, out_dir, formats):
+    """Build one report and write it in every format, returns the paths written"""
+    report, period, department = job
+    sections = BUILDERS[report](pd.Period(period, freq="M"), department)
+    stem = f"{report}-{period}" + (f"-{_slug(department)}" if department else "")
+    title = f"{report.title()} report, {period}" + (f" ({department})" if department else "")
+    written = []
+    for fmt in formats:
+        if fmt == "html":
+            path = os.path.join(out_dir, f"{stem}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(_html(title, sections))
+            written.append(path)
+            continue
+        for name, table in sections.items():
+            path = os.path.join(out_dir, f"{stem}.{_slug(name)}.{fmt}")
+            if fmt == "csv":
+                table.to_csv(path, index=False)
+            else:
+                table.to_parquet(path, index=False)
+            written.append(path)
+    return written
+
+
+def _html(title, sections):
+    parts = [
+        "<!DOCTYPE html>",
+        f"<html><head><meta charset='utf-8'><title>{html.escape(title)}</title>",
+        "<style>body{font-family:sans-serif;color:#2c3e50;margin:2rem}"
+        "table{border-collapse:collapse;margin-bottom:2rem}"
+        "th{background:#2c3e50;color:#ecf0f1}th,td{padding:.3rem .8rem;border:1px solid #bdc3c7}</style>",
+        "</head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+        f"<p>Generated {datetime.now():%Y-%m-%d %H:%M} by DevOpsHub</p>",
+    ]
+    for name, table in sections.items():
+        parts.append(f"<h2>{html.escape(name)}</h2>")
+        parts.append(table.to_html(index=False, na_rep="", border=0) if len(table) else "<p>Nothing to report.</p>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def jobs_for(reports, periods, departments):
+    """(report, period, department) for every report to render"""
+    return [
+        (report, period, department)
+        for report in reports
+        for period in periods
+        for department in (departments if report == "requests" else [None])
+    ]
+
+
+def _worker_init(paths):
+    load_tables(paths)
+
+
+def _render_all(jobs, out_dir, formats, workers, paths):
+    if workers <= 1:
+        load_tables(paths)
+        return [render(job, out_dir, formats) for job in jobs]
+    with ProcessPoolExecutor(workers, initializer=_worker_init, initargs=(paths,)) as pool:
+        futures = [pool.submit(render, job, out_dir, formats) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def main(argv=None):
+    from devopshub import shared
+
+    last_month = (pd.Period(datetime.now(), freq="M") - 1).strftime("%Y-%m")
+    parser = argparse.ArgumentParser(description="Render monthly reports as HTML, CSV or Parquet")
+    parser.add_argument("--report", choices=REPORTS, action="append", help="Default: all of them")
+    parser.add_argument("--from", dest="start", default=last_month, help="First month, YYYY-MM (default last month)")
+    parser.add_argument("--to", dest="end", help="Last month, YYYY-MM (default same as --from)")
+    parser.add_argument("--department", action="append", help="Requests report of one requester department")
+    parser.add_argument("--all-departments", action="store_true",
+                        help="Requests report for every department as well as overall")
+    parser.add_argument("--format", choices=FORMATS, action="append", help="Default: html")
+    parser.add_argument("--out", default="reports", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    args = parser.parse_args(argv)
+
+    reports = args.report or list(REPORTS)
+    periods = pd.period_range(args.start, args.end or args.start, freq="M").strftime("%Y-%m").tolist()
+    if not periods:
+        parser.error("--to is before --from")
+
+    started = time.perf_counter()
+    # One snapshot of each table for the whole run
+    # The projects board counts linked requests too
+    needed = set(reports) | ({"requests"} if "projects" in reports else set())
+    paths = {entity: shared.snapshot(entity, include_archive=TABLES[entity][0]) for entity in needed}
+
+    departments = [None] + (args.department or [])
+    if args.all_departments and "requests" in reports:
+        requests = shared.read_snapshot(paths["requests"], ["Requester Department"])
+        departments = [None] + sorted(requests["Requester Department"].dropna().unique())
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = jobs_for(reports, periods, departments)
+    written = _render_all(jobs, args.out, args.format or ["html"], max(1, args.workers), paths)
+    print(f"[OK] {len(jobs)} reports, {sum(map(len, written))} files in {args.out} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Loaded tables shared between server processes
+
+With several Streamlit workers behind a load balancer each one would parse
+the CSVs and keep its own copy of every table. Instead, the first worker
+to load a table after it changed writes it as an Arrow IPC file under
+data/shared/ and bumps the table's version counter in versions.json. Every
+worker then memory-maps that file and keeps its text columns as Arrow
+strings over the mapping (blanks stay NaN, as in a CSV read), so the text,
+which is most of a table, sits in the page cache once for all workers.
+What each worker holds privately is the small stuff: numbers, category
+codes and string offsets. A write is picked up by the next load on any
+worker (whose table_version() no longer matches).
+
+The frames returned are shared by every session of a worker: read them,
+never modify them in place.
+"""
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from devopshub import archive, metrics, storage, validate
+
+SHARED_DIR = "shared"
+VERSIONS_FILE = "versions.json"
+LOCK_FILE = ".lock"
+
+# Older snapshots are deleted once this many newer ones exist; processes that
+# still have one mapped keep reading it until they reload
+KEEP_VERSIONS = 2
+
+try:
+    import fcntl
+except ImportError:  # Windows - single process only
+    fcntl = None
+
+_publish_lock = threading.Lock()
+
+
+def _shared_dir():
+    return os.path.join(storage.data_dir(), SHARED_DIR)
+
+
+def read_versions():
+    """{table key: {"version", "file", "stamp"}} for every published snapshot"""
+    try:
+        with open(os.path.join(_shared_dir(), VERSIONS_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _stamp(version):
+    # table_version() as it looks after a JSON round trip
+    return json.loads(json.dumps(version))
+
+
+def read_table(entity, include_archive=False, columns=None):
+    """storage.read_table() served from the shared snapshot, published first if stale"""
+    entry = _current(entity, include_archive)
+    if columns is not None:
+        columns = ["ID"] + [c for c in columns if c != "ID"]
+    df = read_snapshot(os.path.join(_shared_dir(), entry["file"]), columns)
+    df.attrs["version"] = tuple(entry["stamp"][:2]) + (_as_tuple(entry["stamp"][2]),)
+    if columns is not None:
+        df.attrs["version"] += (tuple(columns),)
+    df.attrs["journal_offset"] = entry.get("journal_offset")
+    df.attrs["quarantined"] = entry.get("quarantined", 0)
+    archived = "included" if include_archive and entity in archive.CLOSED else "excluded"
+    labels = (metrics.tenant_of(storage.data_dir()), entity, archived)
+    metrics.TABLE_ROWS.labels(*labels).set(len(df))
+    metrics.QUARANTINED_ROWS.labels(*labels).set(df.attrs["quarantined"])
+    return df
+
+
+def snapshot(entity, include_archive=False):
+    """Path of the table's current snapshot file, published first if stale
+
+    The file never changes once written, so readers handed the same path
+    (other processes of one batch job, say) all see the same data even if
+    the table is saved meanwhile.
+    """
+    return os.path.join(_shared_dir(), _current(entity, include_archive)["file"])
+
+
+def read_snapshot(path, columns=None):
+    """DataFrame over a snapshot file, optionally only some of its columns"""
+    table = _map(path)
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table.to_pandas(types_mapper=_arrow_strings)
+
+
+def _nan_strings():
+    """Arrow-backed string dtype with NaN for blanks, like object columns read from CSV
+
+    pd.NA would make a blank cell's truth value an error (`if row["Date Resolved"]:`).
+    None (plain object columns) on pandas 2.0, which has no such dtype.
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        pass
+    try:
+        return pd.StringDtype("pyarrow_numpy")  # pandas 2.1 and 2.2
+    except (TypeError, ValueError):
+        return None
+
+
+NAN_STRINGS = _nan_strings()
+
+
+def _arrow_strings(arrow_type):
+    # Text columns wrap the mapped buffers instead of becoming Python str objects
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return NAN_STRINGS
+    return None
+
+
+def _current(entity, include_archive):
+    """versions.json entry of the table as it is on disk now"""
+    include_archive = include_archive and entity in archive.CLOSED
+    version = storage.table_version(entity, include_archive)
+    key = f"{entity}-archive" if include_archive else entity
+    entry = read_versions().get(key)
+    if entry is None or entry["stamp"] != _stamp(version):
+        entry = _publish(entity, include_archive, key)
+    return entry
+
+
+def _as_tuple(value):
+    return tuple(_as_tuple(v) for v in value) if isinstance(value, list) else value
+
+
+def _publish(entity, include_archive, key):
+    """Write a snapshot of the table as it is on disk now (one process at a time)"""
+    folder = _shared_dir()
+    os.makedirs(folder, exist_ok=True)
+    with _publish_lock, open(os.path.join(folder, LOCK_FILE), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            versions = read_versions()
+            entry = versions.get(key)
+            # Another worker may have published it while we waited for the lock
+            if entry is not None and entry["stamp"] == _stamp(storage.table_version(entity, include_archive)):
+                return entry
+            df = storage.read_table(entity, include_archive=include_archive)
+            # Rows that would break the pages are left out of the snapshot, see validate.py
+            df, quarantined = validate.split(df, validate.check(entity, df))
+            validate.write_quarantine(quarantined, validate.quarantine_path(key))
+            number = (entry["version"] + 1) if entry else 1
+            name = f"{key}-{number:06d}.arrow"
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            path = os.path.join(folder, name)
+            with ipc.new_file(path + ".tmp", table.schema) as writer:
+                writer.write_table(table)
+            os.replace(path + ".tmp", path)
+
+            entry = {
+                "version": number,
+                "file": name,
+                "stamp": _stamp(df.attrs["version"]),
+                "journal_offset": df.attrs["journal_offset"],
+                "quarantined": len(quarantined),
+            }
+            versions[key] = entry
+            with open(os.path.join(folder, VERSIONS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+                json.dump(versions, f, indent=1)
+            os.replace(os.path.join(folder, VERSIONS_FILE + ".tmp"), os.path.join(folder, VERSIONS_FILE))
+
+            try:
+                os.remove(os.path.join(folder, f"{key}-{number - KEEP_VERSIONS:06d}.arrow"))
+            except FileNotFoundError:
+                pass
+            return entry
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+@lru_cache(maxsize=16)
+def _map(path):
+    """Memory-mapped Arrow table (kept open so repeated loads don't remap)"""
+    return ipc.open_file(pa.memory_map(path)).read_all()
@@ -0,0 +1,117 @@
+"""
+Local SMTP server that keeps what it receives
+
+Accepts any mail (no auth, no relaying) so the outbox worker in notify.py
+can be tried without a real mail server. Each message is printed as one
+line and, with --mbox, appended to an mbox file.
+
+Usage:
+    python -m devopshub.smtp_sink --port 8025 --mbox sent.mbox
+    DEVOPSHUB_SMTP_HOST=127.0.0.1 DEVOPSHUB_SMTP_PORT=8025 python -m devopshub.notify run
+"""
+import argparse
+import asyncio
+import mailbox
+import sys
+from email import message_from_bytes, policy
+
+
+class SMTPSink:
+    """Messages received so far and the SMTP handler receiving them"""
+
+    def __init__(self, mbox=None):
+        self.messages = []
+        self.connections = 0
+        self._mbox = mailbox.mbox(mbox) if mbox else None
+
+    async def handle(self, reader, writer):
+        """One SMTP session: HELO/EHLO, then any number of MAIL/RCPT/DATA until QUIT"""
+        self.connections += 1
+
+        async def reply(text):
+            writer.write(f"{text}\r\n".encode())
+            await writer.drain()
+
+        sender, recipients = None, []
+        try:
+            await reply("220 devopshub-sink ESMTP")
+            while line := await reader.readline():
+                command = line.decode("utf-8", "replace").strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    await reply("250-devopshub-sink\r\n250-8BITMIME\r\n250 SMTPUTF8")
+                elif verb in ("HELO", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "RSET":
+                    sender, recipients = None, []
+                    await reply("250 OK")
+                elif verb == "MAIL":
+                    sender, recipients = _address(command), []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(_address(command))
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    if sender is None or not recipients:
+                        await reply("503 Need MAIL and RCPT first")
+                        continue
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    self.receive(sender, recipients, await _read_data(reader))
+                    sender, recipients = None, []
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def receive(self, sender, recipients, data):
+        message = message_from_bytes(data, policy=policy.default)
+        self.messages.append((sender, recipients, message))
+        print(f"[MAIL] {sender} -> {', '.join(recipients)}: {message['Subject']}")
+        if self._mbox is not None:
+            self._mbox.add(message)
+            self._mbox.flush()
+
+
+def _address(command):
+    """The address of a MAIL FROM:<a> or RCPT TO:<a> command"""
+    argument = command.split(":", 1)[1].strip()
+    return argument[1:argument.index(">")] if argument.startswith("<") else argument.split()[0]
+
+
+async def _read_data(reader):
+    """Message lines up to the lone "." (dot-stuffing undone)"""
+    lines = []
+    while (line := await reader.readline()) not in (b".\r\n", b".\n", b""):
+        lines.append(line[1:] if line.startswith(b"..") else line)
+    return b"".join(lines)
+
+
+async def serve(host, port, mbox=None):
+    sink = SMTPSink(mbox)
+    server = await asyncio.start_server(sink.handle, host, port)
+    print(f"SMTP sink listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local SMTP server that keeps every message")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--mbox", help="Also append messages to this mbox file")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.mbox))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
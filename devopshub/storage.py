@@ -0,0 +1,323 @@
+"""
+CSV storage for requests, errors and projects
+
+All reads and writes of the data/*.csv tables go through here so that
+every change is journaled before the table is rewritten.
+
+Each tenant (see tenants.py) has a data directory of its own; data_dir()
+is the one of the tenant being served, DATA_DIR when there is none.
+"""
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from devopshub import archive, history, metrics, notify, people, versions
+from devopshub import journal as journal_module
+from devopshub.journal import EXTERNAL_ACTOR
+
+DATA_DIR = os.environ.get("DEVOPSHUB_DATA_DIR", "data")
+
+ENTITIES = {
+    "requests": "requests.csv",
+    "errors": "errors.csv",
+    "projects": "projects.csv",
+}
+
+ID_PREFIXES = {
+    "REQ-": "requests",
+    "ERR-": "errors",
+    "PROJ-": "projects",
+}
+
+# Rows per chunk when reading a table with a row predicate
+CHUNK_ROWS = 50_000
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+_saves_started = {}
+
+_data_dir = contextvars.ContextVar("devopshub_data_dir", default=None)
+
+# Set by the app: returns the data directory of the session calling, or None
+session_data_dir = None
+
+
+def data_dir():
+    """Data directory of the tenant being served (DATA_DIR unless one is in use)"""
+    return _data_dir.get() or (session_data_dir and session_data_dir()) or DATA_DIR
+
+
+@contextmanager
+def using(directory):
+    """Read and write the tables of `directory` in this block (this thread only)"""
+    token = _data_dir.set(directory)
+    try:
+        yield
+    finally:
+        _data_dir.reset(token)
+
+
+def _write_lock():
+    """Lock serializing writes to the current data directory (tenants don't wait for each other)"""
+    directory = os.path.abspath(data_dir())
+    with _write_locks_guard:
+        return _write_locks.setdefault(directory, threading.Lock())
+
+
+@contextmanager
+def _saving():
+    """Mark a save (journal first, then the table) as in progress for journal_offset()"""
+    directory = os.path.abspath(data_dir())
+    _saves_started[directory] = get_journal().end()
+    try:
+        yield
+    finally:
+        _saves_started.pop(directory, None)
+
+
+def journal_offset():
+    """Journal position that tables read after this call reflect every event up to
+
+    A save of this process that is journaled but not yet written to its
+    table is not counted, its events come after the offset returned.
+    """
+    end = get_journal().end()
+    # Read after end: a save started later only journals past `end`
+    started = _saves_started.get(os.path.abspath(data_dir()))
+    return end if started is None else min(end, started)
+
+
+def table_path(entity):
+    """Path of the CSV file backing `entity`"""
+    return os.path.join(data_dir(), ENTITIES[entity])
+
+
+def entity_for_id(row_id):
+    """Which table an ID such as REQ-012 belongs to"""
+    for prefix, entity in ID_PREFIXES.items():
+        if row_id.startswith(prefix):
+            return entity
+    raise ValueError(f"Unknown ID format: {row_id}")
+
+
+def read_table(entity, include_archive=False, raw=False, columns=None, where=None):
+    """Read one table from disk, optionally with its archived rows
+
+    Person keys are joined back to names unless `raw` is set. `columns`
+    limits what is parsed to those columns (plus ID), and `where` is a
+    function of a chunk returning a row mask; with it the file is read in
+    chunks of CHUNK_ROWS and only matching rows are kept. The table_version()
+    it was read at is kept in df.attrs["version"] (not for `where` reads,
+    which are not the whole table), with the journal_offset() it reflects in
+    df.attrs["journal_offset"].
+    """
+    with metrics.TABLE_LOAD_SECONDS.labels(metrics.tenant_of(data_dir()), entity).time():
+        return _read_table(entity, include_archive, raw, columns, where)
+
+
+def _read_table(entity, include_archive, raw, columns, where):
+    include_archive = include_archive and entity in archive.CLOSED
+    version = table_version(entity, include_archive)
+    offset = journal_offset() if where is None else None
+    usecols = None
+    if columns is not None:
+        columns = ["ID"] + [c for c in columns if c != "ID"]
+        wanted = set(people.stored_columns(entity, columns))
+        usecols = wanted.__contains__
+    df = _read_csv(table_path(entity), usecols, where)
+    if include_archive:
+        cold = archive.read_archive(entity, data_dir(), usecols=usecols)
+        if not cold.empty:
+            if where is not None:
+                cold = cold[where(cold)]
+            # A row caught mid-archive can be in both places, the hot copy wins
+            cold = cold[~cold["ID"].isin(df["ID"])]
+            df = pd.concat([df, cold], ignore_index=True)
+    if not raw:
+        df = people.attach(entity, df, data_dir())
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+        version = version + (tuple(columns),)
+    df.attrs["version"] = version if where is None else None
+    df.attrs["journal_offset"] = offset
+    return df
+
+
+def _read_csv(path, usecols=None, where=None):
+    if where is None:
+        return pd.read_csv(path, dtype=people.DTYPES, usecols=usecols)
+    chunks = [
+        chunk[where(chunk)]
+        for chunk in pd.read_csv(path, dtype=people.DTYPES, usecols=usecols, chunksize=CHUNK_ROWS)
+    ]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def table_version(entity, include_archive=False):
+    """Cheap change marker for a table (file sizes and modification times)"""
+    paths = [table_path(entity), os.path.join(data_dir(), people.PEOPLE_FILE)]
+    if include_archive:
+        paths.append(os.path.join(data_dir(), archive.ARCHIVE_DIR, archive.MANIFEST_FILE))
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return (entity, include_archive, tuple(version))
+
+
+def next_id(entity):
+    """Next free ID for `entity`, counting archived rows"""
+    return _next_id(entity, read_table(entity, raw=True)["ID"], archive.archived_ids(entity, data_dir()))
+
+
+def _next_id(entity, ids, archived):
+    prefix = next(p for p, e in ID_PREFIXES.items() if e == entity)
+    ids = pd.concat([pd.Series(ids, dtype=object), pd.Series(sorted(archived), dtype=object)])
+    numbers = pd.to_numeric(ids.str.replace(prefix, "", regex=False), errors="coerce")
+    last_id = int(numbers.max()) if numbers.notna().any() else 0
+    return f"{prefix}{last_id + 1:03d}"
+
+
+def apply_changes(df, ids, changes):
+    """Set {column: value} on every row of `df` whose ID is in `ids`, in place
+
+    Returns the mask of updated rows. Categorical columns (see people.attach)
+    get the new value added to their categories first, and columns read as
+    numbers because they were all blank (Date Resolved, say) become text.
+    """
+    rows = df["ID"].isin(ids)
+    for column, value in changes.items():
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and value not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories([value])
+        elif isinstance(value, str) and pd.api.types.is_float_dtype(df[column].dtype):
+            df[column] = df[column].astype(object)
+        df.loc[rows, column] = value
+    return rows
+
+
+def get_journal():
+    """Event journal for the current data directory"""
+    return journal_module.get_journal(data_dir())
+
+
+def write_table(entity, df, actor=None, note=None):
+    """Journal the changes in `df` and rewrite the table
+
+    Names are stored as person keys (see people.py). `df` may include
+    archived rows (when a page loaded them); unchanged ones stay in the
+    archive and edited ones move back to the hot table. `note` is kept with
+    the new version of the table (see versions.py).
+    """
+    with _write_lock():
+        _write(entity, [(df, actor)], note)
+
+
+def commit_changes(entity, changes):
+    """Apply changes from several callers to the current table and write it once
+
+    `changes` is a list of (updates, create, actor) as queued by commit.py:
+    updates are (ids, {column: value}, expected), create is a new row or
+    None. Rows not holding the {column: value} of `expected` by now are left
+    alone, e.g. a status changed by someone else since the update was made.
+    Returns the ID each change created (None if it created nothing); a new
+    row whose ID was taken in the meantime gets the next free one.
+    """
+    tenant = metrics.tenant_of(data_dir())
+    with _write_lock():
+        archived = archive.archived_ids(entity, data_dir()) if entity in archive.CLOSED else set()
+        touched = {row_id for updates, _, _ in changes for ids, _, _ in updates for row_id in ids}
+        df = read_table(entity, include_archive=bool(touched & archived))
+        frames, created = [], []
+        for updates, create, actor in changes:
+            if frames and frames[-1][1] != actor:
+                # Journal each caller's changes under their own name
+                frames[-1] = (df.copy(), frames[-1][1])
+            for ids, values, expected in updates:
+                if expected:
+                    ids = _still_matching(df, ids, expected, tenant, entity)
+                missing = len(set(ids)) - int(apply_changes(df, ids, values).sum())
+                if missing:
+                    # Deleted (or never saved) by the time this change got its turn
+                    metrics.WRITE_CONFLICTS.labels(tenant, entity, "row_missing").inc(missing)
+            new_id = None
+            if create is not None:
+                new_id = create["ID"]
+                if new_id in set(df["ID"]) | archived:
+                    metrics.WRITE_CONFLICTS.labels(tenant, entity, "id_taken").inc()
+                    new_id = _next_id(entity, df["ID"], archived)
+                df = pd.concat([df, pd.DataFrame([{**create, "ID": new_id}])], ignore_index=True)
+            created.append(new_id)
+            if frames and frames[-1][1] == actor:
+                frames[-1] = (df, actor)
+            else:
+                frames.append((df, actor))
+        _write(entity, frames)
+        get_journal().sync()
+        metrics.COMMITS.labels(tenant, entity).inc()
+        metrics.COMMITTED_CHANGES.labels(tenant, entity).inc(len(changes))
+        return created
+
+
+def _still_matching(df, ids, expected, tenant, entity):
+    """The IDs among `ids` whose rows still have every {column: value} of `expected`"""
+    rows = df["ID"].isin(ids)
+    matching = rows.copy()
+    for column, value in expected.items():
+        matching &= df[column] == value
+    stale = int((rows & ~matching).sum())
+    if stale:
+        metrics.WRITE_CONFLICTS.labels(tenant, entity, "stale").inc(stale)
+    return df.loc[matching, "ID"].tolist()
+
+
+def _write(entity, frames, note=None):
+    """Journal each (df, actor) in turn, write the last df and keep it as a version; caller holds _write_lock()"""
+    path = table_path(entity)
+    journal = get_journal()
+    archived = archive.archived_ids(entity, data_dir()) if entity in archive.CLOSED else set()
+    timer = metrics.TABLE_SAVE_SECONDS.labels(metrics.tenant_of(data_dir()), entity).time()
+    with timer, _saving():
+        # Anything edited outside the app since our last write is journaled first,
+        # so the journal always replays to what is on disk
+        if os.path.exists(path):
+            on_disk = read_table(entity, raw=True)
+            journal.record(entity, on_disk, actor=EXTERNAL_ACTOR, keep=archived, follow_up=notify.outbox_events)
+            # And kept as a version, so the first save (or an edit made outside the app) can be undone
+            versions.checkpoint(entity, on_disk, path, data_dir())
+        changes = 0
+        for df, actor in frames:
+            df = people.normalize(entity, df, data_dir())
+            # Alerts the changes call for go into the journal with them
+            events = journal.record(entity, df, actor=actor, keep=archived, follow_up=notify.outbox_events)
+            changes += sum(event["entity"] == entity for event in events)
+        if archived:
+            df = archive.split_hot(entity, data_dir(), df)
+        _replace_csv(df, path)
+        actors = ", ".join(dict.fromkeys(actor for _, actor in frames if actor)) or None
+        versions.record(entity, df, data_dir(), actor=actors, changes=changes, note=note,
+                        stamp=versions.file_stamp(path))
+    history.maybe_snapshot(journal, data_dir())
+
+
+def _replace_csv(df, path):
+    """Write a table so that readers see either the old file or the new one, never half of it"""
+    df.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def archive_closed(entity, min_age_days=0):
+    """Move closed rows of `entity` into the archive, returns how many moved"""
+    with _write_lock():
+        hot = read_table(entity, raw=True)
+        # Make sure the rows are journaled before they leave the hot table
+        get_journal().record(entity, hot, actor=EXTERNAL_ACTOR, keep=archive.archived_ids(entity, data_dir()))
+        remaining = archive.archive_closed(entity, data_dir(), hot, min_age_days=min_age_days)
+        if len(remaining) < len(hot):
+            _replace_csv(remaining, table_path(entity))
+        return len(hot) - len(remaining)
@@ -0,0 +1,361 @@
+"""
+Tenants: one DevOpsHub serving several credit unions
+
+Each tenant is a data directory of its own (TENANTS_DIR/<name>, with the
+same tables, archive, journal and shared snapshots as data/), so their
+requests, errors and projects are separate partitions, their IDs are
+numbered independently and each has its own writer (see commit.py). The
+top-level data directory is the "default" tenant. A session picks its
+tenant with ?tenant=<name> and is let in once it enters that tenant's
+access key (see ui.select_tenant()); only a hash of the key is kept, in
+the tenant's tenant.json. The default tenant needs one only if it has
+been given one. A deployment started with DEVOPSHUB_TENANT=<name> serves
+that tenant and nothing else.
+
+Loaded tables are kept per tenant in a TableCache with a memory budget
+(DEVOPSHUB_TENANT_CACHE_MB, or "cache_mb" in the tenant's tenant.json).
+Past its budget a tenant drops its own least recently used tables, so one
+large tenant reloading does not evict or wait on anybody else's. Their
+hits, misses and sizes are served as metrics (see metrics.py).
+
+Usage:
+    python -m devopshub.tenants list
+    python -m devopshub.tenants create acme-cu --cache-mb 1024
+    python -m devopshub.tenants key acme-cu      # issue a new access key
+"""
+import argparse
+import hashlib
+import hmac
+import inspect
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+from collections import Counter, OrderedDict
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from devopshub import metrics, people, storage
+
+DEFAULT_TENANT = "default"
+TENANT_FILE = "tenant.json"
+CACHE_MB = float(os.environ.get("DEVOPSHUB_TENANT_CACHE_MB", "512"))
+
+# Set to serve one tenant only; ?tenant= is then ignored
+DEPLOYMENT_TENANT = os.environ.get("DEVOPSHUB_TENANT") or None
+
+# tenant.json field holding the SHA-256 of the tenant's access key
+KEY_FIELD = "key_sha256"
+
+NAME_PATTERN = re.compile(r"[a-z0-9][a-z0-9-]{0,62}")
+
+MB = 1024 * 1024
+
+
+def tenants_dir():
+    """Directory holding one data directory per tenant"""
+    return os.environ.get("DEVOPSHUB_TENANTS_DIR") or os.path.join(storage.DATA_DIR, "tenants")
+
+
+def tenant_dir(name):
+    """Data directory of tenant `name` (raises ValueError for a malformed name)"""
+    if name in (None, DEFAULT_TENANT):
+        return storage.DATA_DIR
+    if not NAME_PATTERN.fullmatch(name):
+        raise ValueError(f"Invalid tenant name: {name!r} (lowercase letters, digits and dashes)")
+    return os.path.join(tenants_dir(), name)
+
+
+def exists(name):
+    try:
+        return os.path.isdir(tenant_dir(name))
+    except ValueError:
+        return False
+
+
+def list_tenants():
+    """Names of all tenants, the default one first"""
+    try:
+        names = sorted(n for n in os.listdir(tenants_dir()) if NAME_PATTERN.fullmatch(n) and exists(n))
+    except FileNotFoundError:
+        names = []
+    return [DEFAULT_TENANT] + [n for n in names if n != DEFAULT_TENANT]
+
+
+def settings(data_dir):
+    """Contents of a tenant's tenant.json ({} if it has none)"""
+    try:
+        with open(os.path.join(data_dir, TENANT_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_settings(data_dir, values):
+    path = os.path.join(data_dir, TENANT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(values, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _key_hash(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def issue_key(name):
+    """Give tenant `name` a new random access key (replacing any old one) and return it"""
+    key = secrets.token_urlsafe(24)
+    directory = tenant_dir(name)
+    _write_settings(directory, {**settings(directory), KEY_FIELD: _key_hash(key)})
+    return key
+
+
+def has_key(name):
+    """Whether tenant `name` has been issued an access key"""
+    return KEY_FIELD in settings(tenant_dir(name))
+
+
+def requires_key(name):
+    """Whether a session must enter an access key to use tenant `name`
+
+    Every tenant but the default one does; one that has no key yet can't
+    be opened until it is issued one.
+    """
+    return name != DEFAULT_TENANT or has_key(name)
+
+
+def check_key(name, key):
+    """Whether `key` is the access key of tenant `name`"""
+    stored = settings(tenant_dir(name)).get(KEY_FIELD)
+    return bool(stored and key) and hmac.compare_digest(stored, _key_hash(key))
+
+
+def session_data_dir():
+    """Data directory of the tenant chosen by the Streamlit session running this thread, if any"""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    name = st.session_state.get("tenant")
+    return tenant_dir(name) if name else None
+
+
+def create(name, source=None, cache_mb=None):
+    """Create an empty tenant, with the table headers of `source` (default data directory)
+
+    Returns (data directory, access key).
+    """
+    if name == DEFAULT_TENANT:
+        raise ValueError(f"{DEFAULT_TENANT!r} is the top-level data directory")
+    directory = tenant_dir(name)
+    if os.path.exists(directory):
+        raise FileExistsError(f"Tenant {name!r} already exists in {directory}")
+    source = source or storage.DATA_DIR
+    os.makedirs(directory)
+    for filename in list(storage.ENTITIES.values()) + [people.PEOPLE_FILE]:
+        header = pd.read_csv(os.path.join(source, filename), nrows=0)
+        header.to_csv(os.path.join(directory, filename), index=False)
+    if cache_mb is not None:
+        _write_settings(directory, {"cache_mb": cache_mb})
+    return directory, issue_key(name)
+
+
+def memory_size(value):
+    """Approximate bytes held by a loaded table (or a tuple/list of them)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, (tuple, list)):
+        return sum(memory_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class TableCache:
+    """One tenant's loaded tables, least recently used dropped first past `budget` bytes
+
+    Keys are (loader, arguments); hits and misses are counted per loader too.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loader_hits = Counter()
+        self.loader_misses = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._generation = 0
+
+    def get(self, key, load):
+        """Cached value of `key`, calling `load()` (once, however many sessions ask) if missing"""
+        with self._lock:
+            if key in self._entries:
+                return self._hit(key)
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._hit(key)
+                generation = self._generation
+            # Loaded without holding the cache lock: other tables stay readable meanwhile
+            value = load()
+            size = memory_size(value)
+            with self._lock:
+                self.misses += 1
+                self.loader_misses[key[0]] += 1
+                self._loading.pop(key, None)
+                # A clear() while loading means `value` may already be out of date
+                if generation == self._generation:
+                    self._entries[key] = (value, size)
+                    self.size += size
+                    self._evict()
+        return value
+
+    def _hit(self, key):
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.loader_hits[key[0]] += 1
+        return self._entries[key][0]
+
+    def _evict(self):
+        # The entry just added is kept even if it alone is over budget
+        while self.size > self.budget and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    def discard(self, loader):
+        """Drop every cached value of `loader`"""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0] == loader]:
+                self.size -= self._entries.pop(key)[1]
+
+    def stats(self):
+        return {
+            "tables": len(self._entries),
+            "size_mb": round(self.size / MB, 1),
+            "budget_mb": round(self.budget / MB, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(data_dir):
+    """The table cache of the tenant in `data_dir`, one per directory per process"""
+    key = os.path.abspath(data_dir)
+    with _caches_lock:
+        if key not in _caches:
+            budget = settings(data_dir).get("cache_mb", CACHE_MB)
+            _caches[key] = TableCache(budget * MB)
+        return _caches[key]
+
+
+def _cache_requests():
+    with _caches_lock:
+        caches = list(_caches.items())
+    for directory, cache in caches:
+        with cache._lock:
+            counts = [("hit", cache.loader_hits.copy()), ("miss", cache.loader_misses.copy())]
+        for result, by_loader in counts:
+            for (filename, name), count in by_loader.items():
+                script = os.path.splitext(os.path.basename(filename))[0]
+                yield (metrics.tenant_of(directory), script, name, result), count
+
+
+def _cache_stat(stat):
+    def collect():
+        with _caches_lock:
+            caches = list(_caches.items())
+        return [((metrics.tenant_of(directory),), getattr(cache, stat)) for directory, cache in caches]
+    return collect
+
+
+metrics.Collected("devopshub_table_cache_requests_total", "counter",
+                  "Loader calls answered from the table cache (hit) or by loading (miss)",
+                  ["tenant", "script", "loader", "result"], _cache_requests)
+metrics.Collected("devopshub_table_cache_evictions_total", "counter", "Tables dropped to stay within budget",
+                  ["tenant"], _cache_stat("evictions"))
+metrics.Collected("devopshub_table_cache_bytes", "gauge", "Approximate memory held by cached tables",
+                  ["tenant"], _cache_stat("size"))
+metrics.Collected("devopshub_table_cache_budget_bytes", "gauge", "Memory budget of the table cache",
+                  ["tenant"], _cache_stat("budget"))
+
+
+def cached(func):
+    """Cache a table loader per tenant, in place of @st.cache_resource
+
+    Values are shared by every session of the tenant; clear() drops the
+    current tenant's ones only.
+    """
+    # Scripts define their loaders again on every run, the cache outlives them
+    code = inspect.unwrap(func).__code__
+    loader = (code.co_filename, code.co_name)
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (loader, tuple(bound.arguments.items()))
+        return get_cache(storage.data_dir()).get(key, lambda: func(*args, **kwargs))
+
+    wrapper.clear = lambda: get_cache(storage.data_dir()).discard(loader)
+    return wrapper
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List or create DevOpsHub tenants, or issue their access keys")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show every tenant with its data directory and table sizes")
+    new = sub.add_parser("create", help="Create an empty tenant")
+    new.add_argument("name", help="Lowercase letters, digits and dashes")
+    new.add_argument("--from", dest="source", help="Copy table headers from this data directory")
+    new.add_argument("--cache-mb", type=float, help=f"Table cache budget (default {CACHE_MB:g})")
+    rekey = sub.add_parser("key", help="Issue a new access key for a tenant (the old one stops working)")
+    rekey.add_argument("name")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        try:
+            directory, key = create(args.name, args.source, args.cache_mb)
+        except (ValueError, FileExistsError) as exc:
+            parser.error(str(exc))
+        print(f"[OK] Created tenant {args.name} in {directory}")
+        print(f"  Access key (shown once, give it to the tenant's users): {key}")
+        return 0
+
+    if args.command == "key":
+        if not exists(args.name):
+            parser.error(f"No such tenant: {args.name}")
+        print(f"[OK] New access key for {args.name} (shown once): {issue_key(args.name)}")
+        return 0
+
+    for name in list_tenants():
+        directory = tenant_dir(name)
+        budget = settings(directory).get("cache_mb", CACHE_MB)
+        rows = []
+        for entity, filename in storage.ENTITIES.items():
+            try:
+                rows.append(f"{entity} {len(pd.read_csv(os.path.join(directory, filename), usecols=['ID']))}")
+            except FileNotFoundError:
+                rows.append(f"{entity} -")
+        access = "key" if has_key(name) else ("no key" if requires_key(name) else "open")
+        print(f"{name:<20} {directory:<32} cache {budget:g} MB  {access:<7} " + ", ".join(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Streamlit widgets shared by the dashboard and the pages
+"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+from devopshub import notify, storage, tenants, validate, versions, views, watcher
+
+# Storage calls made while serving a session use its tenant's data directory
+storage.session_data_dir = tenants.session_data_dir
+
+
+def select_tenant():
+    """Serve the tenant this session may use, call first on every page
+
+    With DEVOPSHUB_TENANT set that is the only tenant. Otherwise ?tenant=
+    names one, and the session switches to it only after the tenant's
+    access key is entered (remembered for the session).
+    """
+    if tenants.DEPLOYMENT_TENANT:
+        name = tenants.DEPLOYMENT_TENANT
+    else:
+        name = st.query_params.get("tenant") or st.session_state.get("tenant") or tenants.DEFAULT_TENANT
+    if not tenants.exists(name):
+        st.error(f"Unknown tenant: {name}")
+        st.stop()
+    unlocked = st.session_state.setdefault("tenants_unlocked", set())
+    if not tenants.DEPLOYMENT_TENANT and name not in unlocked and tenants.requires_key(name):
+        _ask_tenant_key(name)
+    st.session_state["tenant"] = name
+    if name != tenants.DEFAULT_TENANT:
+        st.sidebar.caption(f"🏦 Tenant: **{name}**")
+    return name
+
+
+def _ask_tenant_key(name):
+    """Ask for the access key of tenant `name`; stops the script until the right one is entered"""
+    with st.form(f"tenant_key_{name}"):
+        st.markdown(f"🔒 **{name}** needs its access key")
+        key = st.text_input("Access key", type="password")
+        submitted = st.form_submit_button("Open")
+    if submitted and tenants.check_key(name, key):
+        st.session_state["tenants_unlocked"].add(name)
+        st.session_state["tenant"] = name
+        st.rerun()
+    if submitted:
+        st.error("Wrong access key")
+    elif not tenants.has_key(name):
+        st.info(f"{name} has no access key yet; issue one with `python -m devopshub.tenants key {name}`")
+    st.stop()
+
+
+def actor_input():
+    """Sidebar field for who is making changes, kept across page switches"""
+    # Re-assigning the key stops Streamlit from dropping it on another page
+    st.session_state["actor"] = st.session_state.get("actor", "")
+    st.sidebar.text_input(
+        "Acting as",
+        key="actor",
+        placeholder="Your name",
+        help="Recorded with every change you make"
+    )
+    return current_actor()
+
+
+def current_actor():
+    """Name entered in the sidebar, or None"""
+    return st.session_state.get("actor", "").strip() or None
+
+
+KEEP = "(keep)"
+
+
+def bulk_edit(df, columns, fields, key):
+    """Row-selectable table with "set column to" controls for changing many rows at once
+
+    `fields` maps each editable column to its allowed values. Returns
+    (selected IDs, {column: new value}) when Apply is clicked, otherwise None.
+    """
+    event = st.dataframe(
+        df[columns],
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"{key}_rows"
+    )
+    # A selection left over from before the table changed can point past its end
+    ids = df["ID"].iloc[[row for row in event.selection.rows if row < len(df)]].tolist()
+
+    changes = {}
+    cols = st.columns(len(fields) + 1, vertical_alignment="bottom")
+    for col, (column, options) in zip(cols, fields.items()):
+        value = col.selectbox(f"Set {column}", [KEEP] + list(options), key=f"{key}_{column}")
+        if value != KEEP:
+            changes[column] = value
+    apply = cols[-1].button(
+        f"Apply to {len(ids)} selected",
+        key=f"{key}_apply",
+        disabled=not (ids and changes),
+        type="primary"
+    )
+    return (ids, changes) if apply else None
+
+
+def refresh_on_change(loaders):
+    """Keep `loaders` ({entity: [cached functions]}) fresh and rerun when their data changes
+
+    Call once per script run, after the loaders are defined.
+    """
+    data_watcher = watcher.get_watcher(storage.data_dir())
+    # Starts the outbox worker if email is configured
+    notify.get_notifier(storage.data_dir())
+    for entity, functions in loaders.items():
+        for loader in functions:
+            data_watcher.register(entity, loader)
+    entities = sorted(loaders)
+    # The versions this run was rendered with; the fragment compares against them
+    st.session_state["data_versions"] = {entity: data_watcher.version(entity) for entity in entities}
+
+    @st.fragment(run_every=watcher.POLL_INTERVAL)
+    def check():
+        seen = st.session_state.get("data_versions", {})
+        if any(data_watcher.version(entity) != seen.get(entity) for entity in entities):
+            st.rerun(scope="app")
+
+    check()
+
+
+def data_saved():
+    """Drop this worker's cached copies of the tables that just changed (call after saving)"""
+    watcher.get_watcher(storage.data_dir()).check()
+    notifier = notify.get_notifier(storage.data_dir())
+    if notifier is not None:
+        # Send any alerts the save queued now
+        notifier.wake()
+
+
+def quarantine_notice(entity, df):
+    """Warn that rows of a loaded table failed validation and are not shown"""
+    count = df.attrs.get("quarantined")
+    if count:
+        st.warning(
+            f"{count} {entity} rows failed validation and are hidden. They are listed with their "
+            f"problems in {os.path.dirname(validate.quarantine_path(entity))}/ "
+            "(see `python -m devopshub.validate check`)."
+        )
+
+
+def rerun_fragments(entity, keys):
+    """Redraw only the fragments named `keys` after this session saved `entity`
+
+    Call from a widget callback. The rest of the page is not rerun for this
+    save; other sessions still pick it up through refresh_on_change().
+    """
+    seen = st.session_state.get("data_versions", {})
+    if entity in seen:
+        seen[entity] = watcher.get_watcher(storage.data_dir()).version(entity)
+    st.rerun(scope=keys)
+
+
+NO_VIEW = "(no saved view)"
+
+
+def view_picker(entity, key):
+    """Saved view selector for a filter panel, returns the chosen view's definition or None
+
+    Put it above the filters and use the definition for their defaults.
+    """
+    saved = views.list_views(entity)
+    options = [NO_VIEW] + sorted(saved)
+    # Someone else may have deleted the view this session had open
+    if st.session_state.get(key, NO_VIEW) not in options:
+        st.session_state[key] = NO_VIEW
+    name = st.selectbox("Saved view", options, key=key)
+    return saved.get(name)
+
+
+def view_controls(entity, key, definition):
+    """Save the filter panel as a view, or delete the view picked with view_picker(`key`)"""
+    col1, col2, _ = st.columns([1, 1, 4])
+    with col1.popover("💾 Save view"):
+        st.text_input("View name", key=f"{key}_name", placeholder="e.g. My open Critical/High")
+        st.button("Save", key=f"{key}_save", on_click=_save_view, args=(entity, key, definition))
+    selected = st.session_state.get(key, NO_VIEW)
+    if selected != NO_VIEW:
+        col2.button(f"🗑️ Delete \"{selected}\"", key=f"{key}_delete", on_click=_delete_view, args=(entity, key, selected))
+
+
+def _save_view(entity, key, definition):
+    name = st.session_state.get(f"{key}_name", "").strip()
+    if name and name != NO_VIEW:
+        views.save_view(entity, name, definition)
+        st.session_state[key] = name
+
+
+def _delete_view(entity, key, name):
+    views.delete_view(entity, name)
+    st.session_state[key] = NO_VIEW
+
+
+VERSIONS_SHOWN = 20
+
+
+def version_history(entity, key):
+    """Undo the last change to `entity`, or restore one of its earlier versions"""
+    saved = versions.list_versions(entity, storage.data_dir())
+    with st.expander("🕘 Versions"):
+        done = st.session_state.pop(f"{key}_done", None)
+        if done:
+            st.success(done)
+        if len(saved) < 2:
+            st.caption("Nothing to undo yet.")
+            return
+        last = saved[-1]
+        st.button(
+            f"↩️ Undo last change (version {last['version']}, {last['actor'] or 'unknown'} "
+            f"at {last['ts'].replace('T', ' ')[:16]})",
+            key=f"{key}_undo",
+            on_click=_undo_version,
+            args=(entity, key),
+        )
+        recent = pd.DataFrame(list(reversed(saved[-VERSIONS_SHOWN:])))
+        st.dataframe(
+            recent[["version", "ts", "actor", "changes", "rows", "note"]].rename(columns={
+                "version": "Version", "ts": "Saved", "actor": "By", "changes": "Changes", "rows": "Rows", "note": "Note",
+            }),
+            hide_index=True,
+        )
+        col1, col2 = st.columns([1, 3], vertical_alignment="bottom")
+        col1.selectbox("Version", [v["version"] for v in reversed(saved[:-1])], key=f"{key}_pick")
+        col2.button("Restore this version", key=f"{key}_restore", on_click=_restore_version, args=(entity, key))
+
+
+def _undo_version(entity, key):
+    undone = versions.latest(entity, storage.data_dir())
+    version = versions.undo(entity, current_actor())
+    data_saved()
+    st.session_state[f"{key}_done"] = (
+        f"Undid version {undone['version']}, saved as version {version['version']} (undo that to bring it back)"
+    )
+
+
+def _restore_version(entity, key):
+    number = st.session_state[f"{key}_pick"]
+    current = versions.latest(entity, storage.data_dir())
+    version = versions.restore(entity, number, current_actor())
+    data_saved()
+    if version["version"] == current["version"]:
+        st.session_state[f"{key}_done"] = f"Version {number} is the same as the current table, nothing to restore"
+    else:
+        st.session_state[f"{key}_done"] = f"Restored version {number} as version {version['version']}"
@@ -0,0 +1,307 @@
+"""
+Schema checks for the requests, errors and projects tables
+
+Each table is checked in one vectorized pass: every rule is a mask over
+whole columns, never a loop over rows, so a million-row import is checked
+in seconds. The rules:
+
+    required   ID and the columns the pages rely on are filled in
+    ids        IDs are well formed (REQ-001, ERR-001, PROJ-001) and unique
+    types      person keys are whole numbers
+    enums      Type, Priority, Status, Severity, ... have known values
+    dates      YYYY-MM-DD, and in order (reported before resolved, ...)
+    people     person keys are in people.csv
+    links      related projects and linked requests exist
+    checklist  SDLC Checklist reads Phase:Status|Phase:Status|...
+
+Rows breaking an "error" rule are quarantined: the app leaves them out
+(see shared.py) and they are written with their problems to
+data/quarantine/<table>.csv for someone to fix. "warning" rules (date
+order, dangling people and links) are only reported.
+
+Usage:
+    python -m devopshub.validate check
+    python -m devopshub.validate import requests new_requests.csv
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from devopshub import archive, people, storage
+
+QUARANTINE_DIR = "quarantine"
+IMPORT_ACTOR = "import"
+
+ERROR = "error"
+WARNING = "warning"
+
+SDLC_STATUSES = ["Complete", "In Progress", "Pending"]
+SDLC_PATTERN = r"[^:|]+:(?:{0})(?:\|[^:|]+:(?:{0}))*".format("|".join(map(re.escape, SDLC_STATUSES)))
+
+PRIORITIES = ["Low", "Medium", "High", "Critical"]
+
+SCHEMAS = {
+    "requests": {
+        "required": ["Title", "Type", "Priority", "Status", "Created Date"],
+        "enums": {
+            "Type": ["Custom Program", "SQL Query", "Report", "Script"],
+            "Priority": PRIORITIES,
+            "Status": ["Submitted", "In Progress", "Testing", "Completed"],
+        },
+        "dates": ["Created Date", "Due Date", "Completed Date"],
+        "order": [("Created Date", "Completed Date"), ("Created Date", "Due Date")],
+        "people": ["Requester ID", "Assignee ID"],
+        "links": {"Related Project": ("projects", None)},
+    },
+    "errors": {
+        "required": ["System", "Severity", "Status", "Date Reported"],
+        "enums": {
+            "System": ["Datasafe", "Keystone", "Custom Integration"],
+            "Severity": PRIORITIES,
+            "Status": ["New", "Investigating", "Fixed", "Reported to Fiserv"],
+            "Reported to Fiserv": ["Yes", "No"],
+        },
+        "dates": ["Date Reported", "Date Resolved"],
+        "order": [("Date Reported", "Date Resolved")],
+        "people": [],
+        "links": {},
+    },
+    "projects": {
+        "required": ["Project Name", "Status", "Start Date", "SDLC Checklist"],
+        "enums": {"Status": ["Planning", "In Progress", "Testing", "Deployed", "On Hold"]},
+        "dates": ["Start Date", "Target Completion", "Actual Completion"],
+        "order": [("Start Date", "Target Completion"), ("Start Date", "Actual Completion")],
+        "people": ["Team Member IDs"],
+        "links": {"Linked Requests": ("requests", ",")},
+    },
+}
+
+PROBLEM_COLUMNS = ["Row", "ID", "Column", "Problem", "Level"]
+
+
+def parse_checklist(value):
+    """[(phase, status)] of an SDLC Checklist value, skipping anything unreadable"""
+    if not isinstance(value, str):
+        return []
+    return [
+        (phase.strip(), status.strip())
+        for phase, sep, status in (item.partition(":") for item in value.split("|"))
+        if sep and phase.strip()
+    ]
+
+
+def _text(series):
+    """Column as stripped strings, blanks (and NaN) as ""."""
+    return series.astype("string").fillna("").str.strip()
+
+
+def references(entity, data_dir=None):
+    """{"people": person keys, table: IDs} that the links of `entity` may point to"""
+    data_dir = data_dir or storage.data_dir()
+    refs = {"people": set(people.read_people(data_dir)["Person ID"].astype("int64"))}
+    with storage.using(data_dir):
+        for table, _ in SCHEMAS[entity]["links"].values():
+            ids = storage.read_table(table, include_archive=True, raw=True, columns=["ID"])["ID"]
+            refs[table] = set(ids)
+    return refs
+
+
+def check(entity, df, refs=None):
+    """Problems found in `df` (one row per problem, see PROBLEM_COLUMNS)
+
+    `df` holds the table's stored columns (person keys, names may be
+    attached too). `refs` comes from references(); without it people and
+    links are not looked up. "Row" is the position of the row in `df`.
+    """
+    schema = SCHEMAS[entity]
+    # Exploded list columns are grouped back by index label, which must be the position
+    df = df.reset_index(drop=True)
+    found = []
+
+    def report(mask, column, problem, level=ERROR):
+        rows = np.flatnonzero(np.asarray(mask, dtype=bool))
+        if len(rows):
+            found.append(pd.DataFrame({"Row": rows, "Column": column, "Problem": problem, "Level": level}))
+
+    missing = [c for c in ["ID"] + schema["required"] if c not in df.columns]
+    if missing:
+        # Nothing else can be checked without them
+        report(np.ones(len(df)), ", ".join(missing), "column missing")
+        return _problems(found, df)
+
+    ids = _text(df["ID"])
+    prefix = next(p for p, e in storage.ID_PREFIXES.items() if e == entity)
+    report(~ids.str.fullmatch(re.escape(prefix) + r"\d+"), "ID", f"ID is not like {prefix}001")
+    report((ids != "") & ids.duplicated(), "ID", "duplicate ID")
+
+    for column in schema["required"]:
+        report(_text(df[column]) == "", column, "required")
+
+    for column, allowed in schema["enums"].items():
+        if column in df.columns:
+            values = _text(df[column])
+            report((values != "") & ~values.isin(allowed), column, f"not one of {', '.join(allowed)}")
+
+    dates = {}
+    for column in schema["dates"]:
+        if column in df.columns:
+            values = _text(df[column])
+            dates[column] = pd.to_datetime(values.where(values != ""), format="%Y-%m-%d", errors="coerce")
+            report((values != "") & dates[column].isna(), column, "not a YYYY-MM-DD date")
+    for before, after in schema["order"]:
+        if before in dates and after in dates:
+            report(dates[after] < dates[before], after, f"before {before}", WARNING)
+
+    for column in schema["people"]:
+        if column not in df.columns:
+            continue
+        keys = _text(df[column])
+        if column in people.LIST_KEYS.get(entity, {}).values():
+            keys = keys.str.split(";").explode()
+        numbers = pd.to_numeric(keys.where(keys != ""), errors="coerce")
+        bad_type = (keys != "") & (numbers.isna() | (numbers % 1 != 0))
+        report(bad_type.groupby(level=0).any(), column, "person key is not a whole number")
+        if refs is not None:
+            unknown = numbers.notna() & ~numbers.isin(refs["people"])
+            report(unknown.groupby(level=0).any(), column, "person not in people.csv", WARNING)
+
+    for column, (table, separator) in schema["links"].items():
+        if refs is None or column not in df.columns:
+            continue
+        links = _text(df[column])
+        if separator:
+            links = links.str.split(separator).explode().str.strip()
+        unknown = (links != "") & ~links.isin(refs[table])
+        report(unknown.groupby(level=0).any(), column, f"no such {table[:-1]}", WARNING)
+
+    if "SDLC Checklist" in df.columns:
+        checklist = _text(df["SDLC Checklist"])
+        report((checklist != "") & ~checklist.str.fullmatch(SDLC_PATTERN), "SDLC Checklist",
+               f"not Phase:Status|... (statuses {', '.join(SDLC_STATUSES)})")
+
+    return _problems(found, df)
+
+
+def _problems(found, df):
+    if not found:
+        return pd.DataFrame({"Row": np.array([], dtype=np.int64), **{c: [] for c in PROBLEM_COLUMNS[1:]}})
+    problems = pd.concat(found, ignore_index=True).sort_values("Row", kind="stable")
+    problems.insert(1, "ID", df["ID"].to_numpy()[problems["Row"].to_numpy()])
+    return problems.reset_index(drop=True)
+
+
+def split(df, problems):
+    """(rows without errors, quarantined rows with a "Problems" column)"""
+    errors = problems[problems["Level"] == ERROR]
+    bad = np.zeros(len(df), dtype=bool)
+    bad[errors["Row"].to_numpy()] = True
+    quarantined = df[bad].copy()
+    if len(quarantined):
+        text = errors["Column"] + ": " + errors["Problem"]
+        quarantined["Problems"] = text.groupby(errors["Row"].to_numpy()).agg("; ".join).to_numpy()
+    return df[~bad], quarantined
+
+
+def quarantine_path(entity, data_dir=None, suffix=""):
+    return os.path.join(data_dir or storage.data_dir(), QUARANTINE_DIR, f"{entity}{suffix}.csv")
+
+
+def write_quarantine(quarantined, path):
+    """Write the quarantined rows to `path` (removing it when there are none)"""
+    if quarantined.empty:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    quarantined.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def import_rows(entity, path, actor=IMPORT_ACTOR):
+    """Validate a CSV of new rows and add the good ones to the table
+
+    Rows with errors, or an ID the table (or its archive) already has, go
+    to data/quarantine/<table>-import-<time>.csv. Returns (added,
+    quarantined, problems).
+    """
+    incoming = pd.read_csv(path, dtype=str, keep_default_na=False)
+    problems = check(entity, incoming, references(entity))
+    include_archive = entity in archive.CLOSED
+    current = storage.read_table(entity, include_archive=include_archive, raw=True)
+    existing = np.flatnonzero(incoming["ID"].isin(current["ID"]).to_numpy()) if "ID" in incoming else []
+    if len(existing):
+        problems = pd.concat([problems, pd.DataFrame({
+            "Row": existing, "ID": incoming["ID"].to_numpy()[existing],
+            "Column": "ID", "Problem": "ID already exists", "Level": ERROR,
+        })], ignore_index=True)
+    good, quarantined = split(incoming, problems)
+    if len(good):
+        good = good.replace("", np.nan).astype({c: t for c, t in people.DTYPES.items() if c in good.columns})
+        # Store names as keys now: normalizing the combined table would rebuild the
+        # existing rows' keys from their (absent) name columns and blank them
+        good = people.normalize(entity, good, storage.data_dir())
+        storage.write_table(entity, pd.concat([current, good], ignore_index=True), actor=actor)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    write_quarantine(quarantined, quarantine_path(entity, suffix=f"-import-{stamp}"))
+    return len(good), len(quarantined), problems
+
+
+def _print_problems(entity, problems, limit):
+    for level in (ERROR, WARNING):
+        rows = problems[problems["Level"] == level]
+        if rows.empty:
+            continue
+        print(f"  {len(rows)} {level}s in {rows['Row'].nunique()} rows")
+        summary = rows.groupby(["Column", "Problem"]).size().sort_values(ascending=False)
+        for (column, problem), count in summary.items():
+            examples = ", ".join(rows.loc[(rows["Column"] == column) & (rows["Problem"] == problem), "ID"]
+                                 .astype(str).head(limit))
+            print(f"    {count:>7}  {column}: {problem}  (e.g. {examples})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the tables, or import new rows, against their schema")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("check", help="Report problems in the tables and write their quarantine files")
+    run.add_argument("--entity", choices=SCHEMAS, action="append", help="Default: all tables")
+    load = sub.add_parser("import", help="Add the valid rows of a CSV to a table, quarantine the rest")
+    load.add_argument("entity", choices=SCHEMAS)
+    load.add_argument("path")
+    parser.add_argument("--examples", type=int, default=3, help="IDs shown per kind of problem")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        started = time.perf_counter()
+        added, quarantined, problems = import_rows(args.entity, args.path)
+        print(f"[OK] {args.entity}: {added} rows added, {quarantined} quarantined "
+              f"in {time.perf_counter() - started:.1f}s")
+        _print_problems(args.entity, problems, args.examples)
+        if quarantined:
+            print(f"  Quarantined rows are in {os.path.dirname(quarantine_path(args.entity))}")
+        return 0
+
+    failed = False
+    for entity in args.entity or list(SCHEMAS):
+        started = time.perf_counter()
+        df = storage.read_table(entity, include_archive=True, raw=True)
+        problems = check(entity, df, references(entity))
+        _, quarantined = split(df, problems)
+        write_quarantine(quarantined, quarantine_path(entity))
+        status = "[OK]" if quarantined.empty else "[FAIL]"
+        print(f"{status} {entity}: {len(df)} rows checked in {time.perf_counter() - started:.2f}s, "
+              f"{len(quarantined)} quarantined")
+        _print_problems(entity, problems, args.examples)
+        failed |= not quarantined.empty
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Versions of each table, with undo and restore
+
+Every save keeps a version of the table as written. A version is a list of
+chunks of rows, and chunks are stored once by their content
+(data/versions/chunks/<hash>.csv.gz), so a version shares every chunk it
+did not change with the one before: a status change costs one chunk of
+about CHUNK_ROWS rows, compressed. Chunk boundaries fall after rows whose
+ID hashes to a multiple of CHUNK_ROWS, so adding or removing a row only
+changes the chunk it is in, not the ones after it.
+
+Archived rows (see archive.py) are chunked the same way and every version
+points at the archive's chunks too, hashed again only when the archive
+changes, so a restore also brings back rows that were reopened from the
+archive since.
+
+data/versions/<table>.jsonl lists the versions, oldest first. Restoring a
+version (or undoing the last change, i.e. restoring the one before it)
+saves it like any other change: it is journaled, becomes a new version
+itself and can be undone in turn. Rows archived since the version was
+taken come back to the working table if it is restored.
+
+Usage:
+    python -m devopshub.versions list requests
+    python -m devopshub.versions restore requests 41 --actor "Dana"
+    python -m devopshub.versions prune --keep 500
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from devopshub import archive, people
+from devopshub.journal import EXTERNAL_ACTOR
+
+VERSIONS_DIR = "versions"
+CHUNKS_DIR = "chunks"
+CHUNK_ROWS = int(os.environ.get("DEVOPSHUB_VERSION_CHUNK_ROWS", "256"))
+
+RESTORE_ACTOR = "restore"
+
+_archive_chunks = {}
+_archive_chunks_lock = threading.Lock()
+
+
+def _versions_dir(data_dir):
+    return os.path.join(data_dir, VERSIONS_DIR)
+
+
+def _log_path(data_dir, entity):
+    return os.path.join(_versions_dir(data_dir), f"{entity}.jsonl")
+
+
+def _chunk_path(data_dir, chunk):
+    return os.path.join(_versions_dir(data_dir), CHUNKS_DIR, chunk[:2], f"{chunk}.csv.gz")
+
+
+def file_stamp(path):
+    """(mtime, size) of a table file, to tell whether it changed since a version was taken"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def list_versions(entity, data_dir):
+    """Every version of `entity`, oldest first"""
+    try:
+        with open(_log_path(data_dir, entity), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
+    except FileNotFoundError:
+        return []
+
+
+def latest(entity, data_dir):
+    saved = list_versions(entity, data_dir)
+    return saved[-1] if saved else None
+
+
+def chunk_rows(df):
+    """(start, end, hash) of each chunk of `df`'s rows"""
+    if df.empty:
+        return []
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    id_hashes = pd.util.hash_pandas_object(df["ID"], index=False).to_numpy()
+    last_of_chunk = np.flatnonzero(id_hashes[:-1] % CHUNK_ROWS == 0) + 1
+    starts = np.concatenate([[0], last_of_chunk])
+    ends = np.concatenate([last_of_chunk, [len(df)]])
+    columns = json.dumps([str(c) for c in df.columns]).encode("utf-8")
+    return [
+        (start, end, hashlib.blake2b(columns + row_hashes[start:end].tobytes(), digest_size=16).hexdigest())
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+
+
+def _store(df, data_dir, chunks=None):
+    """Write the chunks of `df` no version has yet, returns (hashes, chunks written)"""
+    hashes, written = [], 0
+    for start, end, chunk in chunk_rows(df) if chunks is None else chunks:
+        hashes.append(chunk)
+        path = _chunk_path(data_dir, chunk)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(gzip.compress(df.iloc[start:end].to_csv(index=False).encode("utf-8"), compresslevel=6))
+        os.replace(path + ".tmp", path)
+        written += 1
+    return hashes, written
+
+
+def archive_chunks(entity, data_dir):
+    """Chunks of the archived rows of `entity`, stored and hashed again only when the archive changed"""
+    if entity not in archive.CLOSED:
+        return []
+    stamp = file_stamp(os.path.join(data_dir, archive.ARCHIVE_DIR, archive.MANIFEST_FILE))
+    key = (os.path.abspath(data_dir), entity)
+    with _archive_chunks_lock:
+        cached = _archive_chunks.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        hashes = _store(archive.read_archive(entity, data_dir), data_dir)[0] if stamp else []
+        _archive_chunks[key] = (stamp, hashes)
+        return hashes
+
+
+def record(entity, df, data_dir, actor=None, changes=None, note=None, stamp=None):
+    """Keep `df` (the hot table as written) as a new version, returns it
+
+    Only chunks no earlier version has are written. Nothing is recorded if
+    the table and its archive are the same as in the latest version.
+    `stamp` is the file_stamp() of the table file just written (see
+    checkpoint()).
+    """
+    previous = latest(entity, data_dir)
+    archived = archive_chunks(entity, data_dir)
+    chunks = chunk_rows(df)
+    if (previous is not None and previous["chunks"] == [chunk for _, _, chunk in chunks]
+            and previous.get("archive", []) == archived):
+        return previous
+    hashes, written = _store(df, data_dir, chunks)
+
+    version = {
+        "version": previous["version"] + 1 if previous else 1,
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "actor": actor,
+        "rows": len(df),
+        "changes": changes,
+        "note": note,
+        "new_chunks": written,
+        "stamp": stamp,
+        "columns": [str(c) for c in df.columns],
+        "chunks": hashes,
+        "archive": archived,
+    }
+    os.makedirs(_versions_dir(data_dir), exist_ok=True)
+    with open(_log_path(data_dir, entity), "a", encoding="utf-8") as f:
+        f.write(json.dumps(version, ensure_ascii=False) + "\n")
+    return version
+
+
+def checkpoint(entity, df, path, data_dir):
+    """Keep `df`, the table as read from `path`, unless the latest version is that very file
+
+    Covers the first save (nothing versioned yet) and edits made outside the
+    app, without hashing the table again on every save.
+    """
+    previous = latest(entity, data_dir)
+    stamp = file_stamp(path)
+    if stamp is None or (previous is not None and previous.get("stamp") == stamp):
+        return previous
+    return record(entity, df, data_dir, actor=EXTERNAL_ACTOR, note="as found on disk", stamp=stamp)
+
+
+def _read_chunks(data_dir, chunks, columns):
+    frames = []
+    for chunk in chunks:
+        with open(_chunk_path(data_dir, chunk), "rb") as f:
+            frames.append(pd.read_csv(io.BytesIO(gzip.decompress(f.read())), dtype=people.DTYPES))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True).reindex(columns=columns)
+
+
+def read_version(entity, number, data_dir, include_archive=False):
+    """The table as it was in version `number` (person keys, as stored)"""
+    version = next((v for v in list_versions(entity, data_dir) if v["version"] == number), None)
+    if version is None:
+        raise KeyError(f"No version {number} of {entity}")
+    df = _read_chunks(data_dir, version["chunks"], version["columns"])
+    if include_archive and version.get("archive"):
+        cold = _read_chunks(data_dir, version["archive"], version["columns"])
+        # As in storage.read_table(), a row in both places is the hot one
+        df = pd.concat([df, cold[~cold["ID"].isin(df["ID"])]], ignore_index=True)
+    return df
+
+
+def restore(entity, number, actor=None, note=None):
+    """Save version `number` as the current table of the tenant being served"""
+    from devopshub import storage
+
+    df = read_version(entity, number, storage.data_dir(), include_archive=True)
+    storage.write_table(entity, df, actor=actor or RESTORE_ACTOR, note=note or f"restored version {number}")
+    return latest(entity, storage.data_dir())
+
+
+def undo(entity, actor=None):
+    """Restore the version before the latest one, returns the new version (None if nothing to undo)"""
+    from devopshub import storage
+
+    saved = list_versions(entity, storage.data_dir())
+    if len(saved) < 2:
+        return None
+    last = saved[-1]
+    return restore(entity, saved[-2]["version"], actor, note=f"undid version {last['version']} ({last['actor']})")
+
+
+def prune(data_dir, entities, keep):
+    """Forget all but the last `keep` versions of each table, returns (versions, chunks) deleted"""
+    dropped = 0
+    referenced = set()
+    for entity in entities:
+        saved = list_versions(entity, data_dir)
+        kept = saved[-keep:] if keep else []
+        if len(kept) < len(saved):
+            dropped += len(saved) - len(kept)
+            path = _log_path(data_dir, entity)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(v, ensure_ascii=False) + "\n" for v in kept)
+            os.replace(path + ".tmp", path)
+        referenced.update(chunk for version in kept for chunk in version["chunks"] + version.get("archive", []))
+
+    with _archive_chunks_lock:
+        _archive_chunks.clear()
+    deleted = 0
+    for folder, _, names in os.walk(os.path.join(_versions_dir(data_dir), CHUNKS_DIR)):
+        for name in names:
+            if name.endswith(".csv.gz") and name[:-len(".csv.gz")] not in referenced:
+                os.remove(os.path.join(folder, name))
+                deleted += 1
+    return dropped, deleted
+
+
+def disk_usage(data_dir):
+    """Bytes taken by the chunks of every version"""
+    total = 0
+    for folder, _, names in os.walk(os.path.join(_versions_dir(data_dir), CHUNKS_DIR)):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in names)
+    return total
+
+
+def main(argv=None):
+    from devopshub import storage
+
+    parser = argparse.ArgumentParser(description="List, restore or prune saved versions of the tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("list", help="Show the versions of a table")
+    show.add_argument("entity", choices=storage.ENTITIES)
+    back = sub.add_parser("restore", help="Save an earlier version as the current table")
+    back.add_argument("entity", choices=storage.ENTITIES)
+    back.add_argument("version", type=int)
+    back.add_argument("--actor", help="Name recorded in the change history")
+    trim = sub.add_parser("prune", help="Keep only the latest versions of every table")
+    trim.add_argument("--keep", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    data_dir = storage.data_dir()
+    if args.command == "list":
+        for v in list_versions(args.entity, data_dir):
+            changes = "" if v["changes"] is None else f"{v['changes']} changes"
+            print(f"{v['version']:>6}  {v['ts']}  {v['actor'] or '':<16} {v['rows']:>8} rows  "
+                  f"{changes:<12} {v['new_chunks']:>4} new chunks  {v['note'] or ''}")
+        print(f"Chunks of all tables: {disk_usage(data_dir) / 1024:.0f} KB")
+    elif args.command == "restore":
+        try:
+            version = restore(args.entity, args.version, args.actor)
+        except KeyError as exc:
+            parser.error(exc.args[0])
+        print(f"[OK] Restored {args.entity} version {args.version} as version {version['version']}")
+    elif args.command == "prune":
+        dropped, deleted = prune(data_dir, storage.ENTITIES, args.keep)
+        print(f"[OK] Forgot {dropped} versions, deleted {deleted} chunks")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
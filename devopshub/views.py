@@ -0,0 +1,159 @@
+"""
+Saved views: named filter panels with cached result sets
+
+A view is a filter panel setting saved under a name ("My open
+Critical/High", "Datasafe errors not escalated") in the tenant's
+data/views.json, shared by the whole team. Its definition maps columns to
+the values they may take; columns left at all their values are left out,
+so a view keeps matching new systems or assignees as they appear.
+
+The IDs a view matches are cached per version of the table. When the
+table changes, only the rows touched by journal events since the version
+they were computed from are checked again, so opening a common view is a
+lookup rather than a filter pass over the whole table.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import streamlit as st
+
+from devopshub import journal as journal_module
+from devopshub import storage
+
+VIEWS_FILE = "views.json"
+
+# Free-text search of a view, matched case-insensitively in these columns
+SEARCH = "search"
+SEARCH_COLUMNS = {"projects": ["Project Name", "Description"]}
+
+# Past this share of the table touched, filtering it all again is cheaper
+REBUILD_FRACTION = 0.25
+
+_file_lock = threading.Lock()
+
+
+def _views_path():
+    return os.path.join(storage.data_dir(), VIEWS_FILE)
+
+
+def _read():
+    try:
+        with open(_views_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write(saved):
+    path = _views_path()
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def list_views(entity):
+    """{name: definition} of the views saved for `entity`"""
+    return _read().get(entity, {})
+
+
+def save_view(entity, name, definition):
+    """Save (or overwrite) the view `name`"""
+    with _file_lock:
+        saved = _read()
+        saved.setdefault(entity, {})[name] = definition
+        _write(saved)
+
+
+def delete_view(entity, name):
+    with _file_lock:
+        saved = _read()
+        if saved.get(entity, {}).pop(name, None) is not None:
+            _write(saved)
+
+
+def definition(selected, options, search=""):
+    """View definition of a filter panel
+
+    `selected` and `options` map each filter's column to the values picked
+    and the values it offered.
+    """
+    view = {
+        column: sorted(values, key=str)
+        for column, values in selected.items()
+        if set(values) != set(options[column])
+    }
+    if search:
+        view[SEARCH] = search
+    return view
+
+
+def matches(df, entity, view):
+    """Row mask of `df` for the rows matching `view`"""
+    mask = np.ones(len(df), dtype=bool)
+    for column, values in view.items():
+        if column == SEARCH:
+            found = np.zeros(len(df), dtype=bool)
+            for searched in SEARCH_COLUMNS[entity]:
+                found |= df[searched].str.contains(values, case=False, na=False, regex=False).to_numpy(dtype=bool)
+            mask &= found
+        else:
+            mask &= df[column].isin(values).to_numpy()
+    return mask
+
+
+class ViewResults:
+    """IDs matching each view, brought up to date from the journal as tables change"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.hits = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+        # (table, view) -> (version, journal offset, IDs)
+        self._results = {}
+
+    def ids(self, rows, entity, view):
+        """IDs of the rows of `rows` (a table as loaded, indexed by ID) matching `view`"""
+        version = rows.attrs.get("version")
+        offset = rows.attrs.get("journal_offset")
+        if version is None or offset is None:
+            return frozenset(rows.index[matches(rows, entity, view)])
+        key = (version[:2] + version[3:], json.dumps(view, sort_keys=True))
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                return cached[2]
+            ids = self._refresh(cached, version, rows, entity, view)
+            self._results[key] = (version, offset, ids)
+            return ids
+
+    def _refresh(self, cached, version, rows, entity, view):
+        # The people file or the archive changed: names and hot rows move without journal events
+        if cached is not None and cached[0][2][1:] == version[2][1:]:
+            events, _ = journal_module.get_journal(self.data_dir).follow(cached[1])
+            touched = {event["id"] for event in events if event["entity"] == entity}
+            if touched and len(touched) <= REBUILD_FRACTION * len(rows):
+                self.refreshes += 1
+                # The cached IDs came from an older copy of the table; events
+                # after that copy's offset are checked again against this one
+                present = [row_id for row_id in touched if row_id in rows.index]
+                subset = rows.loc[present]
+                matched = subset.index[matches(subset, entity, view)]
+                return frozenset((cached[2] - touched).union(matched))
+        self.rebuilds += 1
+        return frozenset(rows.index[matches(rows, entity, view)])
+
+
+@st.cache_resource
+def get_results(data_dir):
+    """Shared view results for a data directory (survive reruns and sessions)"""
+    return ViewResults(data_dir)
+
+
+def select(rows, entity, view):
+    """Rows of `rows` (a table as loaded, indexed by ID) matching a saved view"""
+    return rows.loc[list(get_results(storage.data_dir()).ids(rows, entity, view))]
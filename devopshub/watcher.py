@@ -0,0 +1,104 @@
+"""
+Watches the data directory for changes made outside the app
+
+generate_sample_data.py, ETL jobs and admins edit data/*.csv directly. A
+background thread (inotify through watchdog when it is installed, polling
+every POLL_INTERVAL seconds otherwise) notices when a table's files change,
+clears the cached loaders registered for that table and bumps its version.
+Open pages check the versions from a small fragment and rerun themselves
+when one of their tables has changed.
+"""
+import inspect
+import os
+import threading
+import time
+
+import streamlit as st
+
+from devopshub import storage
+
+POLL_INTERVAL = float(os.environ.get("DEVOPSHUB_WATCH_INTERVAL", "2"))
+
+# Let a burst of file events (temp file, rename, ...) settle before looking
+SETTLE_DELAY = 0.05
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # polling only
+    Observer = None
+
+
+class DataWatcher:
+    """Version counters and cache invalidation for each table of a data directory"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._versions = dict.fromkeys(storage.ENTITIES, 0)
+        self._stamps = {entity: self._stamp(entity) for entity in storage.ENTITIES}
+        self._loaders = {entity: {} for entity in storage.ENTITIES}
+        self._wakeup = threading.Event()
+        self._observer = None
+        if Observer is not None and os.path.isdir(data_dir):
+            self._observer = Observer()
+            self._observer.schedule(_WakeUp(self._wakeup), data_dir, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        self._thread = threading.Thread(target=self._run, name="devopshub-watcher", daemon=True)
+        self._thread.start()
+
+    def _stamp(self, entity):
+        # Sizes and mtimes of the CSV, people.csv and the archive manifest
+        with storage.using(self.data_dir):
+            return storage.table_version(entity, include_archive=True)[2]
+
+    def version(self, entity):
+        """Bumped every time the files behind `entity` change"""
+        return self._versions[entity]
+
+    def register(self, entity, loader):
+        """Clear the cached `loader` (st.cache_data or st.cache_resource) whenever `entity` changes"""
+        # Scripts define their loaders again on every run, keep one per script and name
+        code = inspect.unwrap(loader).__code__
+        with self._lock:
+            self._loaders[entity][(code.co_filename, code.co_name)] = loader
+
+    def check(self):
+        """Look for changed tables now, returns the ones that changed"""
+        changed = []
+        with self._lock:
+            for entity in storage.ENTITIES:
+                stamp = self._stamp(entity)
+                if stamp != self._stamps[entity]:
+                    self._stamps[entity] = stamp
+                    self._versions[entity] += 1
+                    changed.append(entity)
+                    # Tenant-keyed loaders (tenants.cached) drop this directory's copies only
+                    with storage.using(self.data_dir):
+                        for loader in self._loaders[entity].values():
+                            loader.clear()
+        return changed
+
+    def _run(self):
+        while True:
+            if self._wakeup.wait(POLL_INTERVAL):
+                self._wakeup.clear()
+                time.sleep(SETTLE_DELAY)
+            self.check()
+
+
+if Observer is not None:
+    class _WakeUp(FileSystemEventHandler):
+        def __init__(self, event):
+            self._event = event
+
+        def on_any_event(self, event):
+            if not event.is_directory:
+                self._event.set()
+
+
+@st.cache_resource
+def get_watcher(data_dir):
+    """Process-wide watcher for a data directory"""
+    return DataWatcher(data_dir)
@@ -4,6 +4,7 @@ Generate realistic sample data for DevOpsHub
 import pandas as pd
 import random
 from datetime import datetime, timedelta
+from devopshub import storage
 
 # Set seed for reproducibility
 random.seed(42)
@@ -254,10 +255,10 @@ if __name__ == "__main__":
     errors_df = generate_errors()
     projects_df = generate_projects()
 
-    # Save to CSV
-    requests_df.to_csv("data/requests.csv", index=False)
-    errors_df.to_csv("data/errors.csv", index=False)
-    projects_df.to_csv("data/projects.csv", index=False)
+    # Save to CSV (journaled, so earlier history is kept)
+    storage.write_table("requests", requests_df, actor="generate_sample_data")
+    storage.write_table("errors", errors_df, actor="generate_sample_data")
+    storage.write_table("projects", projects_df, actor="generate_sample_data")
 
     print(f"[OK] Generated {len(requests_df)} requests")
     print(f"[OK] Generated {len(errors_df)} errors")
@@ -4,9 +4,14 @@ Requests Page - Track programming requests, SQL queries, and reports
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+from devopshub import commit, dateindex, dedupe, forecast, people, profiling, shared, storage, tenants, ui, views
+from devopshub.profiling import profiled, timed
 
 st.set_page_config(page_title="Requests - DevOpsHub", page_icon="📝", layout="wide")
 
+profiling.begin_rerun("Requests")
+ui.select_tenant()
+
 # Custom CSS - DevOps Tech Theme
 st.markdown("""
 <style>
@@ -43,135 +48,251 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Load data
-@st.cache_data
-def load_requests():
-    """Load requests data"""
-    return pd.read_csv("data/requests.csv")
-
-def save_requests(df):
-    """Save requests data"""
-    df.to_csv("data/requests.csv", index=False)
-    st.cache_data.clear()
+@tenants.cached
+@profiled("load_requests")
+def load_requests(include_archive=False):
+    """Load requests data (open items only unless the archive is asked for)"""
+    return shared.read_table("requests", include_archive=include_archive)
+
+@tenants.cached
+def load_requests_by_id(include_archive=False):
+    """Requests keyed by ID, to redraw a single row"""
+    return load_requests(include_archive=include_archive).set_index("ID", drop=False)
+
+@profiled("save_requests")
+def save_requests(updates=(), create=None):
+    """Save changes to requests, returns the new request's ID when creating one"""
+    new_id = commit.save("requests", updates=updates, create=create, actor=ui.current_actor())
+    ui.data_saved()
+    return new_id
+
+def update_request(row_id, values, message, stamp=None):
+    """Row button callback: save `values` (and today's date in the `stamp` column)"""
+    if stamp:
+        values = {**values, stamp: datetime.now().strftime("%Y-%m-%d")}
+    save_requests(updates=[([row_id], values)])
+    st.session_state[f"saved_{row_id}"] = message
+    # Only the row and the counters show the change, the rest of the page stays as it is
+    ui.rerun_fragments("requests", [f"request_{row_id}", "request_counters"])
+
+ui.refresh_on_change({"requests": [load_requests, load_requests_by_id]})
 
 requests_df = load_requests()
 
+with timed("forecast"):
+    # Learns from completed history, so it needs the archive too
+    all_requests_df = load_requests(include_archive=True)
+    forecasts = forecast.request_forecasts(all_requests_df, storage.data_dir())
+
+with timed("duplicate_index"):
+    duplicates = dedupe.get_index(storage.data_dir())
+    duplicates.update(all_requests_df)
+
+ui.actor_input()
+
 # Header
 st.title("📝 Request Tracker")
 st.markdown("Track custom programming requests, SQL queries, reports, and scripts")
+ui.quarantine_notice("requests", all_requests_df)
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📋 All Requests", "➕ New Request", "📊 Analytics"])
 
-with tab1:
-    st.subheader("All Requests")
+def filter_requests(df, statuses, types, priorities, assignees):
+    """Rows of `df` matching the filter panel"""
+    return df[
+        (df["Status"].isin(statuses)) &
+        (df["Type"].isin(types)) &
+        (df["Priority"].isin(priorities)) &
+        (df["Assigned To"].isin(assignees))
+    ]
+
+@profiled("filter")
+def filtered_requests(include_archive, filters, view=None):
+    """Rows matching the filter panel, from the cached result set when it shows a saved view as saved"""
+    if view is not None:
+        return views.select(load_requests_by_id(include_archive=include_archive), "requests", view)
+    return filter_requests(load_requests(include_archive=include_archive), *filters)
+
+@st.fragment(key="request_counters")
+@profiling.fragment("request_counters")
+def request_counters(include_archive, filters, view=None):
+    """Stats for the filtered requests, redrawn on their own after a row action"""
+    filtered_df = filtered_requests(include_archive, filters, view)
+    at_risk = forecasts["P85"] > pd.to_datetime(filtered_df.set_index("ID")["Due Date"]).reindex(forecasts.index)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Total Requests", len(filtered_df))
+    col2.metric("High/Critical", len(filtered_df[filtered_df["Priority"].isin(["High", "Critical"])]))
+    col3.metric("Unassigned", len(filtered_df[filtered_df["Assigned To"] == "Unassigned"]))
+    col4.metric("Overdue", len(filtered_df[pd.to_datetime(filtered_df["Due Date"]) < datetime.now()]))
+    col5.metric("At Risk", int(at_risk.sum()), help="85% forecast lands after the due date")
+
+@profiling.fragment("request_row")
+def request_row(row_id, include_archive):
+    """One request's expander, a fragment of its own so its buttons redraw only this row"""
+    rows = load_requests_by_id(include_archive=include_archive)
+    if row_id not in rows.index:
+        return
+    req = rows.loc[row_id]
+    with st.expander(f"**{req['ID']}** - {req['Title']}", expanded=False):
+        col1, col2 = st.columns([2, 1])
+
+        with col1:
+            st.markdown(f"**Description:** {req['Description']}")
+            st.markdown(f"**Requester:** {req['Requester Name']} ({req['Requester Department']})")
+            st.markdown(f"**Email:** {req['Requester Email']}")
+            if req['Related Project']:
+                st.markdown(f"**Related Project:** {req['Related Project']}")
+
+        with col2:
+            status_class = req['Status'].lower().replace(" ", "")
+            priority_class = req['Priority'].lower()
+
+            st.markdown(
+                f'<span class="status-badge status-{status_class}">{req["Status"]}</span>',
+                unsafe_allow_html=True
+            )
+            st.markdown(
+                f'<span class="status-badge priority-{priority_class}">{req["Priority"]} Priority</span>',
+                unsafe_allow_html=True
+            )
+
+            st.markdown(f"**Type:** {req['Type']}")
+            st.markdown(f"**Technology:** {req['Technology']}")
+            st.markdown(f"**Assigned To:** {req['Assigned To']}")
+            st.markdown(f"**Created:** {req['Created Date']}")
+            st.markdown(f"**Due Date:** {req['Due Date']}")
+            if req['Completed Date']:
+                st.markdown(f"**Completed:** {req['Completed Date']}")
+            if req['ID'] in forecasts.index:
+                p50, p85, p95 = forecasts.loc[req['ID']]
+                st.markdown(f"**Forecast:** {p50:%Y-%m-%d} (85%: {p85:%Y-%m-%d})")
+                if p85 > pd.to_datetime(req['Due Date']):
+                    st.warning("Likely to miss the due date")
+
+        # Edit section (simplified for demo)
+        st.markdown("---")
+        if message := st.session_state.pop(f"saved_{req['ID']}", None):
+            st.success(message)
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.button(
+                "Mark as In Progress", key=f"prog_{req['ID']}", on_click=update_request,
+                args=(req['ID'], {'Status': 'In Progress'}, "Status updated!")
+            )
+
+        with col2:
+            st.button(
+                "Mark as Completed", key=f"comp_{req['ID']}", on_click=update_request,
+                args=(req['ID'], {'Status': 'Completed'}, "Request completed!"),
+                kwargs={"stamp": "Completed Date"}
+            )
+
+        with col3:
+            if st.button(f"Export Details", key=f"exp_{req['ID']}"):
+                st.info("Export feature available in Pro version")
+
+@st.fragment
+@profiled("request_list")
+def request_list():
+    """Filter panel, counters and list: changing a filter reruns only this part of the page"""
+    requests_df = load_requests()
+    saved_view = ui.view_picker("requests", key="request_view")
+
+    def preset(column, options, default):
+        # The saved view's values (all of them if it doesn't filter the column)
+        if saved_view is None:
+            return default
+        return [v for v in saved_view.get(column, options) if v in options]
 
     # Filters
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
+        status_options = ["Submitted", "In Progress", "Testing", "Completed"]
         filter_status = st.multiselect(
             "Status",
-            options=["Submitted", "In Progress", "Testing", "Completed"],
-            default=["Submitted", "In Progress", "Testing"]
+            options=status_options,
+            default=preset("Status", status_options, ["Submitted", "In Progress", "Testing"])
         )
 
+        # Completed requests live in the archive, only load it when asked for
+        include_archive = "Completed" in filter_status
+        if include_archive:
+            requests_df = load_requests(include_archive=True)
+
     with col2:
+        type_options = requests_df["Type"].unique().tolist()
         filter_type = st.multiselect(
             "Type",
-            options=requests_df["Type"].unique().tolist(),
-            default=requests_df["Type"].unique().tolist()
+            options=type_options,
+            default=preset("Type", type_options, type_options)
         )
 
     with col3:
+        priority_options = ["Low", "Medium", "High", "Critical"]
         filter_priority = st.multiselect(
             "Priority",
-            options=["Low", "Medium", "High", "Critical"],
-            default=["Low", "Medium", "High", "Critical"]
+            options=priority_options,
+            default=preset("Priority", priority_options, priority_options)
         )
 
     with col4:
+        assignee_options = requests_df["Assigned To"].unique().tolist()
         filter_assignee = st.multiselect(
             "Assigned To",
-            options=requests_df["Assigned To"].unique().tolist(),
-            default=requests_df["Assigned To"].unique().tolist()
+            options=assignee_options,
+            default=preset("Assigned To", assignee_options, assignee_options)
         )
 
+    definition = views.definition(
+        {"Status": filter_status, "Type": filter_type, "Priority": filter_priority, "Assigned To": filter_assignee},
+        {"Status": status_options, "Type": type_options, "Priority": priority_options, "Assigned To": assignee_options},
+    )
+    ui.view_controls("requests", "request_view", definition)
+    # Left as saved, the view is served from its cached result set
+    view = saved_view if saved_view == definition else None
+
     # Apply filters
-    filtered_df = requests_df[
-        (requests_df["Status"].isin(filter_status)) &
-        (requests_df["Type"].isin(filter_type)) &
-        (requests_df["Priority"].isin(filter_priority)) &
-        (requests_df["Assigned To"].isin(filter_assignee))
-    ]
+    filters = (filter_status, filter_type, filter_priority, filter_assignee)
+    filtered_df = filtered_requests(include_archive, filters, view)
 
     # Stats
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Requests", len(filtered_df))
-    col2.metric("High/Critical", len(filtered_df[filtered_df["Priority"].isin(["High", "Critical"])]))
-    col3.metric("Unassigned", len(filtered_df[filtered_df["Assigned To"] == "Unassigned"]))
-    col4.metric("Overdue", len(filtered_df[pd.to_datetime(filtered_df["Due Date"]) < datetime.now()]))
+    request_counters(include_archive, filters, view)
 
     st.markdown("---")
 
     # Display requests
-    if len(filtered_df) > 0:
+    bulk_mode = st.toggle("Bulk edit", help="Select several requests and change them in a single save")
+
+    if len(filtered_df) > 0 and bulk_mode:
+        assignees = sorted(set(all_requests_df["Assigned To"].dropna()) - {people.UNASSIGNED})
+        applied = ui.bulk_edit(
+            filtered_df.sort_values("Created Date", ascending=False),
+            ["ID", "Title", "Type", "Priority", "Status", "Assigned To", "Due Date"],
+            {
+                "Status": ["Submitted", "In Progress", "Testing", "Completed"],
+                "Assigned To": [people.UNASSIGNED] + assignees,
+            },
+            key="bulk_requests"
+        )
+        if applied:
+            ids, changes = applied
+            updates = [(ids, changes)]
+            if changes.get("Status") == "Completed":
+                closing = requests_df["ID"].isin(ids) & (requests_df["Status"] != "Completed")
+                updates.append((requests_df.loc[closing, "ID"], {"Completed Date": datetime.now().strftime("%Y-%m-%d")}))
+            save_requests(updates=updates)
+            st.success(f"Updated {len(ids)} requests!")
+            st.rerun()
+
+    elif len(filtered_df) > 0:
         # Sort by created date descending
         filtered_df = filtered_df.sort_values("Created Date", ascending=False)
 
-        for _, req in filtered_df.iterrows():
-            with st.expander(f"**{req['ID']}** - {req['Title']}", expanded=False):
-                col1, col2 = st.columns([2, 1])
-
-                with col1:
-                    st.markdown(f"**Description:** {req['Description']}")
-                    st.markdown(f"**Requester:** {req['Requester Name']} ({req['Requester Department']})")
-                    st.markdown(f"**Email:** {req['Requester Email']}")
-                    if req['Related Project']:
-                        st.markdown(f"**Related Project:** {req['Related Project']}")
-
-                with col2:
-                    status_class = req['Status'].lower().replace(" ", "")
-                    priority_class = req['Priority'].lower()
-
-                    st.markdown(
-                        f'<span class="status-badge status-{status_class}">{req["Status"]}</span>',
-                        unsafe_allow_html=True
-                    )
-                    st.markdown(
-                        f'<span class="status-badge priority-{priority_class}">{req["Priority"]} Priority</span>',
-                        unsafe_allow_html=True
-                    )
-
-                    st.markdown(f"**Type:** {req['Type']}")
-                    st.markdown(f"**Technology:** {req['Technology']}")
-                    st.markdown(f"**Assigned To:** {req['Assigned To']}")
-                    st.markdown(f"**Created:** {req['Created Date']}")
-                    st.markdown(f"**Due Date:** {req['Due Date']}")
-                    if req['Completed Date']:
-                        st.markdown(f"**Completed:** {req['Completed Date']}")
-
-                # Edit section (simplified for demo)
-                st.markdown("---")
-                col1, col2, col3 = st.columns(3)
-
-                with col1:
-                    if st.button(f"Mark as In Progress", key=f"prog_{req['ID']}"):
-                        requests_df.loc[requests_df['ID'] == req['ID'], 'Status'] = 'In Progress'
-                        save_requests(requests_df)
-                        st.success("Status updated!")
-                        st.rerun()
-
-                with col2:
-                    if st.button(f"Mark as Completed", key=f"comp_{req['ID']}"):
-                        requests_df.loc[requests_df['ID'] == req['ID'], 'Status'] = 'Completed'
-                        requests_df.loc[requests_df['ID'] == req['ID'], 'Completed Date'] = datetime.now().strftime("%Y-%m-%d")
-                        save_requests(requests_df)
-                        st.success("Request completed!")
-                        st.rerun()
-
-                with col3:
-                    if st.button(f"Export Details", key=f"exp_{req['ID']}"):
-                        st.info("Export feature available in Pro version")
+        for row_id in filtered_df["ID"]:
+            st.fragment(request_row, key=f"request_{row_id}")(row_id, include_archive)
     else:
         st.info("No requests match the selected filters.")
 
@@ -186,6 +307,11 @@ with tab1:
             mime="text/csv"
         )
 
+with tab1:
+    st.subheader("All Requests")
+    request_list()
+    ui.version_history("requests", "request_versions")
+
 with tab2:
     st.subheader("Create New Request")
 
@@ -211,10 +337,20 @@ with tab2:
         if submitted:
             if not all([title, requester_name, requester_email, requester_dept, description]):
                 st.error("Please fill in all required fields (*)")
+            elif (matches := duplicates.similar(title, description)) and \
+                    st.session_state.get("duplicate_warned") != (title, description):
+                # Ask once before creating something that already seems to exist
+                st.session_state["duplicate_warned"] = (title, description)
+                existing = all_requests_df.set_index("ID")
+                lines = [
+                    f"- **{row_id}** {existing.at[row_id, 'Title']} ({existing.at[row_id, 'Status']}, {score:.0%} similar)"
+                    for row_id, score in matches if row_id in existing.index
+                ]
+                st.warning("This looks like existing requests:\n\n" + "\n".join(lines) +
+                           "\n\nSubmit again to create it anyway.")
             else:
                 # Generate new ID
-                last_id = int(requests_df["ID"].str.replace("REQ-", "").max())
-                new_id = f"REQ-{last_id + 1:03d}"
+                new_id = storage.next_id("requests")
 
                 # Create new request
                 new_request = {
@@ -235,37 +371,54 @@ with tab2:
                     "Related Project": ""
                 }
 
-                # Add to dataframe
-                new_df = pd.concat([requests_df, pd.DataFrame([new_request])], ignore_index=True)
-                save_requests(new_df)
+                # Add to the table
+                new_id = save_requests(create=new_request)
+                duplicates.add(new_id, title, description)
 
                 st.success(f"✓ Request {new_id} created successfully!")
                 st.balloons()
 
 with tab3:
+    profiling.section("analytics")
     st.subheader("Request Analytics")
+    # Analytics cover archived (closed) requests as well
 
     col1, col2 = st.columns(2)
 
     with col1:
         st.markdown("**Requests by Requester Department**")
-        dept_counts = requests_df["Requester Department"].value_counts().head(10)
-        st.bar_chart(dept_counts)
+        dept_counts = all_requests_df["Requester Department"].value_counts().head(10)
+        st.bar_chart(dept_counts[dept_counts > 0])
 
     with col2:
         st.markdown("**Requests by Technology**")
-        tech_counts = requests_df["Technology"].value_counts()
+        tech_counts = all_requests_df["Technology"].value_counts()
         st.bar_chart(tech_counts)
 
     st.markdown("---")
 
+    # All requests from one person
+    st.markdown("**Requests by Requester**")
+    requesters = all_requests_df[["Requester ID", "Requester Name"]].dropna().drop_duplicates().sort_values("Requester Name")
+    requester = st.selectbox(
+        "Requester",
+        options=requesters["Requester ID"].tolist(),
+        format_func=dict(zip(requesters["Requester ID"], requesters["Requester Name"])).get,
+        index=None,
+        label_visibility="collapsed",
+        placeholder="Choose a requester",
+    )
+    if requester is not None:
+        requested = people.rows_for(all_requests_df, "Requester ID", requester)
+        st.dataframe(requested[["ID", "Title", "Status", "Created Date"]], hide_index=True)
+
+    st.markdown("---")
+
     # Completion rate over time
     st.markdown("**Completion Rate Trend**")
-    completed = requests_df[requests_df["Status"] == "Completed"].copy()
-    if len(completed) > 0:
-        completed["Completed Date"] = pd.to_datetime(completed["Completed Date"])
-        completed["Month"] = completed["Completed Date"].dt.to_period("M").astype(str)
-        monthly_counts = completed.groupby("Month").size()
+    completed_index = dateindex.index_for(all_requests_df, "Completed Date", where=("Status", ["Completed"]))
+    if len(completed_index) > 0:
+        monthly_counts = completed_index.monthly_counts()
         st.line_chart(monthly_counts)
     else:
         st.info("No completed requests to analyze yet.")
@@ -278,3 +431,5 @@ with col1:
 with col2:
     if st.button("🚀 Upgrade to Pro"):
         st.info("Contact: paulsemaan007@gmail.com")
+
+profiling.end_rerun()
@@ -3,10 +3,15 @@ Errors Page - Monitor system errors and triage decisions
 """
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from devopshub import commit, correlate, dateindex, profiling, shared, storage, tenants, ui, views
+from devopshub.profiling import profiled, timed
 
 st.set_page_config(page_title="Errors - DevOpsHub", page_icon="⚠️", layout="wide")
 
+profiling.begin_rerun("Errors")
+ui.select_tenant()
+
 # Custom CSS - DevOps Tech Theme
 st.markdown("""
 <style>
@@ -52,149 +57,284 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Load data
-@st.cache_data
-def load_errors():
-    """Load errors data"""
-    return pd.read_csv("data/errors.csv")
-
-def save_errors(df):
-    """Save errors data"""
-    df.to_csv("data/errors.csv", index=False)
-    st.cache_data.clear()
+@tenants.cached
+@profiled("load_errors")
+def load_errors(include_archive=False):
+    """Load errors data (open items only unless the archive is asked for)"""
+    return shared.read_table("errors", include_archive=include_archive)
+
+@tenants.cached
+def load_work():
+    """Requests (with the archive) and projects that errors can be linked to"""
+    return (
+        shared.read_table("requests", include_archive=True, columns=["Status"] + correlate.WORK_FIELDS["requests"]),
+        shared.read_table("projects", columns=["Status"] + correlate.WORK_FIELDS["projects"]),
+    )
+
+@tenants.cached
+def load_errors_by_id(include_archive=False):
+    """Errors keyed by ID, to redraw a single row"""
+    return load_errors(include_archive=include_archive).set_index("ID", drop=False)
+
+@profiled("save_errors")
+def save_errors(updates=(), create=None):
+    """Save changes to errors, returns the new error's ID when creating one"""
+    new_id = commit.save("errors", updates=updates, create=create, actor=ui.current_actor())
+    ui.data_saved()
+    return new_id
+
+def update_error(row_id, values, message, stamp=None):
+    """Row button callback: save `values` (and today's date in the `stamp` column)"""
+    if stamp:
+        values = {**values, stamp: datetime.now().strftime("%Y-%m-%d")}
+    save_errors(updates=[([row_id], values)])
+    st.session_state[f"saved_{row_id}"] = message
+    # Only the row and the counters show the change, the rest of the page stays as it is
+    ui.rerun_fragments("errors", [f"error_{row_id}", "error_counters"])
+
+def escalate_error(row_id):
+    """"Report to Fiserv" callback, the ticket number is taken when the button is clicked"""
+    update_error(row_id, {
+        'Status': 'Reported to Fiserv',
+        'Reported to Fiserv': 'Yes',
+        'Fiserv Ticket': f"FSV-2024-{int(storage.next_id('errors')[4:]) + 1999}"
+    }, "Escalated to Fiserv!")
+
+ui.refresh_on_change({"errors": [load_errors, load_errors_by_id], "requests": [load_work], "projects": [load_work]})
 
 errors_df = load_errors()
 
+ui.actor_input()
+
 # Header
 st.title("⚠️ Error Monitor")
 st.markdown("Track Datasafe/Keystone system errors and triage decisions")
+ui.quarantine_notice("errors", errors_df)
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["🔍 All Errors", "➕ Log New Error", "📊 Analytics"])
 
-with tab1:
-    st.subheader("Error Dashboard")
+def filter_errors(df, statuses, severities, systems, fiserv):
+    """Rows of `df` matching the filter panel"""
+    filtered_df = df[
+        (df["Status"].isin(statuses)) &
+        (df["Severity"].isin(severities)) &
+        (df["System"].isin(systems))
+    ]
+
+    if fiserv != "All":
+        filtered_df = filtered_df[filtered_df["Reported to Fiserv"] == fiserv]
+    return filtered_df
+
+@profiled("filter")
+def filtered_errors(include_archive, filters, view=None):
+    """Rows matching the filter panel, from the cached result set when it shows a saved view as saved"""
+    if view is not None:
+        return views.select(load_errors_by_id(include_archive=include_archive), "errors", view)
+    return filter_errors(load_errors(include_archive=include_archive), *filters)
+
+@st.fragment(key="error_counters")
+@profiling.fragment("error_counters")
+def error_counters(include_archive, filters, view=None):
+    """Stats for the filtered errors, redrawn on their own after a row action"""
+    filtered_df = filtered_errors(include_archive, filters, view)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Errors", len(filtered_df))
+    col2.metric("Critical/High", len(filtered_df[filtered_df["Severity"].isin(["High", "Critical"])]))
+    col3.metric("Open", len(filtered_df[filtered_df["Status"].isin(["New", "Investigating"])]))
+    col4.metric("Escalated to Fiserv", len(filtered_df[filtered_df["Reported to Fiserv"] == "Yes"]))
+
+@profiling.fragment("error_row")
+def error_row(row_id, include_archive, matches):
+    """One error's expander, a fragment of its own so its buttons redraw only this row
+
+    `matches` is its likely related work as (ID, name, score).
+    """
+    rows = load_errors_by_id(include_archive=include_archive)
+    if row_id not in rows.index:
+        return
+    error = rows.loc[row_id]
+    with st.expander(f"**{error['ID']}** - {error['Error Code']}: {error['Description'][:100]}...", expanded=False):
+        col1, col2 = st.columns([2, 1])
+
+        with col1:
+            st.markdown(f"**Full Description:** {error['Description']}")
+
+            if error['Resolution Notes']:
+                st.markdown(f"**Resolution Notes:**")
+                st.info(error['Resolution Notes'])
+
+            if matches:
+                st.markdown("**Likely related work:**")
+                st.markdown("\n".join(
+                    f"- **{work_id}** {name} · {score:.0%} match"
+                    for work_id, name, score in matches
+                ))
+
+        with col2:
+            severity_class = error['Severity'].lower()
+            status_class = error['Status'].lower().replace(" ", "")
+
+            st.markdown(
+                f'<span class="severity-badge severity-{severity_class}">{error["Severity"]}</span> '
+                f'<span class="status-badge status-{status_class}">{error["Status"]}</span>',
+                unsafe_allow_html=True
+            )
+
+            st.markdown(f"**System:** {error['System']}")
+            st.markdown(f"**Error Code:** {error['Error Code']}")
+            st.markdown(f"**Reported:** {error['Date Reported']}")
+
+            if error['Date Resolved']:
+                st.markdown(f"**Resolved:** {error['Date Resolved']}")
+                days_to_resolve = (pd.to_datetime(error['Date Resolved']) - pd.to_datetime(error['Date Reported'])).days
+                st.markdown(f"**Resolution Time:** {days_to_resolve} days")
+
+            if error['Reported to Fiserv'] == "Yes":
+                st.markdown(f"**Fiserv Ticket:** {error['Fiserv Ticket']}")
+
+        # Action buttons
+        st.markdown("---")
+        if message := st.session_state.pop(f"saved_{error['ID']}", None):
+            st.success(message)
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.button(
+                "Mark as Investigating", key=f"inv_{error['ID']}", on_click=update_error,
+                args=(error['ID'], {'Status': 'Investigating'}, "Status updated!")
+            )
+
+        with col2:
+            st.button(
+                "Mark as Fixed", key=f"fix_{error['ID']}", on_click=update_error,
+                args=(error['ID'], {'Status': 'Fixed'}, "Error marked as fixed!"),
+                kwargs={"stamp": "Date Resolved"}
+            )
+
+        with col3:
+            st.button("Report to Fiserv", key=f"fis_{error['ID']}", on_click=escalate_error, args=(error['ID'],))
+
+        with col4:
+            if st.button("Add Notes", key=f"note_{error['ID']}"):
+                st.info("Notes editor available in Pro version")
+
+@st.fragment
+@profiled("error_list")
+def error_list():
+    """Filter panel, counters and list: changing a filter reruns only this part of the page"""
+    errors_df = load_errors()
+    saved_view = ui.view_picker("errors", key="error_view")
+
+    def preset(column, options, default):
+        # The saved view's values (all of them if it doesn't filter the column)
+        if saved_view is None:
+            return default
+        return [v for v in saved_view.get(column, options) if v in options]
 
     # Filters
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
+        status_options = ["New", "Investigating", "Fixed", "Reported to Fiserv"]
         filter_status = st.multiselect(
             "Status",
-            options=["New", "Investigating", "Fixed", "Reported to Fiserv"],
-            default=["New", "Investigating"]
+            options=status_options,
+            default=preset("Status", status_options, ["New", "Investigating"])
         )
 
+        # Fixed errors live in the archive, only load it when asked for
+        include_archive = "Fixed" in filter_status
+        if include_archive:
+            errors_df = load_errors(include_archive=True)
+
     with col2:
+        severity_options = ["Low", "Medium", "High", "Critical"]
         filter_severity = st.multiselect(
             "Severity",
-            options=["Low", "Medium", "High", "Critical"],
-            default=["Low", "Medium", "High", "Critical"]
+            options=severity_options,
+            default=preset("Severity", severity_options, severity_options)
         )
 
     with col3:
+        system_options = errors_df["System"].unique().tolist()
         filter_system = st.multiselect(
             "System",
-            options=errors_df["System"].unique().tolist(),
-            default=errors_df["System"].unique().tolist()
+            options=system_options,
+            default=preset("System", system_options, system_options)
         )
 
     with col4:
+        fiserv_options = ["All", "Yes", "No"]
         filter_fiserv = st.selectbox(
             "Reported to Fiserv",
-            options=["All", "Yes", "No"],
-            index=0
+            options=fiserv_options,
+            index=fiserv_options.index(preset("Reported to Fiserv", fiserv_options, ["All"])[0])
         )
 
-    # Apply filters
-    filtered_df = errors_df[
-        (errors_df["Status"].isin(filter_status)) &
-        (errors_df["Severity"].isin(filter_severity)) &
-        (errors_df["System"].isin(filter_system))
-    ]
+    definition = views.definition(
+        {"Status": filter_status, "Severity": filter_severity, "System": filter_system,
+         "Reported to Fiserv": fiserv_options[1:] if filter_fiserv == "All" else [filter_fiserv]},
+        {"Status": status_options, "Severity": severity_options, "System": system_options,
+         "Reported to Fiserv": fiserv_options[1:]},
+    )
+    ui.view_controls("errors", "error_view", definition)
+    # Left as saved, the view is served from its cached result set
+    view = saved_view if saved_view == definition else None
 
-    if filter_fiserv != "All":
-        filtered_df = filtered_df[filtered_df["Reported to Fiserv"] == filter_fiserv]
+    # Apply filters
+    filters = (filter_status, filter_severity, filter_system, filter_fiserv)
+    filtered_df = filtered_errors(include_archive, filters, view)
+
+    with timed("correlate"):
+        work_requests_df, work_projects_df = load_work()
+        related = correlate.related_work(errors_df, work_requests_df, work_projects_df, storage.data_dir())
+        # Names of the requests and projects linked to the errors shown
+        linked = {work_id for error_id in filtered_df["ID"] for work_id, _ in related.related(error_id)}
+        linked_requests = work_requests_df[work_requests_df["ID"].isin(linked)]
+        linked_projects = work_projects_df[work_projects_df["ID"].isin(linked)]
+        work_names = {
+            **dict(zip(linked_requests["ID"], linked_requests["Title"] + " (" + linked_requests["Status"] + ")")),
+            **dict(zip(linked_projects["ID"], linked_projects["Project Name"] + " (" + linked_projects["Status"] + ")")),
+        }
 
     # Stats
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Errors", len(filtered_df))
-    col2.metric("Critical/High", len(filtered_df[filtered_df["Severity"].isin(["High", "Critical"])]))
-    col3.metric("Open", len(filtered_df[filtered_df["Status"].isin(["New", "Investigating"])]))
-    col4.metric("Escalated to Fiserv", len(filtered_df[filtered_df["Reported to Fiserv"] == "Yes"]))
+    error_counters(include_archive, filters, view)
 
     st.markdown("---")
 
     # Display errors
-    if len(filtered_df) > 0:
+    bulk_mode = st.toggle("Bulk edit", help="Select several errors and change them in a single save")
+
+    if len(filtered_df) > 0 and bulk_mode:
+        applied = ui.bulk_edit(
+            filtered_df.sort_values("Date Reported", ascending=False),
+            ["ID", "Error Code", "System", "Severity", "Status", "Date Reported"],
+            {
+                "Status": ["New", "Investigating", "Fixed"],
+                "Severity": ["Low", "Medium", "High", "Critical"],
+            },
+            key="bulk_errors"
+        )
+        if applied:
+            ids, changes = applied
+            updates = [(ids, changes)]
+            if changes.get("Status") == "Fixed":
+                resolving = errors_df["ID"].isin(ids) & (errors_df["Status"] != "Fixed")
+                updates.append((errors_df.loc[resolving, "ID"], {"Date Resolved": datetime.now().strftime("%Y-%m-%d")}))
+            save_errors(updates=updates)
+            st.success(f"Updated {len(ids)} errors!")
+            st.rerun()
+
+    elif len(filtered_df) > 0:
         # Sort by severity and date
         severity_order = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3}
         filtered_df["Severity_Sort"] = filtered_df["Severity"].map(severity_order)
         filtered_df = filtered_df.sort_values(["Severity_Sort", "Date Reported"], ascending=[True, False])
 
-        for _, error in filtered_df.iterrows():
-            with st.expander(f"**{error['ID']}** - {error['Error Code']}: {error['Description'][:100]}...", expanded=False):
-                col1, col2 = st.columns([2, 1])
-
-                with col1:
-                    st.markdown(f"**Full Description:** {error['Description']}")
-
-                    if error['Resolution Notes']:
-                        st.markdown(f"**Resolution Notes:**")
-                        st.info(error['Resolution Notes'])
-
-                with col2:
-                    severity_class = error['Severity'].lower()
-                    status_class = error['Status'].lower().replace(" ", "")
-
-                    st.markdown(
-                        f'<span class="severity-badge severity-{severity_class}">{error["Severity"]}</span> '
-                        f'<span class="status-badge status-{status_class}">{error["Status"]}</span>',
-                        unsafe_allow_html=True
-                    )
-
-                    st.markdown(f"**System:** {error['System']}")
-                    st.markdown(f"**Error Code:** {error['Error Code']}")
-                    st.markdown(f"**Reported:** {error['Date Reported']}")
-
-                    if error['Date Resolved']:
-                        st.markdown(f"**Resolved:** {error['Date Resolved']}")
-                        days_to_resolve = (pd.to_datetime(error['Date Resolved']) - pd.to_datetime(error['Date Reported'])).days
-                        st.markdown(f"**Resolution Time:** {days_to_resolve} days")
-
-                    if error['Reported to Fiserv'] == "Yes":
-                        st.markdown(f"**Fiserv Ticket:** {error['Fiserv Ticket']}")
-
-                # Action buttons
-                st.markdown("---")
-                col1, col2, col3, col4 = st.columns(4)
-
-                with col1:
-                    if st.button("Mark as Investigating", key=f"inv_{error['ID']}"):
-                        errors_df.loc[errors_df['ID'] == error['ID'], 'Status'] = 'Investigating'
-                        save_errors(errors_df)
-                        st.success("Status updated!")
-                        st.rerun()
-
-                with col2:
-                    if st.button("Mark as Fixed", key=f"fix_{error['ID']}"):
-                        errors_df.loc[errors_df['ID'] == error['ID'], 'Status'] = 'Fixed'
-                        errors_df.loc[errors_df['ID'] == error['ID'], 'Date Resolved'] = datetime.now().strftime("%Y-%m-%d")
-                        save_errors(errors_df)
-                        st.success("Error marked as fixed!")
-                        st.rerun()
-
-                with col3:
-                    if st.button("Report to Fiserv", key=f"fis_{error['ID']}"):
-                        errors_df.loc[errors_df['ID'] == error['ID'], 'Status'] = 'Reported to Fiserv'
-                        errors_df.loc[errors_df['ID'] == error['ID'], 'Reported to Fiserv'] = 'Yes'
-                        errors_df.loc[errors_df['ID'] == error['ID'], 'Fiserv Ticket'] = f"FSV-2024-{len(errors_df) + 2000}"
-                        save_errors(errors_df)
-                        st.success("Escalated to Fiserv!")
-                        st.rerun()
-
-                with col4:
-                    if st.button("Add Notes", key=f"note_{error['ID']}"):
-                        st.info("Notes editor available in Pro version")
+        for row_id in filtered_df["ID"]:
+            matches = [(work_id, work_names.get(work_id, ""), score) for work_id, score in related.related(row_id)]
+            st.fragment(error_row, key=f"error_{row_id}")(row_id, include_archive, matches)
 
     else:
         st.info("No errors match the selected filters.")
@@ -210,6 +350,11 @@ with tab1:
             mime="text/csv"
         )
 
+with tab1:
+    st.subheader("Error Dashboard")
+    error_list()
+    ui.version_history("errors", "error_versions")
+
 with tab2:
     st.subheader("Log New Error")
 
@@ -231,8 +376,7 @@ with tab2:
                 st.error("Please fill in all required fields (*)")
             else:
                 # Generate new ID
-                last_id = int(errors_df["ID"].str.replace("ERR-", "").max())
-                new_id = f"ERR-{last_id + 1:03d}"
+                new_id = storage.next_id("errors")
 
                 # Create new error
                 new_error = {
@@ -250,37 +394,53 @@ with tab2:
                 }
 
                 # Add to dataframe
-                new_df = pd.concat([errors_df, pd.DataFrame([new_error])], ignore_index=True)
-                save_errors(new_df)
+                new_id = save_errors(create=new_error)
 
                 st.success(f"✓ Error {new_id} logged successfully!")
                 st.balloons()
 
 with tab3:
+    profiling.section("analytics")
     st.subheader("Error Analytics")
+    # Analytics cover archived (fixed) errors as well
+    all_errors_df = load_errors(include_archive=True)
 
     col1, col2 = st.columns(2)
 
     with col1:
         st.markdown("**Errors by System**")
-        system_counts = errors_df["System"].value_counts()
+        system_counts = all_errors_df["System"].value_counts()
         st.bar_chart(system_counts)
 
     with col2:
         st.markdown("**Escalation Rate**")
-        total = len(errors_df)
-        escalated = len(errors_df[errors_df["Reported to Fiserv"] == "Yes"])
-        fixed_internal = len(errors_df[errors_df["Status"] == "Fixed"])
+        total = len(all_errors_df)
+        escalated = len(all_errors_df[all_errors_df["Reported to Fiserv"] == "Yes"])
+        fixed_internal = len(all_errors_df[all_errors_df["Status"] == "Fixed"])
 
         st.metric("Total Errors", total)
-        st.metric("Fixed Internally", fixed_internal, f"{fixed_internal/total*100:.1f}%")
-        st.metric("Escalated to Fiserv", escalated, f"{escalated/total*100:.1f}%")
+        st.metric("Fixed Internally", fixed_internal, f"{fixed_internal/max(total, 1)*100:.1f}%")
+        st.metric("Escalated to Fiserv", escalated, f"{escalated/max(total, 1)*100:.1f}%")
 
     st.markdown("---")
 
     # Resolution time analysis
     st.markdown("**Average Resolution Time by Severity**")
-    resolved = errors_df[errors_df["Date Resolved"] != ""].copy()
+    window = st.selectbox(
+        "Reported",
+        options=["All time", "Last 30 days", "Last 90 days", "This quarter"],
+        index=0
+    )
+    now = datetime.now()
+    window_start = {
+        "All time": None,
+        "Last 30 days": now - timedelta(days=30),
+        "Last 90 days": now - timedelta(days=90),
+        "This quarter": dateindex.quarter_start(now),
+    }[window]
+    reported_index = dateindex.index_for(all_errors_df, "Date Reported")
+    in_window = all_errors_df.iloc[reported_index.range(window_start, now)]
+    resolved = in_window[pd.to_datetime(in_window["Date Resolved"], errors="coerce").notna()].copy()
     if len(resolved) > 0:
         resolved["Date Reported"] = pd.to_datetime(resolved["Date Reported"])
         resolved["Date Resolved"] = pd.to_datetime(resolved["Date Resolved"])
@@ -304,3 +464,5 @@ with col1:
 with col2:
     if st.button("🚀 Upgrade to Pro"):
         st.info("Contact: paulsemaan007@gmail.com")
+
+profiling.end_rerun()
@@ -4,9 +4,14 @@ Projects Page - Track projects with SDLC compliance
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+from devopshub import board, commit, forecast, profiling, shared, storage, tenants, ui, validate, views
+from devopshub.profiling import profiled, timed
 
 st.set_page_config(page_title="Projects - DevOpsHub", page_icon="📁", layout="wide")
 
+profiling.begin_rerun("Projects")
+ui.select_tenant()
+
 # Custom CSS - DevOps Tech Theme
 st.markdown("""
 <style>
@@ -54,163 +59,243 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Load data
-@st.cache_data
+@tenants.cached
+@profiled("load_projects")
 def load_projects():
     """Load projects data"""
-    return pd.read_csv("data/projects.csv")
+    return shared.read_table("projects")
 
-@st.cache_data
+@tenants.cached
+@profiled("load_requests")
 def load_requests():
-    """Load requests data"""
-    return pd.read_csv("data/requests.csv")
-
-def save_projects(df):
-    """Save projects data"""
-    df.to_csv("data/projects.csv", index=False)
-    st.cache_data.clear()
+    """Load requests data, including archived ones for the linked request titles"""
+    return shared.read_table("requests", include_archive=True)
+
+@tenants.cached
+def load_board():
+    """Projects grouped into the columns of the board"""
+    return board.build(load_projects())
+
+@tenants.cached
+def load_projects_by_id():
+    """Projects keyed by ID, to redraw a single row"""
+    return load_projects().set_index("ID", drop=False)
+
+@profiled("save_projects")
+def save_projects(updates=(), create=None):
+    """Save changes to projects, returns the new project's ID when creating one"""
+    new_id = commit.save("projects", updates=updates, create=create, actor=ui.current_actor())
+    ui.data_saved()
+    return new_id
+
+def update_project(row_id, values, message, stamp=None):
+    """Row button callback: save `values` (and today's date in the `stamp` column)"""
+    if stamp:
+        values = {**values, stamp: datetime.now().strftime("%Y-%m-%d")}
+    save_projects(updates=[([row_id], values)])
+    st.session_state[f"saved_{row_id}"] = message
+    # Only the row and the counters show the change, the rest of the page stays as it is
+    ui.rerun_fragments("projects", [f"project_{row_id}", "project_counters"])
+
+ui.refresh_on_change({"projects": [load_projects, load_projects_by_id, load_board], "requests": [load_requests]})
 
 projects_df = load_projects()
 requests_df = load_requests()
 
+with timed("forecast"):
+    forecasts = forecast.project_forecasts(projects_df, requests_df, storage.data_dir())
+
+ui.actor_input()
+
 # Header
 st.title("📁 Project Tracker")
 st.markdown("Manage development projects with SDLC compliance")
+ui.quarantine_notice("projects", projects_df)
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📋 All Projects", "➕ New Project", "📊 Analytics"])
 
-with tab1:
-    st.subheader("Project Dashboard")
+def filter_projects(df, statuses, search):
+    """Rows of `df` matching the filter panel"""
+    filtered_df = df[df["Status"].isin(statuses)]
+
+    if search:
+        filtered_df = filtered_df[
+            filtered_df["Project Name"].str.contains(search, case=False, na=False) |
+            filtered_df["Description"].str.contains(search, case=False, na=False)
+        ]
+    return filtered_df
+
+@profiled("filter")
+def filtered_projects(filters, view=None):
+    """Rows matching the filter panel, from the cached result set when it shows a saved view as saved"""
+    if view is not None:
+        return views.select(load_projects_by_id(), "projects", view)
+    return filter_projects(load_projects(), *filters)
+
+@st.fragment(key="project_counters")
+@profiling.fragment("project_counters")
+def project_counters(filters, view=None):
+    """Stats for the filtered projects, redrawn on their own after a row action"""
+    projects_df = load_projects()
+    filtered_df = filtered_projects(filters, view)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Projects", len(filtered_df))
+    col2.metric("In Progress", len(filtered_df[filtered_df["Status"] == "In Progress"]))
+    col3.metric("Testing", len(filtered_df[filtered_df["Status"] == "Testing"]))
+    col4.metric("Deployed", len(projects_df[projects_df["Status"] == "Deployed"]))
+
+@profiling.fragment("project_row")
+def project_row(row_id):
+    """One project's expander, a fragment of its own so its buttons redraw only this row"""
+    rows = load_projects_by_id()
+    if row_id not in rows.index:
+        return
+    proj = rows.loc[row_id]
+    with st.expander(f"**{proj['ID']}** - {proj['Project Name']}", expanded=False):
+        col1, col2 = st.columns([2, 1])
+
+        with col1:
+            st.markdown(f"**Description:** {proj['Description']}")
+            st.markdown(f"**Team Members:** {proj['Team Members']}")
+
+            # Show linked requests
+            if proj['Linked Requests']:
+                linked_ids = proj['Linked Requests'].split(",")
+                st.markdown(f"**Linked Requests ({len(linked_ids)}):**")
+                for req_id in linked_ids[:5]:  # Show first 5
+                    req = requests_df[requests_df["ID"] == req_id.strip()]
+                    if len(req) > 0:
+                        st.markdown(f"- {req_id.strip()}: {req.iloc[0]['Title']}")
+
+        with col2:
+            status_class = proj['Status'].lower().replace(" ", "")
+            st.markdown(
+                f'<span class="status-badge status-{status_class}">{proj["Status"]}</span>',
+                unsafe_allow_html=True
+            )
+
+            st.markdown(f"**Current Phase:** {proj['Current Phase']}")
+            st.markdown(f"**Start Date:** {proj['Start Date']}")
+            st.markdown(f"**Target Completion:** {proj['Target Completion']}")
+
+            if proj['Actual Completion']:
+                st.markdown(f"**Actual Completion:** {proj['Actual Completion']}")
+
+            # Calculate progress
+            target_date = pd.to_datetime(proj['Target Completion'])
+            days_until = (target_date - datetime.now()).days
+
+            if days_until < 0:
+                st.error(f"Overdue by {abs(days_until)} days")
+            elif days_until < 7:
+                st.warning(f"Due in {days_until} days")
+            else:
+                st.info(f"Due in {days_until} days")
+
+            if proj['ID'] in forecasts.index:
+                p50, p85, p95 = forecasts.loc[proj['ID']]
+                st.caption(
+                    f"Forecast: 50% by {p50:%Y-%m-%d}, 85% by {p85:%Y-%m-%d}, 95% by {p95:%Y-%m-%d}"
+                )
+
+        # SDLC Checklist
+        st.markdown("---")
+        st.markdown("**📋 SDLC Compliance Checklist**")
+
+        # Parse SDLC checklist
+        checklist = validate.parse_checklist(proj['SDLC Checklist'])
+
+        col1, col2, col3 = st.columns(3)
+        cols = [col1, col2, col3]
+
+        for i, (phase, status) in enumerate(checklist):
+            css_class = "sdlc-complete" if status == "Complete" else "sdlc-pending"
+            icon = "✓" if status == "Complete" else "○"
+
+            with cols[i % 3]:
+                st.markdown(
+                    f'<div class="sdlc-phase {css_class}">'
+                    f'{icon} <strong>{phase}</strong><br>'
+                    f'<span style="font-size: 0.85rem;">{status}</span>'
+                    f'</div>',
+                    unsafe_allow_html=True
+                )
+
+        # Calculate completion percentage
+        complete_count = sum(1 for _, status in checklist if status == "Complete")
+        completion_pct = (complete_count / len(checklist)) * 100 if checklist else 0
+        st.progress(completion_pct / 100)
+        st.caption(f"SDLC Completion: {completion_pct:.0f}%")
+
+        # Action buttons
+        st.markdown("---")
+        if message := st.session_state.pop(f"saved_{proj['ID']}", None):
+            st.success(message)
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.button(
+                "Move to Testing", key=f"test_{proj['ID']}", on_click=update_project,
+                args=(proj['ID'], {'Status': 'Testing', 'Current Phase': 'Testing & QA'}, "Project moved to Testing!")
+            )
+
+        with col2:
+            st.button(
+                "Mark as Deployed", key=f"dep_{proj['ID']}", on_click=update_project,
+                args=(proj['ID'], {'Status': 'Deployed', 'Current Phase': 'Post-Deployment Review'}, "Project deployed!"),
+                kwargs={"stamp": "Actual Completion"}
+            )
+
+        with col3:
+            if st.button("Edit SDLC", key=f"sdlc_{proj['ID']}"):
+                st.info("SDLC editor available in Pro version")
+
+@st.fragment
+@profiled("project_list")
+def project_list():
+    """Filter panel, counters and list: changing a filter reruns only this part of the page"""
+    saved_view = ui.view_picker("projects", key="project_view")
 
     # Filters
     col1, col2 = st.columns(2)
 
     with col1:
+        status_options = ["Planning", "In Progress", "Testing", "Deployed", "On Hold"]
         filter_status = st.multiselect(
             "Status",
-            options=["Planning", "In Progress", "Testing", "Deployed", "On Hold"],
-            default=["Planning", "In Progress", "Testing"]
+            options=status_options,
+            default=(
+                saved_view.get("Status", status_options) if saved_view is not None
+                else ["Planning", "In Progress", "Testing"]
+            )
         )
 
     with col2:
-        search = st.text_input("Search projects", placeholder="Search by name or description...")
+        search = st.text_input(
+            "Search projects",
+            value=(saved_view or {}).get(views.SEARCH, ""),
+            placeholder="Search by name or description..."
+        )
 
-    # Apply filters
-    filtered_df = projects_df[projects_df["Status"].isin(filter_status)]
+    definition = views.definition({"Status": filter_status}, {"Status": status_options}, search)
+    ui.view_controls("projects", "project_view", definition)
+    # Left as saved, the view is served from its cached result set
+    view = saved_view if saved_view == definition else None
 
-    if search:
-        filtered_df = filtered_df[
-            filtered_df["Project Name"].str.contains(search, case=False, na=False) |
-            filtered_df["Description"].str.contains(search, case=False, na=False)
-        ]
+    # Apply filters
+    filters = (filter_status, search)
+    filtered_df = filtered_projects(filters, view)
 
     # Stats
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Projects", len(filtered_df))
-    col2.metric("In Progress", len(filtered_df[filtered_df["Status"] == "In Progress"]))
-    col3.metric("Testing", len(filtered_df[filtered_df["Status"] == "Testing"]))
-    col4.metric("Deployed", len(projects_df[projects_df["Status"] == "Deployed"]))
+    project_counters(filters, view)
 
     st.markdown("---")
 
     # Display projects
     if len(filtered_df) > 0:
-        for _, proj in filtered_df.iterrows():
-            with st.expander(f"**{proj['ID']}** - {proj['Project Name']}", expanded=False):
-                col1, col2 = st.columns([2, 1])
-
-                with col1:
-                    st.markdown(f"**Description:** {proj['Description']}")
-                    st.markdown(f"**Team Members:** {proj['Team Members']}")
-
-                    # Show linked requests
-                    if proj['Linked Requests']:
-                        linked_ids = proj['Linked Requests'].split(",")
-                        st.markdown(f"**Linked Requests ({len(linked_ids)}):**")
-                        for req_id in linked_ids[:5]:  # Show first 5
-                            req = requests_df[requests_df["ID"] == req_id.strip()]
-                            if len(req) > 0:
-                                st.markdown(f"- {req_id.strip()}: {req.iloc[0]['Title']}")
-
-                with col2:
-                    status_class = proj['Status'].lower().replace(" ", "")
-                    st.markdown(
-                        f'<span class="status-badge status-{status_class}">{proj["Status"]}</span>',
-                        unsafe_allow_html=True
-                    )
-
-                    st.markdown(f"**Current Phase:** {proj['Current Phase']}")
-                    st.markdown(f"**Start Date:** {proj['Start Date']}")
-                    st.markdown(f"**Target Completion:** {proj['Target Completion']}")
-
-                    if proj['Actual Completion']:
-                        st.markdown(f"**Actual Completion:** {proj['Actual Completion']}")
-
-                    # Calculate progress
-                    target_date = pd.to_datetime(proj['Target Completion'])
-                    days_until = (target_date - datetime.now()).days
-
-                    if days_until < 0:
-                        st.error(f"Overdue by {abs(days_until)} days")
-                    elif days_until < 7:
-                        st.warning(f"Due in {days_until} days")
-                    else:
-                        st.info(f"Due in {days_until} days")
-
-                # SDLC Checklist
-                st.markdown("---")
-                st.markdown("**📋 SDLC Compliance Checklist**")
-
-                # Parse SDLC checklist
-                checklist = proj['SDLC Checklist'].split("|")
-
-                col1, col2, col3 = st.columns(3)
-                cols = [col1, col2, col3]
-
-                for i, item in enumerate(checklist):
-                    phase, status = item.split(":")
-                    css_class = "sdlc-complete" if status == "Complete" else "sdlc-pending"
-                    icon = "✓" if status == "Complete" else "○"
-
-                    with cols[i % 3]:
-                        st.markdown(
-                            f'<div class="sdlc-phase {css_class}">'
-                            f'{icon} <strong>{phase}</strong><br>'
-                            f'<span style="font-size: 0.85rem;">{status}</span>'
-                            f'</div>',
-                            unsafe_allow_html=True
-                        )
-
-                # Calculate completion percentage
-                complete_count = sum(1 for item in checklist if ":Complete" in item)
-                completion_pct = (complete_count / len(checklist)) * 100
-                st.progress(completion_pct / 100)
-                st.caption(f"SDLC Completion: {completion_pct:.0f}%")
-
-                # Action buttons
-                st.markdown("---")
-                col1, col2, col3 = st.columns(3)
-
-                with col1:
-                    if st.button("Move to Testing", key=f"test_{proj['ID']}"):
-                        projects_df.loc[projects_df['ID'] == proj['ID'], 'Status'] = 'Testing'
-                        projects_df.loc[projects_df['ID'] == proj['ID'], 'Current Phase'] = 'Testing & QA'
-                        save_projects(projects_df)
-                        st.success("Project moved to Testing!")
-                        st.rerun()
-
-                with col2:
-                    if st.button("Mark as Deployed", key=f"dep_{proj['ID']}"):
-                        projects_df.loc[projects_df['ID'] == proj['ID'], 'Status'] = 'Deployed'
-                        projects_df.loc[projects_df['ID'] == proj['ID'], 'Actual Completion'] = datetime.now().strftime("%Y-%m-%d")
-                        projects_df.loc[projects_df['ID'] == proj['ID'], 'Current Phase'] = 'Post-Deployment Review'
-                        save_projects(projects_df)
-                        st.success("Project deployed!")
-                        st.rerun()
-
-                with col3:
-                    if st.button("Edit SDLC", key=f"sdlc_{proj['ID']}"):
-                        st.info("SDLC editor available in Pro version")
+        for row_id in filtered_df["ID"]:
+            st.fragment(project_row, key=f"project_{row_id}")(row_id)
 
     else:
         st.info("No projects match the selected filters.")
@@ -226,6 +311,41 @@ with tab1:
             mime="text/csv"
         )
 
+@st.fragment
+@profiled("project_board")
+def project_board():
+    """One column per status, paged: turning a page reruns only the board"""
+    projects_board = load_board()
+    columns = st.columns(len(board.STATUSES))
+    for column, status in zip(columns, board.STATUSES):
+        with column:
+            st.markdown(f"**{status}** ({projects_board.counts[status]})")
+            phases = projects_board.phase_counts[status]
+            if phases:
+                st.caption(" · ".join(f"{phase}: {count}" for phase, count in phases.items()))
+            pages = projects_board.pages(status)
+            number = 1
+            if pages > 1:
+                number = st.number_input(
+                    f"Page (of {pages})", min_value=1, max_value=pages, key=f"board_page_{status}"
+                )
+            for card in projects_board.page(status, number).to_dict("records"):
+                with st.container(border=True):
+                    st.markdown(f"**{card['Project Name']}**")
+                    st.caption(f"{card['ID']} · {card['Current Phase']}")
+                    st.progress(card["SDLC (%)"] / 100, text=f"SDLC {card['SDLC (%)']}%")
+                    if pd.isna(card["Days Left"]):
+                        st.caption("No target date")
+                    elif card["Days Left"] < 0 and status != "Deployed":
+                        st.caption(f"🔴 Overdue by {-int(card['Days Left'])} days")
+                    else:
+                        st.caption(f"Due {card['Target Completion']}")
+
+with tab1:
+    st.subheader("Project Dashboard")
+    project_list()
+    ui.version_history("projects", "project_versions")
+
 with tab2:
     st.subheader("Create New Project")
 
@@ -253,8 +373,7 @@ with tab2:
                 st.error("Please fill in all required fields (*)")
             else:
                 # Generate new ID
-                last_id = int(projects_df["ID"].str.replace("PROJ-", "").max())
-                new_id = f"PROJ-{last_id + 1:03d}"
+                new_id = storage.next_id("projects")
 
                 # Create SDLC checklist
                 sdlc_phases = [
@@ -283,13 +402,13 @@ with tab2:
                 }
 
                 # Add to dataframe
-                new_df = pd.concat([projects_df, pd.DataFrame([new_project])], ignore_index=True)
-                save_projects(new_df)
+                new_id = save_projects(create=new_project)
 
                 st.success(f"✓ Project {new_id} created successfully!")
                 st.balloons()
 
 with tab3:
+    profiling.section("analytics")
     st.subheader("Project Analytics")
 
     col1, col2 = st.columns(2)
@@ -302,28 +421,22 @@ with tab3:
     with col2:
         st.markdown("**SDLC Completion Rate**")
         # Calculate average SDLC completion
-        completion_rates = []
-        for _, proj in projects_df.iterrows():
-            checklist = proj['SDLC Checklist'].split("|")
-            complete_count = sum(1 for item in checklist if ":Complete" in item)
-            completion_pct = (complete_count / len(checklist)) * 100
-            completion_rates.append(completion_pct)
-
-        avg_completion = sum(completion_rates) / len(completion_rates)
+        checklists = projects_df["SDLC Checklist"].fillna("").astype(str)
+        completion_rates = checklists.str.count(":Complete") / (checklists.str.count(r"\|") + 1) * 100
+
+        avg_completion = completion_rates.mean() if len(completion_rates) else 0.0
         st.metric("Average SDLC Completion", f"{avg_completion:.1f}%")
 
         # Show breakdown
-        for status in ["Planning", "In Progress", "Testing", "Deployed"]:
-            status_projects = projects_df[projects_df["Status"] == status]
-            if len(status_projects) > 0:
-                status_completion = []
-                for _, proj in status_projects.iterrows():
-                    checklist = proj['SDLC Checklist'].split("|")
-                    complete_count = sum(1 for item in checklist if ":Complete" in item)
-                    completion_pct = (complete_count / len(checklist)) * 100
-                    status_completion.append(completion_pct)
-                avg = sum(status_completion) / len(status_completion)
-                st.caption(f"{status}: {avg:.0f}% SDLC complete")
+        for status, rate in load_board().completion.items():
+            if rate is not None:
+                st.caption(f"{status}: {rate:.0f}% SDLC complete")
+
+    st.markdown("---")
+
+    # Kanban board
+    st.markdown("**Project Board**")
+    project_board()
 
     st.markdown("---")
 
@@ -358,3 +471,5 @@ with col1:
 with col2:
     if st.button("🚀 Upgrade to Pro"):
         st.info("Contact: paulsemaan007@gmail.com")
+
+profiling.end_rerun()
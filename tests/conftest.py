@@ -0,0 +1,15 @@
+import glob
+import os
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A copy of the sample tables in data/ (the real ones are never touched)"""
+    for path in glob.glob(os.path.join(ROOT, "data", "*.csv")):
+        shutil.copy(path, tmp_path / os.path.basename(path))
+    return tmp_path
@@ -0,0 +1,46 @@
+import pytest
+
+from devopshub import commit, metrics, storage
+
+
+def _commits(entity):
+    return sum(value for _, labels, value in metrics.COMMITS.collect() if labels["table"] == entity)
+
+
+def test_changes_in_one_window_are_written_once(data_dir):
+    queue = commit.CommitQueue(str(data_dir), window=0.2)
+    with storage.using(str(data_dir)):
+        before = storage.read_table("requests").set_index("ID")["Status"]
+        new_id = storage.next_id("requests")
+    commits = _commits("requests")
+
+    futures = [
+        # Completed by now, so this stale change must not reopen it
+        queue.submit("requests", [(["REQ-001"], {"Status": "In Progress"}, {"Status": "Submitted"})], actor="a"),
+        queue.submit("requests", [(["REQ-002"], {"Status": "Testing"}, {"Status": before["REQ-002"]})], actor="b"),
+        queue.submit("requests", create={"ID": new_id, "Title": "First", "Status": "Submitted"}, actor="c"),
+        queue.submit("requests", create={"ID": new_id, "Title": "Second", "Status": "Submitted"}, actor="d"),
+    ]
+    results = [future.result(timeout=30) for future in futures]
+
+    with storage.using(str(data_dir)):
+        after = storage.read_table("requests").set_index("ID")
+    assert before["REQ-001"] == "Completed" and after.loc["REQ-001", "Status"] == "Completed"
+    assert after.loc["REQ-002", "Status"] == "Testing"
+    number = int(new_id.split("-")[1])
+    assert results == [None, None, new_id, f"REQ-{number + 1:03d}"]
+    assert after.loc[results[2:], "Title"].tolist() == ["First", "Second"]
+    assert _commits("requests") == commits + 1
+
+
+def test_a_failed_commit_fails_every_change_in_it(data_dir, monkeypatch):
+    def fail(entity, changes):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage, "commit_changes", fail)
+    queue = commit.CommitQueue(str(data_dir), window=0.2)
+    futures = [queue.submit("errors", [([f"ERR-00{n}"], {"Status": "Fixed"})]) for n in range(1, 4)]
+
+    for future in futures:
+        with pytest.raises(OSError, match="disk full"):
+            future.result(timeout=30)
@@ -0,0 +1,23 @@
+import os
+from datetime import date
+
+from streamlit.testing.v1 import AppTest
+
+from devopshub import storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_as_of_shows_the_tables_that_have_history(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(data_dir))
+    # Only requests have been journaled so far
+    with storage.using(str(data_dir)):
+        storage.commit_changes("requests", [([(["REQ-001"], {"Status": "In Progress"}, {})], None, "test")])
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120).run()
+    next(d for d in at.date_input if d.label == "As of").set_value(date.today()).run()
+
+    assert not at.exception, [e.value for e in at.exception]
+    assert not at.warning
+    assert {m.label for m in at.metric} >= {"Total Requests", "System Errors", "Active Projects"}
+    assert "No errors logged yet." in [i.value for i in at.info]
@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+
+from devopshub import journal, storage
+
+
+def _on_disk(data_dir, entity):
+    df = pd.read_csv(data_dir / storage.ENTITIES[entity], dtype=str, keep_default_na=False)
+    return df.sort_values("ID").reset_index(drop=True)
+
+
+def _replayed(j, entity):
+    return j.replay(entity).sort_values("ID").reset_index(drop=True)
+
+
+def test_replay_rebuilds_the_table_and_skips_a_partial_last_line(data_dir):
+    with storage.using(str(data_dir)):
+        for row_id, status in [("REQ-002", "Testing"), ("REQ-003", "In Progress")]:
+            df = storage.read_table("requests")
+            df.loc[df["ID"] == row_id, "Status"] = status
+            storage.write_table("requests", df, actor="test")
+        storage.get_journal().sync()
+    path = str(data_dir / journal.JOURNAL_FILE)
+    pd.testing.assert_frame_equal(_replayed(journal.Journal(path), "requests"), _on_disk(data_dir, "requests"))
+
+    # Cut the last line short, as if another process were still writing it
+    with open(path, "rb") as f:
+        content = f.read()
+    last = content[content.rstrip(b"\n").rfind(b"\n") + 1:]
+    with open(path, "wb") as f:
+        f.write(content[:-len(last) // 2])
+    partial = journal.Journal(path)
+    replayed = partial.replay("requests")
+
+    assert partial.seq == len(content.splitlines()) - 1
+    assert partial.follow()[1] == partial.end() == len(content) - len(last)
+    assert replayed.set_index("ID").loc["REQ-003", "Status"] != "In Progress"
+
+    # Once the line is complete it is picked up from where the reader stopped
+    with open(path, "wb") as f:
+        f.write(content)
+    pd.testing.assert_frame_equal(_replayed(partial, "requests"), _on_disk(data_dir, "requests"))
+    assert partial.seq == len(content.splitlines())
+
+
+def test_fsync_is_batched(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(journal, "FSYNC_BATCH", 3)
+    monkeypatch.setattr(journal, "FSYNC_INTERVAL", 60)
+    monkeypatch.setattr(journal.os, "fsync", synced.append)
+    j = journal.Journal(str(tmp_path / journal.JOURNAL_FILE))
+
+    for n in range(7):
+        row_id = f"REQ-{n:03d}"
+        j.append([{"entity": "requests", "op": "create", "id": row_id, "actor": "test",
+                   "set": {"ID": row_id, "Status": "Submitted"}}])
+    assert len(synced) == 2
+    j.sync()
+    assert len(synced) == 3
+    j.close()
+
+    assert len(journal.Journal(j.path).replay("requests")) == 7
+    assert os.path.getsize(j.path) == j.end()
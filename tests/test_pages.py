@@ -0,0 +1,17 @@
+import glob
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from devopshub import storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = [os.path.join(ROOT, "app.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+@pytest.mark.parametrize("page", PAGES, ids=lambda path: os.path.basename(path))
+def test_page_renders(page, data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(data_dir))
+    at = AppTest.from_file(page, default_timeout=120).run()
+    assert not at.exception, [e.value for e in at.exception]
@@ -0,0 +1,34 @@
+import multiprocessing
+
+import pandas as pd
+
+from devopshub import people
+
+
+def _add_people(data_dir, worker):
+    people.lookup(str(data_dir), [f"Worker {worker} Person {n}" for n in range(20)])
+
+
+def test_lookup_reuses_and_adds_keys(data_dir):
+    existing = people.read_people(str(data_dir)).iloc[0]
+    ids = people.lookup(str(data_dir), [existing["Name"], "New Person", "Unassigned", ""],
+                        [existing["Email"], "new@example.org", "", ""],
+                        [existing["Department"], "IT", "", ""])
+
+    assert ids.iloc[0] == existing["Person ID"]
+    assert ids.iloc[1] == people.read_people(str(data_dir))["Person ID"].max()
+    assert ids.iloc[2:].isna().all()
+
+
+def test_lookup_numbers_people_uniquely_across_processes(data_dir):
+    before = len(people.read_people(str(data_dir)))
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_add_people, args=(data_dir, worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+    table = pd.read_csv(data_dir / people.PEOPLE_FILE)
+    assert len(table) == before + 80
+    assert table["Person ID"].is_unique
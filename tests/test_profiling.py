@@ -0,0 +1,37 @@
+import glob
+import json
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from devopshub import metrics, storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUESTS_PAGE = glob.glob(os.path.join(ROOT, "pages", "1_*.py"))[0]
+
+
+def test_fragment_reruns_are_logged_as_their_own_reruns(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(data_dir))
+    monkeypatch.setenv("DEVOPSHUB_PROFILE", "1")
+    at = AppTest.from_file(REQUESTS_PAGE, default_timeout=120).run()
+    next(b for b in at.button if b.key and b.key.startswith("prog_")).click().run()
+    assert not at.exception
+
+    with open(data_dir / "profile.jsonl", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f]
+    reruns = {(s["fragment"], s["rerun"]) for s in samples if s["section"] == "rerun"}
+    assert {fragment for fragment, _ in reruns} >= {None, "request_row", "request_counters"}
+    assert len(reruns) == len({rerun for _, rerun in reruns})
+    assert {s["section"] for s in samples if s["fragment"] is None} >= {"load_requests", "filter", "analytics"}
+
+
+def test_fragment_reruns_are_observed_with_their_label(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(data_dir))
+    at = AppTest.from_file(REQUESTS_PAGE, default_timeout=120).run()
+    next(b for b in at.button if b.key and b.key.startswith("prog_")).click().run()
+    assert not at.exception
+
+    counts = {(labels["page"], labels["fragment"]): value for name, labels, value in metrics.RERUN_SECONDS.collect()
+              if name.endswith("_count")}
+    assert counts[("Requests", "")] >= 1
+    assert counts[("Requests", "request_row")] >= 1
@@ -0,0 +1,42 @@
+import os
+
+import pandas as pd
+
+from devopshub import shared, storage
+
+
+def test_snapshot_matches_the_csv_and_is_published_once(data_dir):
+    with storage.using(str(data_dir)):
+        from_csv = storage.read_table("errors")
+        first = shared.read_table("errors")
+        entry = shared.read_versions()["errors"]
+        second = shared.read_table("errors")
+
+        assert shared.read_versions()["errors"] == entry
+    pd.testing.assert_frame_equal(first, from_csv, check_dtype=False)
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_a_write_publishes_a_new_version_and_keeps_the_last_ones(data_dir):
+    with storage.using(str(data_dir)):
+        shared.read_table("projects")
+        for status in ("Testing", "Deployed", "In Progress"):
+            df = storage.read_table("projects")
+            df.loc[0, "Status"] = status
+            storage.write_table("projects", df)
+            assert shared.read_table("projects").loc[0, "Status"] == status
+        entry = shared.read_versions()["projects"]
+
+    assert entry["version"] == 4
+    kept = sorted(name for name in os.listdir(data_dir / shared.SHARED_DIR) if name.startswith("projects-"))
+    assert kept == ["projects-000003.arrow", "projects-000004.arrow"]
+
+
+def test_blank_text_cells_are_nan(data_dir):
+    with storage.using(str(data_dir)):
+        errors = shared.read_table("errors")
+
+    blank = errors["Fiserv Ticket"].isna()
+    assert blank.any()
+    # Pages test cells for truth, which pd.NA would refuse
+    assert all(bool(value) for value in errors.loc[blank, "Fiserv Ticket"])
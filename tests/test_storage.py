@@ -0,0 +1,47 @@
+import pandas as pd
+
+from devopshub import storage
+
+
+def test_write_stores_person_keys_and_read_joins_names(data_dir):
+    with storage.using(str(data_dir)):
+        df = storage.read_table("requests")
+        df["Assigned To"] = df["Assigned To"].astype(object)
+        df.loc[df["ID"] == "REQ-001", "Assigned To"] = "New Assignee"
+        storage.write_table("requests", df, actor="test")
+        on_disk = pd.read_csv(data_dir / "requests.csv")
+        after = storage.read_table("requests")
+
+    assert "Assigned To" not in on_disk.columns and "Assignee ID" in on_disk.columns
+    assert after.set_index("ID").loc["REQ-001", "Assigned To"] == "New Assignee"
+    pd.testing.assert_series_equal(after["Requester Name"].astype(str), df["Requester Name"].astype(str))
+
+
+def test_table_version_changes_with_the_file(data_dir):
+    with storage.using(str(data_dir)):
+        before = storage.table_version("errors")
+        assert storage.table_version("errors") == before
+        df = storage.read_table("errors")
+        df.loc[0, "Status"] = "Investigating"
+        storage.write_table("errors", df)
+        assert storage.table_version("errors") != before
+        assert storage.read_table("errors").attrs["version"] == storage.table_version("errors")
+
+
+def test_column_and_row_filtered_reads(data_dir):
+    with storage.using(str(data_dir)):
+        full = storage.read_table("requests")
+        narrow = storage.read_table("requests", columns=["Status", "Assigned To"])
+        open_rows = storage.read_table("requests", where=lambda chunk: chunk["Status"] != "Completed")
+
+    assert list(narrow.columns) == ["ID", "Status", "Assigned To"]
+    pd.testing.assert_frame_equal(narrow, full[["ID", "Status", "Assigned To"]], check_categorical=False)
+    assert set(open_rows["ID"]) == set(full.loc[full["Status"] != "Completed", "ID"])
+    assert open_rows.attrs["version"] is None
+
+
+def test_next_id_follows_the_highest(data_dir):
+    with storage.using(str(data_dir)):
+        ids = storage.read_table("requests", raw=True)["ID"]
+        highest = max(int(row_id.split("-")[1]) for row_id in ids)
+        assert storage.next_id("requests") == f"REQ-{highest + 1:03d}"
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from devopshub import storage, validate
+
+
+def test_import_keeps_existing_person_keys(data_dir):
+    new = data_dir / "new_requests.csv"
+    pd.DataFrame([{
+        "ID": "REQ-901", "Title": "Imported request", "Type": "Report", "Priority": "Low",
+        "Status": "Submitted", "Requester Name": "Michael Chen", "Requester Email": "mchen@lbsfinancial.org",
+        "Requester Department": "Loan Officer", "Assigned To": "Unassigned", "Created Date": "2025-10-01",
+    }]).to_csv(new, index=False)
+
+    with storage.using(str(data_dir)):
+        before = storage.read_table("requests", raw=True)
+        added, quarantined, _ = validate.import_rows("requests", str(new))
+        after = storage.read_table("requests", raw=True)
+
+    assert (added, quarantined) == (1, 0)
+    kept = after.set_index("ID").loc[before["ID"], ["Requester ID", "Assignee ID"]]
+    pd.testing.assert_frame_equal(kept.reset_index(drop=True),
+                                  before[["Requester ID", "Assignee ID"]].reset_index(drop=True))
+    assert after.set_index("ID").loc["REQ-901", "Requester ID"] == 1